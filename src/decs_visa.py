@@ -2,12 +2,14 @@
 Contains the main DECS<->VISA application.
 
 Starts the simple_socket_server in its own thread and then
-starts the WAMP component - providing each with two queue
-objects for IPC
+starts the WAMP component - providing each with a shared
+QueueBridge for IPC.  The WAMP component reconnects if the
+connection to the router is lost (see wamp_runner.py)
 """
-import queue
+import asyncio
 import threading
 import os
+import signal
 import sys
 from pathlib import Path
 from sys import version_info
@@ -16,10 +18,9 @@ from dotenv import load_dotenv
 
 from autobahn._version import __version__ as autobahn_version
 
-from autobahn.asyncio.wamp import ApplicationRunner
-
+from decs_visa_components.queue_bridge import QueueBridge
 from decs_visa_components.simple_socket_server import simple_server
-from decs_visa_components.wamp_component import Component
+from decs_visa_components.wamp_runner import run_component
 from decs_visa_tools.base_logger import logger
 
 # Import some settings
@@ -32,6 +33,22 @@ from decs_visa_tools.decs_visa_settings import SHUTDOWN
 # and the path to the system settings .env file
 from decs_visa_tools.decs_visa_settings import DOT_ENV_PATH
 
+async def run(url: str, realm: str, extra: dict) -> None:
+    """
+    Run the WAMP component until it finishes or
+    the process is terminated
+    """
+    task = asyncio.create_task(run_component(url, realm, extra))
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+    except NotImplementedError:
+        # signals are not available on Windows
+        pass
+    try:
+        await task
+    except asyncio.CancelledError:
+        logger.info("Terminated - shutdown")
+
 def main():
     """
     The application loop
@@ -72,51 +89,37 @@ def main():
         logger.info("Abort and exit 1")
         sys.exit(1)
 
-    # Create the shared queues and launch socket server thread
-    queries = queue.Queue(maxsize=1)
-    responses = queue.Queue(maxsize=1)
+    # Create the shared request / response queues
+    bridge = QueueBridge()
 
     # Start the socket server thread
     server_thread = threading.Thread(target = simple_server,
-                                     args =(interface, port, queries, responses, ))
+                                     args =(interface, port, bridge, ))
     server_thread.start()
 
-    # Start the WAMP session
-    runner = ApplicationRunner(url, realm, extra=dict(
-                                            input_queue=queries,
-                                            output_queue=responses,
-                                            user_name=user,
-                                            user_secret=user_secret))
     try:
-        # Run the WAMP component
-        # ideally disable logging from autobahn
-        # but that doesn't quite work...
-        runner.run(Component, log_level='critical')
-        # if running in a linux terminal you could always
-        # python3 ./decs_visa.py > /dev/null
+        # Run the WAMP component, which shuts
+        # down the socket server when it finishes
+        asyncio.run(run(url, realm, dict(
+                                    bridge=bridge,
+                                    user_name=user,
+                                    user_secret=user_secret)))
     # Some WAMP methods raise at the Exception level
     except (KeyboardInterrupt, Exception) as e:
         # Catch keyboard / kernel interrupt here.
         # as well as any other more fundamental WAMP
         # error - shut down the socket server via
-        # its input queue to exit.
+        # response queue to exit.
         if isinstance(e, KeyboardInterrupt):
             logger.info("Keyboard Interrupt - shutdown")
         else:
             logger.info("WAMP component error: %s", e)
-        try:
-            # WAMP component may have requested
-            # the socket server to close on exit
-            # unless the WAMP connection was never
-            # established, so just in case
-            _ = responses.get_nowait()
-        except queue.Empty:
-            pass
         # Will cause the socket server to
         # close so the thread can join() below
-        responses.put(SHUTDOWN)
+        bridge.put_response(SHUTDOWN)
 
     server_thread.join()
+    bridge.close()
     logger.info("DECS<->VISA stopped")
     sys.exit(0)
 
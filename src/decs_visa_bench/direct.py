@@ -0,0 +1,63 @@
+"""
+Runs DECS<->VISA (socket server and WAMP component) with its WAMP
+calls answered directly by a FakeDecs rather than through a router,
+so the bridge itself can be benchmarked without one
+
+python -m decs_visa_bench.direct --port 33577
+"""
+import argparse
+import asyncio
+import threading
+
+from autobahn.wamp.types import ComponentConfig
+
+from decs_visa_bench.fake_decs import FakeDecs
+from decs_visa_components.queue_bridge import QueueBridge
+from decs_visa_components.simple_socket_server import simple_server
+from decs_visa_components.wamp_component import Component
+from decs_visa_tools.base_logger import logger
+
+class DirectComponent(Component):
+    """
+    The WAMP component, with its calls made to a FakeDecs
+    """
+    async def call(self, procedure, *args, **kwargs):
+        return await self.config.extra['fake'].call(procedure, *args)
+
+    def publish(self, topic, *args, **kwargs):
+        pass
+
+    async def subscribe(self, handler, topic=None, options=None, check_types=None):
+        raise NotImplementedError("No publications without a router")
+
+    def leave(self, reason=None, message=None):
+        pass
+
+def main():
+    """
+    Run the bridge until it is sent SHUTDOWN
+    """
+    parser = argparse.ArgumentParser(description="DECS<->VISA with a fake DECS and no router")
+    parser.add_argument("--interface", default="localhost", help="socket server interface")
+    parser.add_argument("--port", type=int, required=True, help="socket server port")
+    parser.add_argument("--user", default="bench", help="user name")
+    parser.add_argument("--latency", type=float, default=0.002, help="mean call latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.001, help="call latency jitter (s)")
+    args = parser.parse_args()
+
+    bridge = QueueBridge()
+    server_thread = threading.Thread(target=simple_server,
+                                     args=(args.interface, args.port, bridge, ))
+    server_thread.start()
+    component = DirectComponent(ComponentConfig("bench", extra=dict(
+        bridge=bridge,
+        user_name=args.user,
+        user_secret="",
+        fake=FakeDecs(args.user, args.latency, args.jitter))))
+    asyncio.run(component.onJoin(None))
+    server_thread.join()
+    bridge.close()
+    logger.info("DECS<->VISA (direct) stopped")
+
+if __name__ == "__main__":
+    main()
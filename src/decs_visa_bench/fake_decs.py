@@ -0,0 +1,162 @@
+"""
+A stand-in for DECS, used to benchmark DECS<->VISA without a real
+system.  Every uri in the command dictionary answers with a record
+of the shape the real system returns for it (see response_parser.py),
+after a configurable latency and jitter.
+
+Run on its own it registers the uris with a WAMP router:
+
+python -m decs_visa_bench.fake_decs --url ws://127.0.0.1:8080/ws --realm ucss
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from autobahn.asyncio.wamp import ApplicationRunner, ApplicationSession
+from autobahn.wamp import exception as wamp_exceptions
+from autobahn.wamp.types import CallResult
+
+from decs_visa_tools.base_logger import logger
+from decs_visa_tools.command_dictionary import Proteox_cmd_uri
+from decs_visa_tools.response_parser import OIRecordType
+
+HOST_NAME = "FAKE-PROTEOX"
+DECS_VERSION = "0.0.0-bench"
+
+# (uri ending, record type) - the first match is used
+_RECORD_TYPES = (
+    ("setpoint", OIRecordType.CONTROL_LOOP),
+    (".power", OIRecordType.HTR_POWER),
+    (".temperature", OIRecordType.TEMPERATURE),
+    (".pressure", OIRecordType.PRESSURE),
+    (".flow", OIRecordType.MASS_FLOW),
+    ("magnetic_field_vector", OIRecordType.MAG_FIELD_VEC),
+    ("current_vector", OIRecordType.PSU_CURRENT_VEC),
+    ("field_target", OIRecordType.MAG_FIELD_TARGET),
+    ("output_current_target", OIRecordType.MAG_CURR_TARGET),
+    ("SWZ.state", OIRecordType.SW_STATE),
+    ("VRM_01.state", OIRecordType.MAG_GROUP_STATE),
+    ("state", OIRecordType.MAG_STATE),
+)
+
+def record_type(uri: str) -> OIRecordType | None:
+    """
+    The record type DECS returns for a uri
+    """
+    for ending, record in _RECORD_TYPES:
+        if uri.endswith(ending):
+            return record
+    return None
+
+def fake_record(record: OIRecordType) -> list:
+    """
+    A record of the given type, with a plausible value
+    """
+    seconds, nanoseconds = divmod(time.time_ns(), 1_000_000_000)
+    header = [int(record), 0, seconds, nanoseconds]
+    value = random.uniform(0.01, 300.0)
+    match record:
+        case OIRecordType.MAG_STATE:
+            return [int(record), 1, 0]
+        case OIRecordType.CONTROL_LOOP | OIRecordType.SW_STATE:
+            return header + [value, 1, 0]
+        case OIRecordType.HTR_POWER:
+            return header + [value * 1e-6, 1, 0, 0]
+        case OIRecordType.MAG_FIELD_VEC | OIRecordType.PSU_CURRENT_VEC:
+            return header + [random.uniform(-1, 1) for _ in range(3)] + [0]
+        case OIRecordType.MAG_FIELD_TARGET:
+            return [int(record), 0] + [random.uniform(-1, 1) for _ in range(3)] + [0, 0.1, 0]
+        case OIRecordType.MAG_CURR_TARGET:
+            return [int(record)] + [random.uniform(-10, 10) for _ in range(3)] + [0] * 6
+        case OIRecordType.MAG_GROUP_STATE:
+            # the group state is at [5]
+            return header + [0, 1, 0, 0, 0, 0]
+        case _:
+            return header + [value, 0]
+
+class FakeDecs:
+    """
+    Answers WAMP calls the way DECS would, after
+    latency +/- jitter (s)
+    """
+    def __init__(self, user_name: str, latency: float = 0.002, jitter: float = 0.001,
+                 cmd_dict: dict[str, str] | None = None) -> None:
+        self.user_name = user_name
+        self.latency = latency
+        self.jitter = jitter
+        self.uris: dict[str, OIRecordType | None] = {}
+        for name, uri in (cmd_dict or Proteox_cmd_uri).items():
+            if "THIS_WONT_WORK" not in uri and not name.startswith("PUBLISH"):
+                self.uris[uri] = record_type(uri)
+        # the session manager / host procedures used by DECS<->VISA
+        self.procedures = {
+            'oi.decs.sessionmanager.system_control_mode': lambda: 1,
+            'oi.decs.sessionmanager.system_controller': lambda: CallResult(0, ""),
+            'oi.decs.sessionmanager.claim_system_control': lambda: CallResult(1, self.user_name),
+            'oi.decs.sessionmanager.relinquish_system_control': lambda: 1,
+            'oi.decs.host.name': lambda: HOST_NAME,
+            'oi.decs.host.decs_version': lambda: DECS_VERSION,
+        }
+        for uri, record in self.uris.items():
+            self.procedures[uri] = self._record_procedure(record)
+
+    @staticmethod
+    def _record_procedure(record: OIRecordType | None):
+        def procedure(*args):
+            if record is None:
+                return CallResult(*args) if args else 0
+            return CallResult(*fake_record(record))
+        return procedure
+
+    async def delay(self) -> None:
+        """
+        Wait as long as a call to DECS would take
+        """
+        await asyncio.sleep(max(0.0, random.uniform(self.latency - self.jitter,
+                                                    self.latency + self.jitter)))
+
+    async def call(self, uri: str, *args):
+        """
+        Answer a call without a router
+        """
+        await self.delay()
+        procedure = self.procedures.get(uri)
+        if procedure is None:
+            raise wamp_exceptions.ApplicationError(wamp_exceptions.ApplicationError.NO_SUCH_PROCEDURE)
+        return procedure(*args)
+
+class FakeDecsSession(ApplicationSession):
+    """
+    Registers the FakeDecs procedures with a WAMP router
+    """
+    async def onJoin(self, details):
+        fake: FakeDecs = self.config.extra['fake']
+        for uri, procedure in fake.procedures.items():
+            await self.register(self._delayed(fake, procedure), uri)
+        logger.info("Fake DECS registered %d procedures", len(fake.procedures))
+
+    @staticmethod
+    def _delayed(fake: FakeDecs, procedure):
+        async def endpoint(*args):
+            await fake.delay()
+            return procedure(*args)
+        return endpoint
+
+def main():
+    """
+    Run the fake DECS against a router
+    """
+    parser = argparse.ArgumentParser(description="Stand-in DECS for benchmarking")
+    parser.add_argument("--url", required=True, help="WAMP router url")
+    parser.add_argument("--realm", required=True, help="WAMP realm")
+    parser.add_argument("--user", default="bench", help="user name DECS<->VISA connects as")
+    parser.add_argument("--latency", type=float, default=0.002, help="mean call latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.001, help="call latency jitter (s)")
+    args = parser.parse_args()
+    fake = FakeDecs(args.user, args.latency, args.jitter)
+    runner = ApplicationRunner(args.url, args.realm, extra=dict(fake=fake))
+    runner.run(FakeDecsSession, log_level='critical')
+
+if __name__ == "__main__":
+    main()
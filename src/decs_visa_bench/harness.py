@@ -0,0 +1,270 @@
+"""
+Benchmark harness - starts DECS<->VISA against a fake DECS (either
+directly, or through a local crossbar router) and drives it through
+the socket interface with a mix of commands from a number of clients,
+measuring throughput, latency and the CPU used by DECS<->VISA
+"""
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import typing
+from pathlib import Path
+
+from decs_visa_tools.command_parser import registry
+from decs_visa_tools.command_registry import GET, SET
+from decs_visa_tools.decs_visa_settings import READ_DELIM, WRITE_DELIM, SHUTDOWN
+
+# where the DECS<->VISA scripts live
+SRC_PATH = Path(__file__).resolve().parent.parent
+
+REALM = "bench"
+USER = "bench"
+SECRET = "bench-secret"
+
+# arguments for the set_ commands used by the benchmark
+_SET_PAYLOADS = {
+    "set_MC_T": "0.1",
+    "set_SAMPLE_T": "0.1",
+    "set_MC_H": "0.0",
+    "set_MC_H_OFF": "0.0",
+    "set_STILL_H": "0.0",
+    "set_STILL_H_OFF": "0.0",
+    "set_MAG_STATE": "0",
+}
+
+def _get_commands() -> list[str]:
+    return [name for name, spec in registry.commands.items()
+            if spec.kind == GET and "THIS_WONT_WORK" not in spec.uri]
+
+def _set_commands() -> list[str]:
+    return [f"{name}:{payload}" for name, payload in _SET_PAYLOADS.items()
+            if name in registry.commands and registry.commands[name].kind == SET]
+
+# command mixes - (commands, weight) pairs
+MIXES: dict[str, list[tuple[list[str], float]]] = {
+    "get": [(_get_commands(), 0.9), (_set_commands(), 0.1)],
+    "set": [(_get_commands(), 0.3), (_set_commands(), 0.7)],
+    "idn": [(["*IDN?"], 1.0)],
+    "publish": [(["PUBLISH:benchmark,message"], 1.0)],
+}
+
+def next_command(mix: list[tuple[list[str], float]], rng: random.Random) -> str:
+    """
+    Pick a command from a mix
+    """
+    commands, = rng.choices([commands for commands, _ in mix],
+                            weights=[weight for _, weight in mix])
+    return rng.choice(commands)
+
+def cpu_seconds(pid: int) -> float | None:
+    """
+    CPU time (user + system) used so far by a process
+    """
+    try:
+        import psutil
+        times = psutil.Process(pid).cpu_times()
+        return times.user + times.system
+    except ImportError:
+        pass
+    try:
+        with open(f"/proc/{pid}/stat", encoding="utf-8") as f:
+            # the command name may contain spaces, so split after it
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, IndexError, ValueError):
+        return None
+
+def percentile(values: list[float], q: float) -> float:
+    """
+    The q (0 - 1) percentile of sorted values
+    """
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def wait_for_port(host: str, port: int, timeout: float) -> None:
+    """
+    Wait until something is listening on host:port
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection((host, port), timeout=1.0):
+                return
+        except OSError as e:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Nothing listening on {host}:{port}") from e
+            time.sleep(0.1)
+
+def _client(host: str, port: int, mix: list[tuple[list[str], float]], seed: int,
+            stop: threading.Event, latencies: list[float], errors: list[int]) -> None:
+    # closed loop - send a command, wait for its response, repeat
+    rng = random.Random(seed)
+    with socket.create_connection((host, port)) as conn:
+        reader = conn.makefile('r', encoding='utf-8', newline=WRITE_DELIM)
+        while not stop.is_set():
+            command = next_command(mix, rng)
+            started = time.perf_counter()
+            conn.sendall((command + READ_DELIM).encode('utf-8'))
+            response = reader.readline()
+            latencies.append(time.perf_counter() - started)
+            if not response or response.startswith(("Unkown", "uri not", SHUTDOWN)):
+                errors.append(1)
+                if not response or response.startswith(SHUTDOWN):
+                    break
+        reader.close()
+
+def run_scenario(host: str, port: int, pid: int, mix_name: str,
+                 clients: int, duration: float) -> dict[str, typing.Any]:
+    """
+    Drive the bridge with a command mix from a number
+    of clients for duration (s) and measure it
+    """
+    mix = MIXES[mix_name]
+    stop = threading.Event()
+    latencies: list[list[float]] = [[] for _ in range(clients)]
+    errors: list[int] = []
+    threads = [threading.Thread(target=_client,
+                                args=(host, port, mix, i, stop, latencies[i], errors))
+               for i in range(clients)]
+    cpu_before = cpu_seconds(pid)
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    cpu_after = cpu_seconds(pid)
+    samples = sorted(latency for client in latencies for latency in client)
+    return {
+        "mix": mix_name,
+        "clients": clients,
+        "requests": len(samples),
+        "errors": len(errors),
+        "throughput": len(samples) / elapsed,
+        "p50_ms": 1e3 * percentile(samples, 0.5),
+        "p99_ms": 1e3 * percentile(samples, 0.99),
+        "cpu_percent": None if cpu_before is None or cpu_after is None
+                       else 100.0 * (cpu_after - cpu_before) / elapsed,
+    }
+
+def _crossbar_config(router_port: int) -> dict:
+    permissions = [{"uri": "", "match": "prefix",
+                    "allow": {"call": True, "register": True, "publish": True, "subscribe": True},
+                    "disclose": {"caller": False, "publisher": False},
+                    "cache": True}]
+    return {
+        "version": 2,
+        "workers": [{
+            "type": "router",
+            "realms": [{"name": REALM, "roles": [{"name": "bench", "permissions": permissions}]}],
+            "transports": [{
+                "type": "websocket",
+                "endpoint": {"type": "tcp", "interface": "127.0.0.1", "port": router_port},
+                "auth": {
+                    "anonymous": {"type": "static", "role": "bench"},
+                    "wampcra": {"type": "static",
+                                "users": {USER: {"secret": SECRET, "role": "bench"}}},
+                },
+            }],
+        }],
+    }
+
+class Bridge:
+    """
+    DECS<->VISA (and, for a router, crossbar and the fake DECS)
+    running in subprocesses for the length of a benchmark
+    """
+    def __init__(self, router: str, port: int, latency: float, jitter: float,
+                 router_port: int = 8089) -> None:
+        self.host = "localhost"
+        self.port = port
+        self._processes: list[subprocess.Popen] = []
+        self._cbdir: str | None = None
+        python = sys.executable
+        fake_args = ["--latency", str(latency), "--jitter", str(jitter), "--user", USER]
+        if router == "direct":
+            self.process = self._start([python, "-m", "decs_visa_bench.direct",
+                                        "--port", str(port)] + fake_args)
+        elif router == "crossbar":
+            crossbar = shutil.which("crossbar")
+            if crossbar is None:
+                raise RuntimeError("crossbar is not installed - use the direct router")
+            self._cbdir = tempfile.mkdtemp(prefix="decs_visa_bench_")
+            with open(Path(self._cbdir) / "config.json", "w", encoding="utf-8") as f:
+                json.dump(_crossbar_config(router_port), f)
+            self._start([crossbar, "start", "--cbdir", self._cbdir, "--loglevel", "warn"])
+            wait_for_port("127.0.0.1", router_port, 30.0)
+            url = f"ws://127.0.0.1:{router_port}/ws"
+            self._start([python, "-m", "decs_visa_bench.fake_decs",
+                         "--url", url, "--realm", REALM] + fake_args)
+            # give the fake DECS time to register its procedures
+            time.sleep(2.0)
+            env = dict(os.environ, WAMP_USER=USER, WAMP_USER_SECRET=SECRET,
+                       WAMP_ROUTER_URL=url, WAMP_REALM=REALM,
+                       BIND_SERVER_TO_INTERFACE=self.host, SERVER_PORT=str(port))
+            self.process = self._start([python, "decs_visa.py"], env)
+        else:
+            raise ValueError(f"Unknown router: {router}")
+        wait_for_port(self.host, port, 30.0)
+
+    def _start(self, args: list[str], env: dict | None = None) -> subprocess.Popen:
+        process = subprocess.Popen(args, cwd=SRC_PATH, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self._processes.append(process)
+        return process
+
+    def close(self) -> None:
+        """
+        Shut down DECS<->VISA and anything started for it
+        """
+        try:
+            with socket.create_connection((self.host, self.port), timeout=5.0) as conn:
+                conn.sendall((SHUTDOWN + READ_DELIM).encode('utf-8'))
+            self.process.wait(timeout=10.0)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+        for process in reversed(self._processes):
+            if process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(timeout=10.0)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+        if self._cbdir is not None:
+            shutil.rmtree(self._cbdir, ignore_errors=True)
+
+def version() -> str:
+    """
+    The git revision being benchmarked
+    """
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=SRC_PATH,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(results: list[dict], previous: list[dict]) -> list[str]:
+    """
+    Lines comparing each scenario with the same scenario in
+    a previous run - throughput and p99 latency ratios
+    """
+    earlier = {(result["mix"], result["clients"]): result for result in previous}
+    lines = []
+    for result in results:
+        before = earlier.get((result["mix"], result["clients"]))
+        if before is None or not before["throughput"] or not before["p99_ms"]:
+            continue
+        lines.append(f"{result['mix']:>8} {result['clients']:>4}  "
+                     f"throughput x{result['throughput'] / before['throughput']:.2f}  "
+                     f"p99 x{result['p99_ms'] / before['p99_ms']:.2f}")
+    return lines
@@ -0,0 +1,169 @@
+"""
+Replays a capture (see decs_visa_tools/capture.py) through the
+WAMP component - the same parsing and dispatch as a live session -
+with every WAMP call answered from the capture instead of DECS, and
+the records DECS published delivered as they were, relative to the
+commands (see ReplayBridge).
+
+The local time a record was received (RESPONSE_MODE:FULL) is not
+compared, nor can responses that depend on when the replay runs
+(e.g. *STAT?, *CACHE? or a _HIST request for a duration) be expected
+to match
+"""
+import asyncio
+import collections
+import json
+import time
+import typing
+
+from autobahn.wamp import exception as wamp_exceptions
+from autobahn.wamp.types import CallResult, ComponentConfig
+
+from decs_visa_bench.direct import DirectComponent
+from decs_visa_components.queue_bridge import QueueBridge
+from decs_visa_tools.capture import CMD, RESP, CALL, EVENT
+from decs_visa_tools.metrics import Metrics
+from decs_visa_tools.response_cache import ResponseCache
+from decs_visa_tools.single_flight import SingleFlight
+from decs_visa_tools.telemetry_cache import TelemetryCache
+from decs_visa_tools.decs_visa_settings import RESPONSE_CACHE, SINGLE_FLIGHT, SHUTDOWN
+from decs_visa_tools.decs_visa_settings import SUBSCRIPTION_MAX_AGE
+from decs_visa_tools.decs_visa_settings import COMPOUND_DELIM, FULL_RECORD_DELIM
+
+# fields of a full record (see response_parser.format_record)
+_FULL_RECORD_FIELDS = 5
+
+def _call_key(uri: str, args: typing.Sequence) -> tuple[str, str]:
+    return uri, json.dumps(list(args), default=str)
+
+def normalise(response: str) -> str:
+    """
+    A response without the local received times of any full
+    records, which differ each time the records are decoded
+    """
+    parts = response.split(COMPOUND_DELIM)
+    for i, part in enumerate(parts):
+        fields = part.split(FULL_RECORD_DELIM)
+        if len(fields) == _FULL_RECORD_FIELDS:
+            parts[i] = FULL_RECORD_DELIM.join(fields[:-1] + [""])
+    return COMPOUND_DELIM.join(parts)
+
+class RecordedDecs:
+    """
+    Answers WAMP calls with the results recorded for the same uri
+    and arguments, in the order they were recorded (the last result
+    is repeated once they run out).  If paced, each call takes as
+    long as it did when it was recorded
+    """
+    def __init__(self, events: list[dict], paced: bool) -> None:
+        self.paced = paced
+        self._calls: dict[tuple[str, str], collections.deque] = {}
+        # fall back to any call to the same uri
+        self._uris: dict[str, collections.deque] = {}
+        for event in events:
+            if event["e"] == CALL:
+                self._calls.setdefault(_call_key(event["u"], event["a"]),
+                                       collections.deque()).append(event)
+                self._uris.setdefault(event["u"], collections.deque()).append(event)
+        # calls with nothing recorded to answer them
+        self.misses = 0
+
+    async def call(self, uri: str, *args):
+        """
+        Answer a call from the capture
+        """
+        recorded = self._calls.get(_call_key(uri, args)) or self._uris.get(uri)
+        if not recorded:
+            self.misses += 1
+            raise wamp_exceptions.ApplicationError(
+                wamp_exceptions.ApplicationError.NO_SUCH_PROCEDURE)
+        event = recorded.popleft() if len(recorded) > 1 else recorded[0]
+        if self.paced:
+            await asyncio.sleep(event["ms"] * 1e-3)
+        if "x" in event:
+            raise wamp_exceptions.ApplicationError(event["x"])
+        return CallResult(*event["r"])
+
+class ReplayBridge(QueueBridge):
+    """
+    A QueueBridge that publishes the records DECS published before
+    each command was received as the component takes the command,
+    so requests answered from the published records see the same
+    records however fast the replay runs
+    """
+    def __init__(self, events: list[dict]) -> None:
+        super().__init__()
+        self.telemetry = TelemetryCache(SUBSCRIPTION_MAX_AGE)
+        self.publications = collections.deque(event for event in events if event["e"] == EVENT)
+        self._received = {(event["c"], event["s"]): event["t"]
+                          for event in events if event["e"] == CMD}
+
+    async def get_request(self) -> typing.Any:
+        item = await super().get_request()
+        if isinstance(item, tuple):
+            received = self._received.get(item[:2], 0.0)
+            if self.publications and self.publications[0]["t"] <= received:
+                # let the commands already taken start first
+                await asyncio.sleep(0)
+            while self.publications and self.publications[0]["t"] <= received:
+                event = self.publications.popleft()
+                self.telemetry.update(event["u"], *event["r"])
+        return item
+
+class ReplayResult(typing.NamedTuple):
+    """
+    The outcome of a replay
+    """
+    commands: int
+    seconds: float
+    # responses that differ from those recorded, as
+    # (command, recorded response, replayed response)
+    mismatches: list[tuple[str, str, str]]
+    misses: int
+    metrics: Metrics
+
+async def replay(events: list[dict], paced: bool = False) -> ReplayResult:
+    """
+    Feed the captured commands to the WAMP component - at the
+    recorded pace, or as fast as possible - and compare the
+    responses with those recorded
+    """
+    bridge = ReplayBridge(events)
+    decs = RecordedDecs(events, paced)
+    component = DirectComponent(ComponentConfig("replay", extra=dict(
+        bridge=bridge, user_name="replay", user_secret="", fake=decs)))
+    component.metrics = Metrics()
+    if RESPONSE_CACHE:
+        component.responses = ResponseCache()
+    if SINGLE_FLIGHT:
+        component.single_flight = SingleFlight()
+    if bridge.publications:
+        component.telemetry = bridge.telemetry
+    commands = [event for event in events if event["e"] == CMD]
+    recorded = {(event["c"], event["s"]): event["d"] for event in events if event["e"] == RESP}
+
+    async def feed() -> None:
+        loop = asyncio.get_running_loop()
+        start = loop.time() - (commands[0]["t"] if commands else 0.0)
+        for event in commands:
+            if paced:
+                await asyncio.sleep(max(0.0, start + event["t"] - loop.time()))
+            bridge.put_request((event["c"], event["s"], event["d"]))
+        bridge.put_request(SHUTDOWN)
+
+    started = time.perf_counter()
+    await asyncio.gather(feed(), component.process_queue())
+    seconds = time.perf_counter() - started
+
+    sent = {(event["c"], event["s"]): event["d"] for event in commands}
+    mismatches = []
+    for response in bridge.get_responses():
+        if response == SHUTDOWN:
+            continue
+        client_id, seq, data = response
+        if seq is None or (client_id, seq) not in recorded:
+            continue
+        if normalise(data) != normalise(recorded[(client_id, seq)]):
+            mismatches.append((sent[(client_id, seq)], recorded[(client_id, seq)], data))
+    bridge.close()
+    return ReplayResult(len(commands), seconds, mismatches, decs.misses, component.metrics)
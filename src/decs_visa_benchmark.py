@@ -0,0 +1,75 @@
+"""
+Benchmark DECS<->VISA against a fake DECS
+
+python decs_visa_benchmark.py --mixes get,set,idn,publish --clients 1,4,16
+
+Results are printed, and saved (as JSON) so they can be
+compared with a later run using --compare
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from decs_visa_bench.harness import Bridge, MIXES, compare, run_scenario, version
+
+def main():
+    """
+    Run each command mix with each number of clients
+    """
+    parser = argparse.ArgumentParser(description="Benchmark DECS<->VISA against a fake DECS")
+    parser.add_argument("--router", choices=("direct", "crossbar"), default="direct",
+                        help="call the fake DECS directly, or through a local crossbar router")
+    parser.add_argument("--mixes", default=','.join(MIXES), help="command mixes to run")
+    parser.add_argument("--clients", default="1,4,16", help="numbers of socket clients")
+    parser.add_argument("--duration", type=float, default=5.0, help="length of each run (s)")
+    parser.add_argument("--latency", type=float, default=0.002, help="mean DECS latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.001, help="DECS latency jitter (s)")
+    parser.add_argument("--port", type=int, default=33590, help="socket server port")
+    parser.add_argument("--output", default="bench_results", help="directory for the results")
+    parser.add_argument("--compare", help="results file from an earlier run")
+    args = parser.parse_args()
+    mixes = args.mixes.split(',')
+    unknown = [mix for mix in mixes if mix not in MIXES]
+    if unknown:
+        parser.error(f"unknown mix: {', '.join(unknown)}")
+    client_counts = [int(clients) for clients in args.clients.split(',')]
+
+    try:
+        bridge = Bridge(args.router, args.port, args.latency, args.jitter)
+    except (RuntimeError, TimeoutError) as e:
+        print(e)
+        sys.exit(1)
+    results = []
+    print(f"{'mix':>8} {'clients':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'cpu %':>6} {'errors':>6}")
+    try:
+        for mix in mixes:
+            for clients in client_counts:
+                result = run_scenario(bridge.host, bridge.port, bridge.process.pid,
+                                      mix, clients, args.duration)
+                results.append(result)
+                cpu = "" if result["cpu_percent"] is None else f"{result['cpu_percent']:.1f}"
+                print(f"{mix:>8} {clients:>7} {result['throughput']:>9.1f} "
+                      f"{result['p50_ms']:>8.3f} {result['p99_ms']:>8.3f} {cpu:>6} "
+                      f"{result['errors']:>6}")
+    finally:
+        bridge.close()
+
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    revision = version()
+    path = output / f"{time.strftime('%Y%m%d-%H%M%S')}-{revision}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"version": revision, "router": args.router, "latency": args.latency,
+                   "jitter": args.jitter, "duration": args.duration,
+                   "python": sys.version.split()[0], "results": results}, f, indent=1)
+    print(f"Results saved to {path}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        print(f"Compared with {previous.get('version', args.compare)}:")
+        print('\n'.join(compare(results, previous["results"])))
+
+if __name__ == "__main__":
+    main()
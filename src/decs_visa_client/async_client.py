@@ -0,0 +1,266 @@
+"""
+An asyncio client for the DECS<->VISA socket server
+
+async with AsyncClient("localhost", 33576) as decs:
+    await decs.get("get_MC_T")
+    await asyncio.gather(decs.get("get_MC_T"), decs.get("get_STILL_T"))
+
+Any number of tasks can share one connection - their commands are
+pipelined and each response is matched to its command by order.
+AsyncClientPool spreads the commands over several connections, so a
+slow command (e.g. WAIT) doesn't hold up the rest.
+"""
+import asyncio
+import collections
+import typing
+
+from decs_visa_client.decoding import Record, Value, DecsVisaError
+from decs_visa_client.decoding import checked, compound, decode_response
+from decs_visa_client.decoding import format_set, format_wait, is_idempotent, split_compound
+
+from decs_visa_tools.decs_visa_settings import HOST
+from decs_visa_tools.decs_visa_settings import PORT
+from decs_visa_tools.decs_visa_settings import READ_DELIM
+from decs_visa_tools.decs_visa_settings import WRITE_DELIM
+from decs_visa_tools.decs_visa_settings import SHUTDOWN
+
+# longest response line (bytes) - large vectors and compound queries
+LINE_LIMIT = 2 ** 24
+
+class AsyncClient:
+    """
+    A pipelined connection to the socket server
+    """
+    def __init__(self, host: str = HOST, port: int = PORT, timeout: float | None = 10.0,
+                 reconnect: bool = True) -> None:
+        self.host = host
+        self.port = int(port)
+        # longest wait (s) for a response
+        self.timeout = timeout
+        self.reconnect = reconnect
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._reader_task: asyncio.Task | None = None
+        # futures for the responses still to come, in order
+        self._waiting: collections.deque[asyncio.Future] = collections.deque()
+        self._connecting = asyncio.Lock()
+        # WAITs outstanding - commands sent meanwhile are held until
+        # they end, so have no deadline (see wait)
+        self._waits = 0
+
+    async def __aenter__(self) -> "AsyncClient":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    @property
+    def in_flight(self) -> int:
+        """
+        The number of commands waiting for a response
+        """
+        return len(self._waiting)
+
+    async def connect(self) -> None:
+        """
+        Connect to the socket server (if not already connected)
+        """
+        async with self._connecting:
+            if self._writer is not None:
+                return
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port, limit=LINE_LIMIT), self.timeout)
+            self._reader_task = asyncio.create_task(self._read_responses(self._reader))
+
+    async def _read_responses(self, reader: asyncio.StreamReader) -> None:
+        delim = WRITE_DELIM.encode('utf-8')
+        error: Exception = ConnectionError("DECS<->VISA closed the connection")
+        try:
+            while True:
+                line = (await reader.readuntil(delim))[:-len(delim)].decode('utf-8', errors='replace')
+                if line == SHUTDOWN:
+                    error = ConnectionError("DECS<->VISA has shut down")
+                    break
+                if self._waiting:
+                    future = self._waiting.popleft()
+                    if not future.done():
+                        future.set_result(line)
+        except asyncio.IncompleteReadError:
+            pass
+        except (OSError, asyncio.LimitOverrunError) as e:
+            error = ConnectionError(f"Connection to DECS<->VISA lost: {e}")
+        self._disconnect(error)
+
+    def _disconnect(self, error: Exception) -> None:
+        """
+        Drop the connection, failing any commands still to be answered
+        """
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._reader_task is not None and self._reader_task is not asyncio.current_task():
+            self._reader_task.cancel()
+        self._reader_task = None
+        while self._waiting:
+            future = self._waiting.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+    async def close(self) -> None:
+        """
+        Close the connection
+        """
+        writer = self._writer
+        self._disconnect(ConnectionError("Connection closed"))
+        if writer is not None:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def query_many(self, commands: typing.Sequence[str]) -> list[str]:
+        """
+        Send the commands together and return the responses,
+        in the same order, as text
+        """
+        return await self._query_many(commands, self.timeout)
+
+    async def _query_many(self, commands: typing.Sequence[str],
+                          timeout: float | None) -> list[str]:
+        if not commands:
+            return []
+        # server read == client write
+        message = ''.join(command + READ_DELIM for command in commands).encode('utf-8')
+        retry = self.reconnect and all(is_idempotent(command) for command in commands)
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.connect()
+            writer = self._writer
+            # write and queue the futures together, so responses
+            # are matched to commands in the order they were sent
+            futures = [loop.create_future() for _ in commands]
+            writer.write(message)
+            self._waiting.extend(futures)
+            try:
+                await writer.drain()
+                return list(await asyncio.wait_for(asyncio.gather(*futures),
+                                                   None if self._waits else timeout))
+            except asyncio.TimeoutError as e:
+                # any late responses would be read as answers to later commands
+                self._disconnect(ConnectionError("Response timed out"))
+                raise TimeoutError(f"No response from DECS<->VISA within {timeout} s") from e
+            except OSError as e:
+                if writer is self._writer:
+                    self._disconnect(ConnectionError(f"Connection to DECS<->VISA lost: {e}"))
+                if not retry:
+                    raise
+                retry = False
+
+    async def query(self, command: str) -> str:
+        """
+        Send a command and return the response as text
+        """
+        return (await self.query_many([command]))[0]
+
+    async def get(self, name: str) -> Value | Record:
+        """
+        The typed value of a get_ request - raises
+        DecsVisaError if DECS<->VISA responds with an error
+        """
+        return decode_response(await self.query(name))
+
+    async def get_many(self, names: typing.Sequence[str]) -> dict[str, Value | Record]:
+        """
+        The typed values of several get_ requests, by request,
+        from a single compound query
+        """
+        if not names:
+            return {}
+        return split_compound(names, await self.query(compound(names)))
+
+    async def set(self, name: str, value: typing.Any) -> Value | Record:
+        """
+        Send a set_ command, and return the typed response
+        """
+        return decode_response(await self.query(format_set(name, value)))
+
+    async def wait(self, condition: str, stable: float | None = None,
+                   timeout: float | None = None) -> Value:
+        """
+        Wait until a condition e.g. get_MC_T<0.02 has held for stable (s)
+        (see WAIT) and return the latest value - raises TimeoutError
+        if it doesn't within timeout (s).  Commands sent on the same
+        connection meanwhile are held until the WAIT ends, so they
+        don't time out in the meantime
+        """
+        # the response may take as long as the WAIT
+        self._waits += 1
+        try:
+            responses = await self._query_many([format_wait(condition, stable, timeout)], None)
+        finally:
+            self._waits -= 1
+        response = checked(responses[0])
+        result, _, value = response.partition(';')
+        if result == "WAIT TIMEOUT":
+            raise TimeoutError(f"{condition} not met within {timeout} s")
+        if result != "WAIT DONE":
+            raise DecsVisaError(response)
+        return decode_response(value)
+
+class AsyncClientPool:
+    """
+    Several connections, each command is sent on the least busy
+    (the server must allow several clients, see MULTI_CLIENT_SERVER)
+    """
+    def __init__(self, host: str = HOST, port: int = PORT, size: int = 4,
+                 **kwargs) -> None:
+        self._clients = [AsyncClient(host, port, **kwargs) for _ in range(size)]
+
+    async def __aenter__(self) -> "AsyncClientPool":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def client(self) -> AsyncClient:
+        """
+        The connection with the fewest commands waiting
+        """
+        return min(self._clients, key=lambda client: client.in_flight)
+
+    async def query_many(self, commands: typing.Sequence[str]) -> list[str]:
+        """
+        See AsyncClient.query_many
+        """
+        return await self.client().query_many(commands)
+
+    async def query(self, command: str) -> str:
+        """
+        See AsyncClient.query
+        """
+        return await self.client().query(command)
+
+    async def get(self, name: str) -> Value | Record:
+        """
+        See AsyncClient.get
+        """
+        return await self.client().get(name)
+
+    async def get_many(self, names: typing.Sequence[str]) -> dict[str, Value | Record]:
+        """
+        See AsyncClient.get_many
+        """
+        return await self.client().get_many(names)
+
+    async def set(self, name: str, value: typing.Any) -> Value | Record:
+        """
+        See AsyncClient.set
+        """
+        return await self.client().set(name, value)
+
+    async def close(self) -> None:
+        """
+        Close every connection
+        """
+        await asyncio.gather(*(client.close() for client in self._clients))
@@ -0,0 +1,249 @@
+"""
+A client for the DECS<->VISA socket server, without PyVISA
+
+with Client("localhost", 33576) as decs:
+    decs.get("get_MC_T")                    # 0.0123
+    decs.get_many(["get_MC_T", "get_STILL_T"])
+    decs.set("set_MC_T", 0.1)
+    decs.query_many(["get_MC_T", "*IDN?"])  # pipelined
+
+Commands sent together are pipelined - written at once and answered
+in order - rather than each waiting for the last.  If the connection
+is lost, it is made again and commands that only read from the system
+are sent again.  ClientPool shares connections between threads.
+"""
+import contextlib
+import queue
+import socket
+import typing
+
+from decs_visa_client.decoding import Record, Value, DecsVisaError
+from decs_visa_client.decoding import checked, compound, decode_response, decode_sample
+from decs_visa_client.decoding import format_set, format_wait, is_idempotent, split_compound
+
+from decs_visa_tools.decs_visa_settings import HOST
+from decs_visa_tools.decs_visa_settings import PORT
+from decs_visa_tools.decs_visa_settings import READ_DELIM
+from decs_visa_tools.decs_visa_settings import WRITE_DELIM
+from decs_visa_tools.decs_visa_settings import SHUTDOWN
+
+# bytes read from the socket at a time
+RECV_SIZE = 65536
+
+class Client:
+    """
+    A connection to the socket server.  Not thread safe - share
+    connections between threads with a ClientPool
+    """
+    def __init__(self, host: str = HOST, port: int = PORT, timeout: float | None = 10.0,
+                 reconnect: bool = True) -> None:
+        self.host = host
+        self.port = int(port)
+        # longest wait (s) for a response
+        self.timeout = timeout
+        self.reconnect = reconnect
+        self._sock: socket.socket | None = None
+        self._buffer = bytearray()
+        # server write == client read
+        self._delim = WRITE_DELIM.encode('utf-8')
+
+    def __enter__(self) -> "Client":
+        self.connect()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def connect(self) -> None:
+        """
+        Connect to the socket server (if not already connected)
+        """
+        if self._sock is not None:
+            return
+        sock = socket.create_connection((self.host, self.port), self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock = sock
+        self._buffer.clear()
+
+    def close(self) -> None:
+        """
+        Close the connection
+        """
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def _read_line(self) -> str:
+        while True:
+            end = self._buffer.find(self._delim)
+            if end != -1:
+                line = self._buffer[:end].decode('utf-8', errors='replace')
+                del self._buffer[:end + len(self._delim)]
+                if line == SHUTDOWN:
+                    raise ConnectionError("DECS<->VISA has shut down")
+                return line
+            chunk = self._sock.recv(RECV_SIZE)
+            if not chunk:
+                raise ConnectionError("DECS<->VISA closed the connection")
+            self._buffer += chunk
+
+    def query_many(self, commands: typing.Sequence[str]) -> list[str]:
+        """
+        Send the commands together and return the responses,
+        in the same order, as text
+        """
+        return self._query_many(commands, self.timeout)
+
+    def _query_many(self, commands: typing.Sequence[str],
+                    timeout: float | None) -> list[str]:
+        if not commands:
+            return []
+        # server read == client write
+        message = ''.join(command + READ_DELIM for command in commands).encode('utf-8')
+        retry = self.reconnect and all(is_idempotent(command) for command in commands)
+        while True:
+            self.connect()
+            # set for each attempt, as a new connection has self.timeout
+            self._sock.settimeout(timeout)
+            try:
+                self._sock.sendall(message)
+                return [self._read_line() for _ in commands]
+            except TimeoutError:
+                # any late responses would be read as answers to later commands
+                self.close()
+                raise
+            except OSError:
+                self.close()
+                if not retry:
+                    raise
+                retry = False
+
+    def query(self, command: str) -> str:
+        """
+        Send a command and return the response as text
+        """
+        return self.query_many([command])[0]
+
+    def get(self, name: str) -> Value | Record:
+        """
+        The typed value of a get_ request - raises
+        DecsVisaError if DECS<->VISA responds with an error
+        """
+        return decode_response(self.query(name))
+
+    def get_many(self, names: typing.Sequence[str]) -> dict[str, Value | Record]:
+        """
+        The typed values of several get_ requests, by request,
+        from a single compound query
+        """
+        if not names:
+            return {}
+        return split_compound(names, self.query(compound(names)))
+
+    def set(self, name: str, value: typing.Any) -> Value | Record:
+        """
+        Send a set_ command, and return the typed response
+        """
+        return decode_response(self.query(format_set(name, value)))
+
+    def wait(self, condition: str, stable: float | None = None,
+             timeout: float | None = None) -> Value:
+        """
+        Wait until a condition e.g. get_MC_T<0.02 has held for stable (s)
+        (see WAIT) and return the latest value - raises TimeoutError
+        if it doesn't within timeout (s)
+        """
+        # the response may take as long as the WAIT
+        response = checked(self._query_many([format_wait(condition, stable, timeout)], None)[0])
+        result, _, value = response.partition(';')
+        if result == "WAIT TIMEOUT":
+            raise TimeoutError(f"{condition} not met within {timeout} s")
+        if result != "WAIT DONE":
+            raise DecsVisaError(response)
+        return decode_response(value)
+
+    def stream(self, names: typing.Sequence[str],
+               rate: str | None = None) -> typing.Iterator[tuple[float, list[Value]]]:
+        """
+        Yield the (time, values) pushed by STREAM e.g. rate="10Hz".
+        The stream has a connection of its own, closed with the iterator
+        """
+        with Client(self.host, self.port, None, reconnect=False) as client:
+            command = f"STREAM {','.join(names)}" + (f"@{rate}" if rate else "")
+            response = client.query(command)
+            if response != "STREAMING":
+                raise DecsVisaError(response)
+            while True:
+                yield decode_sample(client._read_line())
+
+class ClientPool:
+    """
+    Connections shared between threads - each call uses whichever
+    connection is free, so slow commands don't hold up the others
+    (the server must allow several clients, see MULTI_CLIENT_SERVER)
+    """
+    def __init__(self, host: str = HOST, port: int = PORT, size: int = 4,
+                 **kwargs) -> None:
+        self._idle: queue.LifoQueue[Client] = queue.LifoQueue()
+        self._clients = [Client(host, port, **kwargs) for _ in range(size)]
+        for client in self._clients:
+            self._idle.put(client)
+
+    def __enter__(self) -> "ClientPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @contextlib.contextmanager
+    def client(self) -> typing.Iterator[Client]:
+        """
+        Borrow a connection
+        """
+        client = self._idle.get()
+        try:
+            yield client
+        finally:
+            self._idle.put(client)
+
+    def query_many(self, commands: typing.Sequence[str]) -> list[str]:
+        """
+        See Client.query_many
+        """
+        with self.client() as client:
+            return client.query_many(commands)
+
+    def query(self, command: str) -> str:
+        """
+        See Client.query
+        """
+        with self.client() as client:
+            return client.query(command)
+
+    def get(self, name: str) -> Value | Record:
+        """
+        See Client.get
+        """
+        with self.client() as client:
+            return client.get(name)
+
+    def get_many(self, names: typing.Sequence[str]) -> dict[str, Value | Record]:
+        """
+        See Client.get_many
+        """
+        with self.client() as client:
+            return client.get_many(names)
+
+    def set(self, name: str, value: typing.Any) -> Value | Record:
+        """
+        See Client.set
+        """
+        with self.client() as client:
+            return client.set(name, value)
+
+    def close(self) -> None:
+        """
+        Close every connection
+        """
+        for client in self._clients:
+            client.close()
@@ -0,0 +1,135 @@
+"""
+Module to format commands for, and decode the responses from,
+the DECS<->VISA socket server - shared by the sync and asyncio clients
+
+Values come back as text (see decs_visa_tools/response_parser.py):
+a scalar, a , joined vector, true / false or any other text, and in
+full record mode value|record type|DECS time|status|received time
+"""
+import typing
+
+from decs_visa_tools.decs_visa_settings import COMPOUND_DELIM
+from decs_visa_tools.decs_visa_settings import FULL_RECORD_DELIM
+from decs_visa_tools.error_responses import is_error
+
+Value = int | float | bool | str | tuple
+
+class DecsVisaError(Exception):
+    """
+    DECS<->VISA responded with an error rather than a value
+    """
+
+class Record(typing.NamedTuple):
+    """
+    A full record mode response (see RESPONSE_MODE)
+    """
+    value: Value
+    record_type: str
+    decs_time: float | None
+    status: int | None
+    received: float
+
+def decode_value(text: str) -> Value:
+    """
+    The typed value of a response - int, float, bool,
+    a tuple for a vector, or otherwise the text
+    """
+    text = text.strip()
+    if text in ("True", "true"):
+        return True
+    if text in ("False", "false"):
+        return False
+    for number in (int, float):
+        try:
+            return number(text)
+        except ValueError:
+            pass
+    if ',' in text:
+        parts = [decode_value(part) for part in text.split(',')]
+        if all(isinstance(part, (int, float)) and not isinstance(part, bool) for part in parts):
+            return tuple(parts)
+    return text
+
+def decode_record(text: str) -> Record:
+    """
+    Decode a full record mode response
+    """
+    parts = text.split(FULL_RECORD_DELIM)
+    if len(parts) != 5:
+        raise DecsVisaError(text)
+    value, record_type, decs_time, status, received = parts
+    return Record(decode_value(value), record_type,
+                  float(decs_time) if decs_time else None,
+                  int(status) if status else None, float(received))
+
+def checked(response: str) -> str:
+    """
+    The response, unless it is an error
+    """
+    if is_error(response):
+        raise DecsVisaError(response)
+    return response
+
+def decode_response(response: str) -> Value | Record:
+    """
+    The typed value of a get_ / set_ response
+    """
+    checked(response)
+    if response.count(FULL_RECORD_DELIM) == 4:
+        return decode_record(response)
+    return decode_value(response)
+
+def format_set(name: str, value: typing.Any) -> str:
+    """
+    A set_ command for a value - a sequence is , joined
+    """
+    if isinstance(value, bool):
+        payload = "true" if value else "false"
+    elif isinstance(value, (list, tuple)):
+        payload = ','.join("true" if item is True else "false" if item is False else str(item)
+                           for item in value)
+    else:
+        payload = str(value)
+    return f"{name}:{payload}"
+
+def format_wait(condition: str, stable: float | None = None, timeout: float | None = None) -> str:
+    """
+    A WAIT command e.g. get_MC_T<0.02 stable=60s timeout=3600s
+    """
+    words = ["WAIT", condition]
+    if stable is not None:
+        words.append(f"stable={stable}s")
+    if timeout is not None:
+        words.append(f"timeout={timeout}s")
+    return ' '.join(words)
+
+def compound(names: typing.Sequence[str]) -> str:
+    """
+    A compound query for several get_ requests
+    """
+    return COMPOUND_DELIM.join(names)
+
+def split_compound(names: typing.Sequence[str], response: str) -> dict[str, Value | Record]:
+    """
+    The typed values from a compound query, by request
+    """
+    parts = response.split(COMPOUND_DELIM)
+    if len(parts) != len(names):
+        raise DecsVisaError(response)
+    return {name: decode_response(part) for name, part in zip(names, parts)}
+
+def decode_sample(line: str) -> tuple[float, list[Value]]:
+    """
+    The time and values of a line pushed by STREAM
+    """
+    if line.startswith("STREAM ERROR"):
+        raise DecsVisaError(line)
+    timestamp, *values = line.split(COMPOUND_DELIM)
+    return float(timestamp), [decode_value(value) for value in values]
+
+def is_idempotent(command: str) -> bool:
+    """
+    Can the command safely be sent again if the
+    connection was lost before it was answered?
+    """
+    return command.startswith(("get_", "*", "WAIT"))
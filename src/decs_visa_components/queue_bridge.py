@@ -0,0 +1,154 @@
+"""
+Event driven IPC between the socket server thread and
+the WAMP event loop.
+
+Requests are handed to the event loop with call_soon_threadsafe
+into an asyncio.Queue, so the WAMP component simply awaits the next
+request.  Responses go onto a thread safe queue and a byte written to
+a socketpair wakes the socket server's selector, so neither side polls.
+"""
+import asyncio
+import queue
+import socket
+import threading
+import time
+import typing
+
+# passed to the WAMP component (in place of a command)
+# when a socket client disconnects
+CLIENT_DISCONNECTED = "CLIENT_DISCONNECTED"
+
+class QueueBridge:
+    """
+    Pair of request / response queues shared by the
+    socket server thread and the WAMP component
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._requests: asyncio.Queue | None = None
+        # requests that arrive before the WAMP session has joined
+        self._early: list[typing.Any] = []
+        self._responses: queue.SimpleQueue = queue.SimpleQueue()
+        # the socket server selects on _wake_recv
+        self._wake_recv, self._wake_send = socket.socketpair()
+        self._wake_recv.setblocking(False)
+        self._wake_send.setblocking(False)
+        self._wake_pending = False
+        # time.perf_counter() when the request last returned
+        # by get_request() was handed to the bridge
+        self.queued_at = 0.0
+
+    ################################
+    #   WAMP event loop side       #
+    ################################
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Start delivering requests to the given event loop.  Requests
+        still queued for a session that has ended are kept for the
+        next session on the same loop
+        """
+        with self._lock:
+            if self._loop is loop and self._requests is not None:
+                return
+            self._loop = loop
+            self._requests = asyncio.Queue()
+            for entry in self._early:
+                self._requests.put_nowait(entry)
+            self._early.clear()
+
+    async def get_request(self) -> typing.Any:
+        """
+        Wait for the next request from the socket server.
+        Returns None if the wait was interrupted
+        """
+        assert self._requests is not None, "bridge is not attached to an event loop"
+        self.queued_at, item = await self._requests.get()
+        return item
+
+    def interrupt(self) -> None:
+        """
+        Wake a pending get_request() (from the event loop)
+        """
+        if self._requests is not None:
+            self._requests.put_nowait((time.perf_counter(), None))
+
+    def request_depth(self) -> int:
+        """
+        Number of requests waiting to be processed
+        """
+        if self._requests is None:
+            return len(self._early)
+        return self._requests.qsize()
+
+    def put_response(self, item: typing.Any) -> None:
+        """
+        Hand a response to the socket server (from any thread)
+        """
+        self._responses.put(item)
+        # only one wake-up byte is needed however
+        # many responses are waiting to be collected
+        if not self._wake_pending:
+            self._wake_pending = True
+            try:
+                self._wake_send.send(b"\0")
+            except (BlockingIOError, OSError):
+                pass
+
+    ################################
+    #   Socket server thread side  #
+    ################################
+
+    def put_request(self, item: typing.Any) -> None:
+        """
+        Hand a request to the WAMP event loop
+        """
+        # requests are time stamped, so the time spent queued can be measured
+        entry = (time.perf_counter(), item)
+        with self._lock:
+            if self._loop is None or self._requests is None:
+                self._early.append(entry)
+                return
+            try:
+                self._loop.call_soon_threadsafe(self._requests.put_nowait, entry)
+            except RuntimeError:
+                # event loop has already closed
+                pass
+
+    def fileno(self) -> int:
+        """
+        File descriptor that becomes readable
+        when responses are waiting
+        """
+        return self._wake_recv.fileno()
+
+    def response_depth(self) -> int:
+        """
+        Number of responses waiting to be collected
+        """
+        return self._responses.qsize()
+
+    def get_responses(self) -> list[typing.Any]:
+        """
+        Collect all the waiting responses without blocking
+        """
+        self._wake_pending = False
+        try:
+            while self._wake_recv.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+        responses = []
+        while True:
+            try:
+                responses.append(self._responses.get_nowait())
+            except queue.Empty:
+                return responses
+
+    def close(self) -> None:
+        """
+        Release the wake-up sockets
+        """
+        self._wake_recv.close()
+        self._wake_send.close()
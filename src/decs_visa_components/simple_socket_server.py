@@ -1,10 +1,27 @@
 """
-A basing implemention of a TCP/IP socket server
+A basic implemention of a TCP/IP socket server
+
+The server multiplexes any number of socket clients (using selectors)
+onto the single WAMP session.  Every message placed onto the WAMP
+queue is tagged with the id of the client that sent it and a per
+client sequence number, and the WAMP component tags its response the
+same way, so each response is routed back to the client that asked
+for it - in the order the commands were sent, even if the WAMP calls
+complete out of order.
+
+Commands are handed to the WAMP component, and responses collected
+from it, through a QueueBridge - the bridge's wake-up socket is
+registered with the selector so responses are picked up as soon as
+they are ready.
 """
+import collections
+import selectors
 import socket
-import queue
+
+from decs_visa_components.queue_bridge import QueueBridge, CLIENT_DISCONNECTED
 
 from decs_visa_tools.base_logger import logger
+from decs_visa_tools.error_responses import LINE_TOO_LONG
 
 # response read delimiter
 from decs_visa_tools.decs_visa_settings import READ_DELIM
@@ -12,11 +29,18 @@ from decs_visa_tools.decs_visa_settings import READ_DELIM
 from decs_visa_tools.decs_visa_settings import WRITE_DELIM
 # shutdown message
 from decs_visa_tools.decs_visa_settings import SHUTDOWN
+# server behaviour
+from decs_visa_tools.decs_visa_settings import MULTI_CLIENT_SERVER
+from decs_visa_tools.decs_visa_settings import SERVER_BACKLOG
+from decs_visa_tools.decs_visa_settings import SERVER_RECV_SIZE
+from decs_visa_tools.decs_visa_settings import MAX_LINE_LENGTH
+from decs_visa_tools.decs_visa_settings import PIPELINE_DEPTH
+from decs_visa_tools.decs_visa_settings import MAX_PUSH_BUFFER
 
 def parse_data(data: str) -> str:
     """
     Utility function to strip off the delimiter
-    from messages recieved by the server 
+    from messages recieved by the server
     """
     return data.removesuffix(READ_DELIM)
 
@@ -28,7 +52,95 @@ def format_message(resp: str) -> bytes:
     msg = str(resp)+WRITE_DELIM
     return msg.encode('utf-8')
 
-def simple_server(interface: str, server_port: int, q: queue.Queue, r: queue.Queue) -> None:
+class LineFramer:
+    """
+    Buffered framing of a socket byte stream into delimited commands.
+
+    Bytes are read in large chunks and fed in, every complete command
+    is returned and any trailing partial command is kept for the next
+    read.  A command longer than max_line_length sets error, and
+    everything after it is discarded, so a misbehaving client cannot
+    grow the buffer without limit - the commands before it are still
+    returned.
+    """
+    def __init__(self, delim: str = READ_DELIM, max_line_length: int = MAX_LINE_LENGTH) -> None:
+        self.delim = delim.encode('utf-8')
+        self.max_line_length = max_line_length
+        self._buffer = bytearray()
+        # where to resume searching for a delimiter (already scanned bytes
+        # can't contain one), so long partial lines aren't rescanned
+        self._scan_from = 0
+        # set once a command has been too long
+        self.error: str | None = None
+
+    def feed(self, chunk: bytes) -> list[str]:
+        """
+        Add bytes read from the socket and return
+        every newly completed command
+        """
+        if self.error is not None:
+            return []
+        buffer = self._buffer
+        buffer += chunk
+        lines = []
+        start = 0
+        end = buffer.find(self.delim, self._scan_from)
+        while end != -1:
+            if end - start > self.max_line_length:
+                break
+            lines.append(buffer[start:end].decode('utf-8', errors='replace'))
+            start = end + len(self.delim)
+            end = buffer.find(self.delim, start)
+        # discard the consumed bytes in one go
+        if start:
+            del buffer[:start]
+        if end != -1 or len(buffer) > self.max_line_length:
+            buffer.clear()
+            self._scan_from = 0
+            self.error = f"{LINE_TOO_LONG} of {self.max_line_length} bytes"
+            return lines
+        # a delimiter could straddle the chunk boundary
+        self._scan_from = max(0, len(buffer) - len(self.delim) + 1)
+        return lines
+
+class ClientConnection:
+    """
+    Book-keeping for a single socket client connection
+    """
+    def __init__(self, client_id: int, conn: socket.socket, addr: tuple) -> None:
+        self.client_id = client_id
+        self.conn = conn
+        self.addr = addr
+        # splits the incoming byte stream into commands
+        self.framer = LineFramer()
+        # encoded responses waiting to be written to the socket
+        self.write_buffer = bytearray()
+        # commands received but not yet passed to the WAMP queue
+        self.pending: collections.deque[str] = collections.deque()
+        # sequence number of the next command passed to the WAMP queue
+        self.next_seq = 0
+        # sequence number of the next response to be written
+        self.next_response = 0
+        # responses that have arrived ahead of an earlier one
+        self.completed: dict[int, str] = {}
+        # once the framer has failed, the client is sent its error after
+        # the earlier commands are answered, then its input is discarded
+        # until it closes (closing straight away would reset the
+        # connection, and the client might never see the error)
+        self.draining = False
+        self.discarded = 0
+        # pushed lines dropped as the client isn't reading them
+        self.dropped = 0
+
+    @property
+    def in_flight(self) -> int:
+        """
+        Number of commands passed to the WAMP queue
+        that have not yet been answered
+        """
+        return self.next_seq - self.next_response
+
+def simple_server(interface: str, server_port: int, bridge: QueueBridge) -> None:
     """
     The simple server
     """
@@ -46,61 +158,179 @@ def simple_server(interface: str, server_port: int, q: queue.Queue, r: queue.Que
         # feature, or change to "" if you want to accept general network traffic.
         simple_socket_server.bind((interface, server_port))
         logger.info("Server listening: %s:%s", interface, str(server_port))
-        simple_socket_server.settimeout(1)
-        simple_socket_server.listen(0)
+        simple_socket_server.listen(SERVER_BACKLOG)
+        simple_socket_server.setblocking(False)
     except Exception as e:
         # didn't manage to open the socket
         can_run = False
-        q.put(SHUTDOWN)
+        bridge.put_request(SHUTDOWN)
         logger.info('Unable to bind socket server: %s', e)
 
+    selector = selectors.DefaultSelector()
+    clients: dict[int, ClientConnection] = {}
+    next_client_id = 0
+    if can_run:
+        # a key with no data is the listening socket
+        selector.register(simple_socket_server, selectors.EVENT_READ, None)
+        selector.register(bridge, selectors.EVENT_READ, bridge)
+
+    def send_to_wamp(client: ClientConnection) -> None:
+        # Pass waiting commands for this client to the WAMP queue -
+        # each client may have up to PIPELINE_DEPTH commands in flight
+        while client.pending and client.in_flight < PIPELINE_DEPTH:
+            msg = client.pending.popleft()
+            bridge.put_request((client.client_id, client.next_seq, msg))
+            client.next_seq += 1
+
+    def update_events(client: ClientConnection) -> None:
+        events = selectors.EVENT_READ
+        if client.write_buffer:
+            events |= selectors.EVENT_WRITE
+        selector.modify(client.conn, events, client)
+
+    def finish_if_answered(client: ClientConnection) -> None:
+        # send a failed client its error once every earlier command is answered
+        if client.framer.error is None or client.draining \
+                or client.pending or client.in_flight:
+            return
+        client.write_buffer += format_message(client.framer.error)
+        client.draining = True
+        update_events(client)
+
+    def close_client(client: ClientConnection) -> None:
+        logger.info("Client disconnected: %s", str(client.addr))
+        # let the WAMP component drop anything it holds for this client
+        bridge.put_request((client.client_id, None, CLIENT_DISCONNECTED))
+        selector.unregister(client.conn)
+        client.conn.close()
+        del clients[client.client_id]
+        if not MULTI_CLIENT_SERVER:
+            # free to accept the next connection
+            selector.register(simple_socket_server, selectors.EVENT_READ, None)
+
     while can_run:
-        try:
-            conn, addr = simple_socket_server.accept()
-        except socket.timeout:
-            # no connection request yet
-            # check if WAMP session has died before socket connection established
-            logger.debug("Waiting for socket connection")
-            try:
-                resp = r.get_nowait()
-                # Anything in here must be bad
-                logger.debug("WAMP session closed before socket server connection established")
-                can_run = False
-            except queue.Empty:
-                # Nothing bad seems to have happened yet...
-                pass
-        else:
-            with conn:
+        responses = []
+        for key, mask in selector.select():
+            if key.data is bridge:
+                responses = bridge.get_responses()
+                continue
+            if key.data is None:
+                try:
+                    conn, addr = simple_socket_server.accept()
+                except BlockingIOError:
+                    continue
                 logger.info("Server connection: %s", str(addr))
-                while can_run:
-                    data: str | None
-                    data = ""
-                    # Read one command at a time...
-                    while not data.endswith(READ_DELIM):
-                        char_byte = conn.recv(1)
-                        if not char_byte:
-                            logger.info("Client disconnected")
-                            data = None
-                            break
-                        char = char_byte.decode('utf-8')
-                        data += char
-                    if data is None:
-                        break
-                    msg = parse_data(data)
+                conn.setblocking(False)
+                client = ClientConnection(next_client_id, conn, addr)
+                next_client_id += 1
+                clients[client.client_id] = client
+                selector.register(conn, selectors.EVENT_READ, client)
+                if not MULTI_CLIENT_SERVER:
+                    # one connection at a time
+                    selector.unregister(simple_socket_server)
+                continue
+
+            client = key.data
+            if mask & selectors.EVENT_WRITE:
+                try:
+                    sent = client.conn.send(client.write_buffer)
+                except (BlockingIOError, InterruptedError):
+                    sent = 0
+                except OSError:
+                    close_client(client)
+                    continue
+                del client.write_buffer[:sent]
+                update_events(client)
+                if client.draining and not client.write_buffer:
+                    # the error has been sent - the client sees the end of the
+                    # stream, and whatever else it sends is discarded
+                    try:
+                        client.conn.shutdown(socket.SHUT_WR)
+                    except OSError:
+                        close_client(client)
+                        continue
+
+            if mask & selectors.EVENT_READ:
+                try:
+                    chunk = client.conn.recv(SERVER_RECV_SIZE)
+                except (BlockingIOError, InterruptedError):
+                    continue
+                except OSError:
+                    chunk = b""
+                if not chunk:
+                    close_client(client)
+                    continue
+                if client.framer.error is not None:
+                    client.discarded += len(chunk)
+                    if client.discarded > MAX_LINE_LENGTH:
+                        # still sending - give up waiting for it to close
+                        close_client(client)
+                    continue
+                lines = client.framer.feed(chunk)
+                if client.framer.error is not None:
+                    # Nothing sensible can be done with the rest of the
+                    # stream, so answer the commands before the problem,
+                    # then report it and drop the client
+                    logger.info("Client %s: %s", str(client.addr), client.framer.error)
+                for line in lines:
+                    msg = parse_data(line)
                     logger.debug("Socket server received: \"%s\"", msg)
-                    # Add message to the WAMP queue for processing
-                    q.put(msg)
                     if msg == SHUTDOWN: # shutdown request from user
+                        bridge.put_request(SHUTDOWN)
                         can_run = False
                         break
-                    # This will now block until WAMP call is processed...
-                    resp = r.get(block=True, timeout=None)
-                    logger.debug("Socket server Sending: %s", (str(resp)))
-                    # Return the response to the client
-                    conn.sendall(format_message(resp)) # - could throw?
-                    if resp == SHUTDOWN: # shutdown request as a result of a WAMP error
-                        can_run = False
-                        break
+                    client.pending.append(msg)
+                send_to_wamp(client)
+                finish_if_answered(client)
+                if not can_run:
+                    break
+
+        # Route any responses back to the client that made the request
+        for resp in responses:
+            if not can_run:
+                break
+            if resp == SHUTDOWN: # shutdown request as a result of a WAMP error
+                logger.debug("WAMP session closed - notifying clients")
+                for client in clients.values():
+                    try:
+                        client.conn.setblocking(True)
+                        client.conn.sendall(client.write_buffer + format_message(SHUTDOWN))
+                    except OSError:
+                        pass
+                can_run = False
+                break
+            client_id, seq, msg = resp
+            client = clients.get(client_id)
+            if client is None:
+                logger.debug("Dropping response for disconnected client: %s", client_id)
+                continue
+            if seq is None:
+                # pushed to the client (e.g. streamed samples)
+                # rather than in response to a command
+                if len(client.write_buffer) >= MAX_PUSH_BUFFER:
+                    if not client.dropped:
+                        logger.info("Client %s is not reading - dropping pushed lines", client_id)
+                    client.dropped += 1
+                    continue
+                if client.dropped:
+                    logger.info("Client %s dropped %d pushed lines", client_id, client.dropped)
+                    client.dropped = 0
+                client.write_buffer += format_message(msg)
+                update_events(client)
+                continue
+            client.completed[seq] = msg
+            # Release responses in the order the commands were sent
+            while client.next_response in client.completed:
+                msg = client.completed.pop(client.next_response)
+                client.next_response += 1
+                logger.debug("Socket server Sending: %s", msg)
+                client.write_buffer += format_message(msg)
+            update_events(client)
+            send_to_wamp(client)
+            finish_if_answered(client)
 
     logger.info("Socket server shutting down")
+    for client in list(clients.values()):
+        client.conn.close()
+    selector.close()
     simple_socket_server.close()
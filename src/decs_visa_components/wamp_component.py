@@ -2,8 +2,11 @@
 The WAMP portion of the DECS<->VISA implementation
 """
 import asyncio
-import queue
+import collections
+import functools
+import time
 import typing
+from pathlib import Path
 
 from autobahn.asyncio.wamp import ApplicationSession
 from autobahn.wamp import exception as wamp_exceptions
@@ -12,12 +15,139 @@ from autobahn.wamp.message import Welcome
 from autobahn.wamp.types import CloseDetails
 from autobahn.wamp.types import CallResult
 
+from decs_visa_components.queue_bridge import CLIENT_DISCONNECTED
 from decs_visa_tools.base_logger import logger
-from decs_visa_tools.command_parser import decs_command_parser, decs_request_parser
-from decs_visa_tools.response_parser import decs_response_parser
+from decs_visa_tools.capture import Capture
+from decs_visa_tools.channel_history import ChannelHistory
+from decs_visa_tools.command_dictionary import cmd_cache_ttl
+from decs_visa_tools.command_parser import encode_command
+from decs_visa_tools.command_parser import split_builtin, split_command, registry
+from decs_visa_tools.command_registry import CommandRegistry, CommandSpec, GET, SET, PUBLISH
+from decs_visa_tools.conditions import Condition, parse_wait
+from decs_visa_tools.dictionary_selection import load_candidates, probed_uris, sample_requests
+from decs_visa_tools.dictionary_selection import select_dictionary
+from decs_visa_tools.error_responses import UNKNOWN_COMMAND, NOT_SUPPORTED, NO_URI, CONNECTION_LOST
+from decs_visa_tools.error_responses import COMPOUND_GETS_ONLY, HISTORY_DISABLED, HISTORY_USAGE
+from decs_visa_tools.error_responses import NO_METRICS, RESPONSE_MODE_USAGE
+from decs_visa_tools.error_responses import STREAM_NEEDS_CLIENT, SWEEP_NEEDS_CLIENT, UNABLE_TO_STREAM
+from decs_visa_tools.error_responses import UNABLE_TO_SWEEP, UNABLE_TO_READ, SWEEP_RUNNING, ALREADY_SWEEPING
+from decs_visa_tools.metrics import Metrics, serve_prometheus, QUEUE, RPC, DECODE, TOTAL
+from decs_visa_tools.request_log import RequestLog
+from decs_visa_tools.response_parser import decs_record_parser, format_record
+from decs_visa_tools.response_cache import ResponseCache
+from decs_visa_tools.single_flight import SingleFlight
+from decs_visa_tools.sweep import Sweep, parse_sweep
+from decs_visa_tools.telemetry_cache import TelemetryCache
+from decs_visa_tools.telemetry_store import TelemetryStore
+from decs_visa_tools.shared_values import SharedValues
+from decs_visa_tools.time_units import parse_duration, parse_period
 
 # shutdown message
 from decs_visa_tools.decs_visa_settings import SHUTDOWN
+# limit on concurrent WAMP calls for pipelined requests
+from decs_visa_tools.decs_visa_settings import MAX_CONCURRENT_RPCS
+# optional cache of values published by DECS
+from decs_visa_tools.decs_visa_settings import SUBSCRIPTION_CACHE
+from decs_visa_tools.decs_visa_settings import SUBSCRIPTION_MAX_AGE
+# optional cache of slowly changing get_ responses
+from decs_visa_tools.decs_visa_settings import RESPONSE_CACHE
+from decs_visa_tools.decs_visa_settings import SINGLE_FLIGHT
+# separates the requests in a compound query
+from decs_visa_tools.decs_visa_settings import COMPOUND_DELIM
+# optional structured log of requests
+from decs_visa_tools.decs_visa_settings import REQUEST_LOG_PATH
+from decs_visa_tools.decs_visa_settings import REQUEST_LOG_SAMPLE_RATE
+# sample rates for streamed values
+from decs_visa_tools.decs_visa_settings import STREAM_DEFAULT_RATE
+from decs_visa_tools.decs_visa_settings import STREAM_MAX_RATE
+# history kept for each get_ value
+from decs_visa_tools.decs_visa_settings import HISTORY_LENGTH
+from decs_visa_tools.decs_visa_settings import HISTORY_SAMPLE_INTERVAL
+
+# optional on-disk store of every value
+from decs_visa_tools.decs_visa_settings import STORE_PATH
+from decs_visa_tools.decs_visa_settings import STORE_SEGMENT_SECONDS
+from decs_visa_tools.decs_visa_settings import STORE_SEGMENT_ROWS
+from decs_visa_tools.decs_visa_settings import STORE_FLUSH_INTERVAL
+# optional shared memory copy of the latest values
+from decs_visa_tools.decs_visa_settings import SHARED_VALUES_PATH
+from decs_visa_tools.decs_visa_settings import SHARED_VALUES_SLOTS
+
+# optional Prometheus endpoint for the *STAT? metrics
+from decs_visa_tools.decs_visa_settings import METRICS_PORT
+from decs_visa_tools.decs_visa_settings import HOST
+
+# optional capture of all traffic, for replay
+from decs_visa_tools.decs_visa_settings import CAPTURE_PATH
+
+# choose the command dictionary to suit the system
+from decs_visa_tools.decs_visa_settings import AUTO_DICTIONARY
+from decs_visa_tools.decs_visa_settings import AUTO_DICTIONARY_PROBES
+
+# setpoint sweeps
+from decs_visa_tools.decs_visa_settings import SWEEP_POLL_INTERVAL
+from decs_visa_tools.decs_visa_settings import SWEEP_MAX_POINTS
+# WAIT conditions
+from decs_visa_tools.decs_visa_settings import WAIT_POLL_INTERVAL
+
+# get_<name>_HIST requests the history of get_<name>
+HISTORY_SUFFIX = "_HIST"
+
+@functools.lru_cache(maxsize=8)
+def derive_key(secret: str, salt: str, iterations: int, keylen: int) -> bytes:
+    """
+    WAMP-CRA key derivation (PBKDF2) is deliberately slow, so the
+    key is reused while the router's salt and parameters are unchanged
+    """
+    return auth.derive_key(secret, salt, iterations, keylen)
+
+def is_transport_lost(error: Exception) -> bool:
+    """
+    True for the errors a WAMP call raises when the connection to
+    the router is lost - TransportLost if the call was never sent
+    """
+    if isinstance(error, wamp_exceptions.TransportLost):
+        return True
+    return isinstance(error, wamp_exceptions.ApplicationError) and \
+        error.error == CloseDetails.REASON_TRANSPORT_LOST
+
+class SessionState:
+    """
+    What outlives a single WAMP session, so the session that
+    replaces one whose connection was lost can carry on where it
+    left off (see wamp_runner.py)
+    """
+    def __init__(self) -> None:
+        # objects kept from one session to the next, by name
+        self.kept: dict[str, typing.Any] = {}
+        # commands to process before any new ones, as
+        # (queued, (client_id, seq, data)) - see QueueBridge
+        self.pending: collections.deque = collections.deque()
+        # WAMP sessions created
+        self.sessions = 0
+        # a session has taken control of the system
+        self.joined = False
+        # the latest session got as far as processing commands
+        self.ready = False
+        # the latest session ended in a way a new session could put right
+        self.reconnect = False
+
+    def keep(self, name: str, create: typing.Callable[[], typing.Any]) -> typing.Any:
+        """
+        The object kept under name, created by the first session to ask
+        """
+        if name not in self.kept:
+            self.kept[name] = create()
+        return self.kept[name]
+
+    def close(self) -> None:
+        """
+        Close the kept objects that write to disk
+        """
+        for name in ("store", "capture", "shared"):
+            kept = self.kept.pop(name, None)
+            if kept is not None:
+                kept.close()
 
 class Component(ApplicationSession):
     """
@@ -25,6 +155,87 @@ class Component(ApplicationSession):
     """
     #is_controllable = False
     #existing_controller = False
+    telemetry: TelemetryCache | None = None
+    # clients that have asked for full record responses
+    full_record_clients: set[int]
+    # streams running for each client
+    streams: dict[int, asyncio.Task]
+    # sweeps running for each client (each task is named
+    # after the set_ command it sweeps)
+    sweeps: dict[int, asyncio.Task]
+    # WAITs running for each client, with the (queued, item) they
+    # came from, and the client's commands held until they finish
+    waits: dict[int, tuple[asyncio.Task, tuple]]
+    held: dict[int, collections.deque]
+    responses: ResponseCache | None = None
+    single_flight: SingleFlight | None = None
+    # limits the concurrent rRPCs made for clients and the history sampler
+    rpc_limit: asyncio.Semaphore | None = None
+    idn_string: str | None = None
+    decs_version: str | None = None
+    # the compiled command dictionary
+    registry = registry
+    # commands the connected system doesn't provide
+    unsupported_commands: frozenset[str] = frozenset()
+    request_log: RequestLog | None = None
+    history: ChannelHistory | None = None
+    store: TelemetryStore | None = None
+    shared: SharedValues | None = None
+    metrics: Metrics | None = None
+    capture: Capture | None = None
+
+    # Commands handled by DECS<->VISA itself, rather than
+    # mapped to a WAMP uri, and the method that handles them
+    BUILTIN_COMMANDS = {
+        "*IDN?"       : "idn",
+        "REFRESH_IDN" : "idn_refresh",
+        "*CACHE?"     : "cache_stats",
+        "RESPONSE_MODE" : "set_response_mode",
+        "STREAM"      : "start_stream",
+        "STOP"        : "stop_stream",
+        "*STAT?"      : "stats",
+        "SWEEP"       : "start_sweep",
+        "WAIT"        : "wait_until",
+    }
+    # builtin commands that don't change the system
+    READ_ONLY_BUILTINS = frozenset(("*IDN?", "REFRESH_IDN", "*CACHE?", "STREAM", "STOP", "*STAT?",
+                                    "WAIT"))
+
+    def __init__(self, config=None):
+        super().__init__(config)
+        # when one process bridges several systems,
+        # each has the registry for its own dictionary
+        registry = (self.config.extra or {}).get('registry')
+        if registry is not None:
+            self.registry = registry
+        if self.config.extra is not None:
+            self.state = self.config.extra.setdefault('state', SessionState())
+        else:
+            self.state = SessionState()
+        self.state.sessions += 1
+        # per client book-keeping - client ids are only unique to
+        # one socket server, so none of this is shared between systems
+        self.full_record_clients = set()
+        self.streams = {}
+        self.sweeps = {}
+        self.waits = {}
+        self.held = {}
+        # onJoin is running / the connection has closed
+        self.running = False
+        self.disconnected = False
+        # asked to leave (see stop)
+        self.stopping = False
+
+    def system_path(self, path: str) -> str:
+        """
+        Path of a file written for this system - prefixed with the
+        system name when one process bridges several systems
+        """
+        name = self.config.extra.get('system')
+        if not name:
+            return path
+        path = Path(path)
+        return str(path.with_name(f"{name}-{path.name}"))
 
     def onWelcome(self, welcome: Welcome) -> str | None:
         logger.info("Established session: %s", str(welcome.session))
@@ -48,7 +259,7 @@ class Component(ApplicationSession):
             logger.debug("WAMP-CRA challenge received: %s", challenge)
             if 'salt' in challenge.extra:
                 # salted secret
-                key = auth.derive_key(user_secret,
+                key = derive_key(user_secret,
                                         challenge.extra['salt'],
                                         challenge.extra['iterations'],
                                         challenge.extra['keylen'])
@@ -63,16 +274,97 @@ class Component(ApplicationSession):
         raise NotImplementedError(f"Invalid authmethod {challenge.method}")
     
     async def onJoin(self, details):
+        self.running = True
+        try:
+            await self.run_session()
+        finally:
+            self.running = False
+            # a session whose connection has already
+            # closed is only finished once this returns
+            if self.disconnected:
+                self.finish()
+
+    async def run_session(self) -> None:
     # Once the WAMP session is open, the session still has to
     # claim control of the system.  This could fail for several reasons.
     # Somebody else may already have a controlling session, or the system
     # could be in local mode etc
 
+        state = self.state
+        # anything that should outlive a lost connection
+        # is kept in the state for the next session
+        self.metrics = state.keep('metrics', Metrics)
+        # opened before the first rRPC, so a replay has every call
+        # made (e.g. the host details for *IDN?)
+        if CAPTURE_PATH:
+            self.capture = state.keep('capture', lambda: Capture(
+                self.system_path(CAPTURE_PATH)))
         # Try to establish a controlling WAMP session with the router
         if await self.claim_system_control():
-            logger.info("Ready to process WAMP RPCs")
-            # start processing the server queue
-            await self.process_queue()
+            rejoined = state.joined
+            state.joined = True
+            try:
+                await self.refresh_idn()
+            except Exception as e:
+                # try again when *IDN? is first requested
+                logger.info("Unable to read host details: %s", e)
+            if self.config.extra.get('auto_dictionary', AUTO_DICTIONARY) \
+                    and self.config.extra.get('registry') is None:
+                try:
+                    await self.choose_dictionary()
+                except Exception as e:
+                    logger.info("Unable to choose a command dictionary: %s", e)
+            if REQUEST_LOG_PATH:
+                self.request_log = state.keep('request_log', lambda: RequestLog(
+                    self.system_path(REQUEST_LOG_PATH), REQUEST_LOG_SAMPLE_RATE))
+            if RESPONSE_CACHE:
+                self.responses = state.keep('responses', ResponseCache)
+            if SINGLE_FLIGHT:
+                self.single_flight = state.keep('single_flight', SingleFlight)
+            if HISTORY_LENGTH:
+                self.history = state.keep('history', lambda: ChannelHistory(
+                    self.registry.request_uris(), HISTORY_LENGTH))
+            if STORE_PATH:
+                self.store = state.keep('store', lambda: TelemetryStore(
+                    self.system_path(STORE_PATH), STORE_SEGMENT_SECONDS,
+                    STORE_SEGMENT_ROWS, STORE_FLUSH_INTERVAL))
+            if SHARED_VALUES_PATH:
+                self.shared = state.keep('shared', lambda: SharedValues(
+                    self.system_path(SHARED_VALUES_PATH), self.registry.request_names(),
+                    SHARED_VALUES_SLOTS))
+            if SUBSCRIPTION_CACHE:
+                await self.subscribe_telemetry()
+            sampler = None
+            self.rpc_limit = asyncio.Semaphore(MAX_CONCURRENT_RPCS)
+            if self.history is not None and HISTORY_SAMPLE_INTERVAL:
+                sampler = asyncio.create_task(self.sample_history(HISTORY_SAMPLE_INTERVAL))
+            metrics_server = None
+            metrics_port = self.config.extra.get('metrics_port', METRICS_PORT)
+            if metrics_port:
+                try:
+                    metrics_server = await serve_prometheus(self.metrics, HOST, metrics_port)
+                except OSError as e:
+                    logger.info("Unable to start the metrics endpoint: %s", e)
+            # the connection may have been lost (or we may
+            # have been asked to stop) while starting up
+            if not (state.reconnect or self.stopping):
+                if rejoined:
+                    logger.info("Reconnected - %d commands to retry", len(state.pending))
+                logger.info("Ready to process WAMP RPCs")
+                state.ready = True
+                # start processing the server queue
+                await self.process_queue()
+            if sampler is not None:
+                sampler.cancel()
+            if metrics_server is not None:
+                metrics_server.close()
+            if not state.reconnect:
+                state.close()
+        elif state.joined:
+            # our lost session may still be in control, or
+            # the system may have been put into local mode
+            # for a while, so try again later
+            state.reconnect = True
 
         # queue processing is closing down
         logger.info("WAMP closing session")
@@ -85,18 +377,47 @@ class Component(ApplicationSession):
 
     def onLeave(self, details: CloseDetails):
         logger.info("Leaving WAMP session: %s", details.reason)
+        if details.reason == CloseDetails.REASON_TRANSPORT_LOST:
+            # stop taking commands from the socket server, they
+            # wait in the bridge until the next session starts
+            self.state.reconnect = True
+            self.can_run = False
+            self.config.extra['bridge'].interrupt()
         return super().onLeave(details)
 
     def onDisconnect(self):
+        super().onDisconnect()
+        self.disconnected = True
+        if not self.running:
+            self.finish()
+
+    def stop(self) -> None:
+        """
+        Leave gracefully (e.g. on Ctrl-C) - stop processing commands,
+        so the session relinquishes control of the system and leaves
+        """
+        self.stopping = True
+        if self.running:
+            self.can_run = False
+            self.config.extra['bridge'].interrupt()
+        elif self.is_attached():
+            self.leave()
+
+    def finish(self) -> None:
+        """
+        The session has finished - either tell whoever is running
+        it (see wamp_runner.py) or stop the event loop
+        """
+        finished = self.config.extra.get('finished')
+        if finished is not None:
+            logger.info("WAMP session finished")
+            finished.set()
+            return
         # If user attempts Keyboard interrupt, this will
         # shutdown the socket_server as the WAMP component
         # stops
-        r=self.config.extra['output_queue']
-        try:
-            _ = r.get_nowait()
-        except queue.Empty:
-            pass
-        r.put(SHUTDOWN)
+        bridge=self.config.extra['bridge']
+        bridge.put_response(SHUTDOWN)
         logger.info("Stopping WAMP event_loop")
         asyncio.get_event_loop().stop()
 
@@ -117,36 +438,91 @@ class Component(ApplicationSession):
         """
         Wraps a WAMP rRPC call with logging and error checking
         """
-        logger.debug("get_ request uri: \"%s\"", str(rpc_uri))
+        logger.debug("get_ request uri: \"%s\"", rpc_uri)
+        started = time.perf_counter()
         try:
             resp = await self.call(rpc_uri)
             if not isinstance(resp, CallResult):
                 resp = self.package_plain_response(resp)
-            logger.debug("WAMP response: %s", str(resp.results))
+            self.record_call(rpc_uri, (), started, resp)
+            logger.debug("WAMP response: %s", resp.results)
             return resp
         except wamp_exceptions.ApplicationError as e:
             logger.info("WAMP call ApplicationError: %s", e.error_message())
+            self.record_call(rpc_uri, (), started, error=e.error)
             raise
         except Exception as e:
             logger.info("WAMP call failed: %s", e)
+            self.record_call(rpc_uri, (), started, error=str(e))
             raise
 
+    def record_call(self, rpc_uri: str, args: typing.Sequence, started: float,
+                    resp: CallResult | None = None, error: str | None = None) -> None:
+        """
+        Record a WAMP call that started at time.perf_counter() started,
+        and its response or error, in the metrics and capture
+        """
+        elapsed = time.perf_counter() - started
+        if self.metrics is not None:
+            if error is None:
+                self.metrics.observe(RPC, rpc_uri, elapsed)
+            else:
+                self.metrics.error(rpc_uri)
+        if self.capture is not None:
+            self.capture.call(rpc_uri, args, None if resp is None else resp.results,
+                              elapsed, error)
+
+    async def cached_rpc(self, rpc_uri, ttl: float = 0.0) -> tuple[CallResult, float]:
+        """
+        Answer a get_ request from the latest published value, or
+        a response cached within the last ttl (s), if either is
+        available, otherwise make the WAMP rRPC - or share the
+        rRPC already in flight for the uri (see SINGLE_FLIGHT).
+
+        Returns the response and the (wall clock) time it was received
+        """
+        if self.telemetry is not None:
+            entry = self.telemetry.get(rpc_uri)
+            if entry is not None:
+                logger.debug("Published response for uri: \"%s\"", rpc_uri)
+                return entry
+        use_cache = ttl > 0 and self.responses is not None
+        if use_cache:
+            entry = self.responses.get(rpc_uri, ttl)
+            if entry is not None:
+                logger.debug("Cached response for uri: \"%s\"", rpc_uri)
+                return entry
+        async def make_call() -> tuple[CallResult, float]:
+            resp = await self.checked_rpc(rpc_uri)
+            received = time.time()
+            if use_cache:
+                self.responses.put(rpc_uri, resp, received)
+            self.observe(rpc_uri, resp, received)
+            return resp, received
+        if self.single_flight is not None:
+            return await self.single_flight.call(rpc_uri, make_call)
+        return await make_call()
+
     async def checked_rpc_args(self, rpc_uri, args):
         """
         Wraps a WAMP rRPC call including args with logging and error checking
         """
-        logger.debug("set_ command uri: \"%s\" args: %s", str(rpc_uri), str(args))
+        logger.debug("set_ command uri: \"%s\" args: %s", rpc_uri, args)
+        started = time.perf_counter()
         try:
             resp = await self.call(rpc_uri, *args)
             if not isinstance(resp, CallResult):
                 resp = self.package_plain_response(resp)
-            logger.debug("WAMP response: %s", str(resp.results))
+            self.record_call(rpc_uri, args, started, resp)
+            logger.debug("WAMP response: %s", resp.results)
             return resp
         except wamp_exceptions.ApplicationError as e:
             logger.info("WAMP call ApplicationError: %s", e.error_message())
+            self.record_call(rpc_uri, args, started, error=e.error)
             raise
         except Exception as e:
             logger.info("WAMP call Error: %s", e)
+            self.record_call(rpc_uri, args, started, error=str(e))
             raise
         
 
@@ -154,14 +530,167 @@ class Component(ApplicationSession):
         """
         Wraps a WAMP topic publication with logging and error checking
         """
-        logger.debug("Publication uri: \"%s\" args: %s", str(rpc_uri), str(args))
+        logger.debug("Publication uri: \"%s\" args: %s", rpc_uri, args)
         try:
             self.publish(rpc_uri, *args)
         except (Exception) as e:
             logger.info("WAMP publication Error: %s", e)
             raise
+        if self.capture is not None:
+            self.capture.publication(rpc_uri, args)
         logger.debug("Publication made")
 
+    async def subscribe_telemetry(self) -> None:
+        """
+        Subscribe to the topics DECS publishes for each get_ request
+        uri, and cache the latest record published on each.  Not every
+        uri has a topic - those requests always use the rRPC
+        """
+        # the cache, and its listeners, are kept for the next session
+        listening = 'telemetry' in self.state.kept
+        self.telemetry = self.state.keep('telemetry', lambda: TelemetryCache(SUBSCRIPTION_MAX_AGE))
+        uris = sorted(self.registry.request_uris())
+        results = await asyncio.gather(
+            *(self.subscribe(self.telemetry_handler(uri), uri) for uri in uris),
+            return_exceptions=True)
+        subscribed = 0
+        for uri, result in zip(uris, results):
+            if isinstance(result, Exception):
+                logger.debug("Unable to subscribe to \"%s\": %s", uri, result)
+            else:
+                subscribed += 1
+                if not listening and (self.history is not None or self.store is not None
+                                      or self.shared is not None):
+                    self.telemetry.add_listener(uri, self.publication_listener(uri))
+        logger.info("Subscribed to %d of %d telemetry topics", subscribed, len(uris))
+
+    def telemetry_handler(self, uri: str) -> typing.Callable[..., None]:
+        """
+        Subscription handler that caches the records published on
+        uri, and captures them so a replay can publish them again
+        """
+        handler = self.telemetry.handler(uri)
+        capture = self.capture
+        if capture is None:
+            return handler
+        def on_event(*results) -> None:
+            capture.event(uri, results)
+            handler(*results)
+        return on_event
+
+    def observe(self, uri: str, resp: CallResult, received: float) -> None:
+        """
+        Record a response newly received from DECS in the
+        history, the on-disk store and the shared values
+        """
+        if self.history is not None:
+            self.history.record(uri, resp, received)
+        if self.store is not None:
+            self.store.record(uri, resp, received)
+        if self.shared is not None:
+            self.shared.record(uri, resp, received)
+
+    def publication_listener(self, uri: str) -> typing.Callable[[], None]:
+        """
+        Telemetry listener that records each publication on uri
+        """
+        def record() -> None:
+            entry = self.telemetry.latest(uri)
+            if entry is not None:
+                self.observe(uri, *entry)
+        return record
+
+    async def sample_history(self, interval: float) -> None:
+        """
+        Read every get_ value each interval (s) so there is a history
+        of values no client has asked for.  Values that are published,
+        or still in the response cache, don't need a new rRPC.  The
+        rRPCs share MAX_CONCURRENT_RPCS with the clients' requests
+        """
+        specs = {spec.uri: spec for spec in self.registry.commands.values() if spec.kind == GET}
+        async def sample(uri: str, spec: CommandSpec) -> tuple[CallResult, float]:
+            async with self.rpc_limit:
+                return await self.cached_rpc(uri, spec.ttl)
+        while True:
+            results = await asyncio.gather(*(sample(uri, spec) for uri, spec in specs.items()),
+                                           return_exceptions=True)
+            for uri, result in zip(specs, results):
+                if isinstance(result, Exception):
+                    logger.debug("Unable to sample \"%s\": %s", uri, result)
+            await asyncio.sleep(interval)
+
+    async def refresh_idn(self) -> str:
+        """
+        Read the host details required to answer the IDN query.
+        Multiple WAMP calls are required to collate all the required
+        data, so these are made concurrently
+        """
+        host_name_full, host_version_full = await asyncio.gather(
+            self.checked_rpc('oi.decs.host.name'),
+            self.checked_rpc('oi.decs.host.decs_version'))
+        host_name = str(host_name_full.results[0])
+        version = str(host_version_full.results[0])
+        logger.debug("Extractracted values: %s, %s", host_name, version)
+        self.decs_version = version
+        self.idn_string = f"QD - Oxford, DECS, {host_name}, {version}"
+        logger.debug("IDN string: %s", self.idn_string)
+        return self.idn_string
+
+    async def probe_uri(self, uri: str, meta_api: bool) -> bool | None:
+        """
+        Does the system provide uri?  Either ask the router (meta_api),
+        or call it - which is only safe for get_ uris.  None if unknown
+        """
+        try:
+            if meta_api:
+                return await self.call('wamp.registration.lookup', uri) is not None
+            await self.call(uri)
+        except wamp_exceptions.ApplicationError as e:
+            if e.error == wamp_exceptions.ApplicationError.NO_SUCH_PROCEDURE:
+                return False
+        # the procedure exists, even if it raised an error
+        return True
+
+    async def choose_dictionary(self) -> None:
+        """
+        Probe (concurrently) which of the candidate dictionaries' uris
+        the system provides and compile the best match into the registry.
+        Commands the system doesn't provide are then rejected locally
+        rather than with a WAMP call
+        """
+        chosen = self.state.kept.get('dictionary')
+        if chosen is not None:
+            # chosen by an earlier session - the system hasn't changed
+            self.registry, self.unsupported_commands = chosen
+            return
+        candidates = load_candidates()
+        uris = sorted(probed_uris(candidates))
+        try:
+            # the router knows what has been registered...
+            await self.call('wamp.registration.lookup', 'oi.decs.host.name')
+            meta_api = True
+        except wamp_exceptions.ApplicationError as e:
+            # ...but may not allow us to ask, so call a few get_ uris instead
+            logger.debug("Registration lookup unavailable: %s", e)
+            meta_api = False
+        requests = sample_requests(candidates, AUTO_DICTIONARY_PROBES)
+        limit = asyncio.Semaphore(MAX_CONCURRENT_RPCS)
+        async def probe(uri: str) -> bool | None:
+            if not meta_api and uri not in requests:
+                return None
+            async with limit:
+                return await self.probe_uri(uri, meta_api)
+        found = await asyncio.gather(*(probe(uri) for uri in uris))
+        selection = select_dictionary(candidates, dict(zip(uris, found)), self.decs_version)
+        if selection is None:
+            logger.info("Unable to identify the system - using the default command dictionary")
+            return
+        self.registry = CommandRegistry(selection.commands, cmd_cache_ttl)
+        self.unsupported_commands = selection.unsupported
+        self.state.kept['dictionary'] = (self.registry, self.unsupported_commands)
+        logger.info("Using command dictionary %s (%d commands, %d not supported by this system)",
+                    selection.name, len(selection.commands), len(selection.unsupported))
+
     async def claim_system_control(self) -> bool:
         """
         Attempt to establish a controlling
@@ -177,7 +706,9 @@ class Component(ApplicationSession):
                 return False
             resp = await self.checked_rpc('oi.decs.sessionmanager.system_controller')
             existing_controller = int(resp.results[0]) != 0
-            if existing_controller:
+            # after a reconnect, the controller may be our own lost session
+            if existing_controller and not (
+                    self.state.joined and resp.results[1] == self.config.extra['user_name']):
                 logger.info("DECS system is under control: %s", str(resp.results[1]))
                 return False
             resp = await self.checked_rpc('oi.decs.sessionmanager.claim_system_control')
@@ -193,114 +724,659 @@ class Component(ApplicationSession):
 
     async def process_queue(self) -> None:
         """
-        Monitor the message queue and process the
-        WAMP queries as required.
-        """
-        q=self.config.extra['input_queue']
-        r=self.config.extra['output_queue']
-        can_run = True
-        while can_run:
-            try:
-                data = q.get_nowait()
-                if data == SHUTDOWN:
-                    logger.info("WAMP shutdown request from queue")
-                    break
-                # set something
-                if "set_" in data:
-                    # It's a command, so
-                    try:
-                        rpc_uri, args = decs_command_parser(data)
-                    except (ValueError, NotImplementedError) as e:
-                        # Unknown command / bad arguments / not yet
-                        # implemented - as nothing has ben sent
-                        # to WAMP there will be no WAMP level error,
-                        # so we can just return this error message to
-                        # the client
-                        r.put(e)
-                    else:
-                        try:
-                            resp = await self.checked_rpc_args(rpc_uri, args)
-                            # Determine what is returned
-                            r.put(decs_response_parser(resp))
-                        except Exception as e:
-                            logger.info("WAMP error: %s", e)
-                            # This is a WAMP level error - probably
-                            # nothing we can do to fix this, so
-                            can_run = False
-
-                # get a parameter
-                elif "get_" in data:
-                    # It's a request, so
-                    try:
-                        rpc_uri = decs_request_parser(data)
-                    except ValueError as e:
-                        # Unknown request as nothing has ben sent
-                        # to WAMP there will be no WAMP level error,
-                        # so we can just return this error message to
-                        # the client
-                        r.put(e)
-                    else:
-                        try:
-                            resp = await self.checked_rpc(rpc_uri)
-                            # Determine what is returned
-                            r.put(decs_response_parser(resp))
-                        except Exception as e:
-                            logger.info("WAMP error: %s", e)
-                            # This is a WAMP level error - probably
-                            # nothing we can do to fix this, so
-                            can_run = False
-
-                # publish something
-                elif "PUBLISH" in data:
-                    try:
-                        rpc_uri, args = decs_command_parser(data)
-                    except (ValueError, NotImplementedError) as e:
-                        # Unknown command / bad arguments / not yet
-                        # implemented - as nothing has ben sent
-                        # to WAMP there will be no WAMP level error,
-                        # so we can just return this error message to
-                        # the client
-                        r.put(e)
-                    else:
-                        try:
-                            resp = await self.checked_publication(rpc_uri, args)
-                            # can just assume this has publication has
-                            # been made
-                            r.put("PUBLISHED")
-                        except Exception as e:
-                            logger.info("WAMP error: %s", e)
-                            # This is a WAMP level error - probably
-                            # nothing we can do to fix this, so
-                            can_run = False
-
-                elif "IDN" in data:
-                    # Process the IDN query as correctly as we can.
-                    # Left as a special case here as multiple WAMP calls
-                    # are required to collate all the required data
-                    try:
-                        rpc_uri = 'oi.decs.host.name'
-                        host_name_full = await self.checked_rpc(rpc_uri)
-                        host_name = str(host_name_full.results[0])
-                        logger.debug("Extractracted values: %s", host_name)
-                        rpc_uri = 'oi.decs.host.decs_version'
-                        host_version_full = await self.checked_rpc(rpc_uri)
-                        version = str(host_version_full.results[0])
-                        logger.debug("Extractracted values: %s", version)
-                        idn_string = f"QD - Oxford, DECS, {host_name}, {version}"
-                        logger.debug("IDN string: %s", idn_string)
-                        r.put(idn_string)
-                    except Exception:
-                        can_run = False
+        Wait for messages from the socket server and
+        process the WAMP queries as required.
 
-                else:
-                    # unknown command
-                    logger.info("Unkown command: %s", str(data))
-                    r.put(f"Unkown command: {str(data)}")
+        Messages arrive tagged with the id of the socket client
+        that sent them and a sequence number, and the response is
+        tagged the same way so the server can route it back in order.
+
+        Requests (get_ / *IDN?) don't change the system, so up to
+        MAX_CONCURRENT_RPCS of these are processed concurrently.
+        Anything else waits for all in flight requests to complete
+        and is processed on its own, so commands are still applied
+        in the order they were sent.
 
-            except queue.Empty:
-                await asyncio.sleep(0.0005)
+        Commands held when an earlier session lost its connection
+        are processed first.
+        """
+        bridge=self.config.extra['bridge']
+        bridge.attach(asyncio.get_running_loop())
+        in_flight: set[asyncio.Task] = set()
+        if self.rpc_limit is None:
+            self.rpc_limit = asyncio.Semaphore(MAX_CONCURRENT_RPCS)
+        limit = self.rpc_limit
+        pending = self.state.pending
+        # client settings survive a reconnect, streams don't
+        self.full_record_clients = self.state.keep('full_record_clients', set)
+        self.streams = {}
+        self.sweeps = {}
+        self.waits = {}
+        self.held = {}
+        if self.metrics is not None:
+            self.metrics.gauge("queued_requests", bridge.request_depth)
+            self.metrics.gauge("queued_responses", bridge.response_depth)
+            self.metrics.gauge("in_flight", lambda: len(in_flight))
+            self.metrics.gauge("streams", lambda: len(self.streams))
+            self.metrics.gauge("sweeps", lambda: len(self.sweeps))
+            self.metrics.gauge("waits", lambda: len(self.waits))
+            if self.single_flight is not None:
+                self.metrics.gauge("saved_rpcs", lambda: self.single_flight.saved)
+        self.can_run = not self.stopping
+        while self.can_run:
+            if pending:
+                queued, item = pending.popleft()
+                retried = True
+            else:
+                item = await bridge.get_request()
+                queued = bridge.queued_at
+                retried = False
+            if item is None:
+                # interrupted - check if we can still run
                 continue
-            except Exception as e:
+            if item == SHUTDOWN:
+                logger.info("WAMP shutdown request from queue")
+                self.state.reconnect = False
+                break
+            client_id, seq, data = item
+            if data == CLIENT_DISCONNECTED:
+                self.client_disconnected(client_id)
+                continue
+            if self.capture is not None and not retried:
+                self.capture.command(client_id, seq, data)
+            if client_id in self.waits:
+                # held until the client's WAIT has finished
+                self.held.setdefault(client_id, collections.deque()).append((queued, item))
+                continue
+            if split_builtin(data)[0] == "WAIT":
+                # neither limited by, nor holding up, other requests
+                task = asyncio.create_task(self.run_wait(client_id, seq, data, queued))
+                self.waits[client_id] = (task, (queued, item))
+                continue
+            if self.is_request(data):
+                await limit.acquire()
+                task = asyncio.create_task(self.respond(client_id, seq, data, limit, queued))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            else:
+                if in_flight:
+                    await asyncio.wait(in_flight)
+                if self.can_run:
+                    await self.respond(client_id, seq, data, queued=queued)
+                elif self.state.reconnect:
+                    # not sent, so process it once reconnected
+                    pending.append((queued, item))
+        if in_flight:
+            await asyncio.wait(in_flight)
+        for client_id in list(self.streams):
+            if self.state.reconnect:
+                bridge.put_response((client_id, None, "STREAM ERROR: connection to DECS lost"))
+            self.cancel_stream(client_id)
+        for client_id in list(self.sweeps):
+            if self.state.reconnect:
+                bridge.put_response((client_id, None, "SWEEP ERROR: connection to DECS lost"))
+            self.cancel_sweep(client_id)
+        for client_id in list(self.waits):
+            task, entry = self.waits.pop(client_id)
+            task.cancel()
+            if self.state.reconnect:
+                # start the WAIT again once reconnected
+                pending.append(entry)
+                pending.extend(self.held.pop(client_id, ()))
+        self.held.clear()
+
+    def client_disconnected(self, client_id: int) -> None:
+        """
+        Forget any state held for a socket client
+        """
+        self.full_record_clients.discard(client_id)
+        self.cancel_stream(client_id)
+        self.cancel_sweep(client_id)
+        wait = self.waits.pop(client_id, None)
+        if wait is not None:
+            wait[0].cancel()
+        self.held.pop(client_id, None)
+
+    def is_request(self, data: str) -> bool:
+        """
+        True for commands that only read from the system
+        and so can safely be processed concurrently
+        """
+        return data.startswith("get_") or split_builtin(data)[0] in self.READ_ONLY_BUILTINS
+
+    async def respond(self, client_id: int, seq: int, data: str,
+                      limit: asyncio.Semaphore | None = None,
+                      queued: float | None = None) -> None:
+        """
+        Process a command and hand the tagged response
+        back to the socket server.  queued is the time.perf_counter()
+        at which the socket server passed the command on
+        """
+        bridge=self.config.extra['bridge']
+        try:
+            started = time.perf_counter()
+            try:
+                response = await self.process_command(data, client_id)
+            except wamp_exceptions.ApplicationError as e:
+                if e.error != wamp_exceptions.ApplicationError.NO_SUCH_PROCEDURE:
+                    raise
+                # nothing was done, so the session can carry on
+                response = f"{NOT_SUPPORTED}: {data}"
+            bridge.put_response((client_id, seq, response))
+            if self.capture is not None:
+                self.capture.response(client_id, seq, response)
+            finished = time.perf_counter()
+            if self.request_log is not None:
+                self.request_log.record(client_id, data, response, started, finished)
+            if self.metrics is not None and queued is not None:
+                key = self.command_key(data)
+                self.metrics.observe(QUEUE, key, started - queued)
+                self.metrics.observe(TOTAL, key, finished - queued)
+        except Exception as e:
+            if is_transport_lost(e):
+                self.connection_lost(client_id, seq, data, queued, e)
+            else:
                 # Something bad has happened to the WAMP connection
                 # perhaps Admin has put the system into local mode...?
-                can_run = False
+                logger.info("WAMP error: %s", e)
+            self.can_run = False
+            bridge.interrupt()
+        finally:
+            if limit is not None:
+                limit.release()
+
+    def connection_lost(self, client_id: int, seq: int, data: str,
+                        queued: float | None, error: Exception) -> None:
+        """
+        Hold a command whose WAMP call was lost with the connection, to
+        be processed again by the next session - unless it may already
+        have changed the system, in which case the client is told so
+        """
+        self.state.reconnect = True
+        if isinstance(error, wamp_exceptions.TransportLost) or self.is_request(data):
+            self.state.pending.append((queued, (client_id, seq, data)))
+            return
+        response = f"{CONNECTION_LOST}: {data}"
+        self.config.extra['bridge'].put_response((client_id, seq, response))
+        if self.capture is not None:
+            self.capture.response(client_id, seq, response)
+
+    def command_key(self, data: str) -> str:
+        """
+        The name a command's metrics are recorded under - anything
+        that isn't a known command is grouped together
+        """
+        if data.startswith("get_") and COMPOUND_DELIM in data:
+            return "compound"
+        name = split_builtin(data)[0]
+        if name in self.BUILTIN_COMMANDS:
+            return name
+        name = split_command(data)[0]
+        if name in self.registry.commands or \
+                name.removesuffix(HISTORY_SUFFIX) in self.registry.commands:
+            return name
+        return "unknown"
+
+    def decode(self, spec: CommandSpec, resp: CallResult, received: float, full: bool) -> str:
+        """
+        Decode a response - just the value, or the whole record
+        for clients that have asked for full records
+        """
+        started = time.perf_counter()
+        if full:
+            value = format_record(decs_record_parser(resp, received))
+        else:
+            value = spec.decode(resp)
+        if self.metrics is not None:
+            self.metrics.observe(DECODE, spec.name, time.perf_counter() - started)
+        return value
+
+    async def process_request(self, data: str, full: bool = False) -> str:
+        """
+        Process a single get_ request
+        """
+        name, payload = split_command(data)
+        spec = self.registry.get(name)
+        if spec is None and name in self.unsupported_commands:
+            return f"{NOT_SUPPORTED}: {name}"
+        if spec is None or spec.kind != GET or payload is not None:
+            # Unknown request as nothing has ben sent
+            # to WAMP there will be no WAMP level error,
+            # so we can just return this error message to
+            # the client
+            return f"{NO_URI} command_dictionary"
+        resp, received = await self.cached_rpc(spec.uri, spec.ttl)
+        # Determine what is returned
+        return self.decode(spec, resp, received, full)
+
+    async def process_compound_request(self, data: str, full: bool = False) -> str:
+        """
+        Process a compound query such as get_MC_T;get_STILL_T;get_P2_P
+        with all the rRPCs in flight at the same time.  The responses
+        are returned in the same order, joined by the same delimiter
+        """
+        requests = [part.strip() for part in data.split(COMPOUND_DELIM)]
+        if not all(request.startswith("get_") for request in requests):
+            return COMPOUND_GETS_ONLY
+        responses = await asyncio.gather(*(self.process_request(request, full)
+                                           for request in requests))
+        return COMPOUND_DELIM.join(responses)
+
+    async def process_command(self, data: str, client_id: int | None = None) -> str:
+        """
+        Process a single command from a socket client and
+        return the response to be sent back to it.
+
+        Errors in the command itself (nothing has been sent to
+        WAMP) are returned to the client, WAMP level errors are
+        raised as there is probably nothing we can do to fix them
+        """
+        full = client_id in self.full_record_clients
+
+        # get several parameters at once
+        if data.startswith("get_") and COMPOUND_DELIM in data:
+            return await self.process_compound_request(data, full)
+
+        # commands handled by DECS<->VISA itself
+        name, arguments = split_builtin(data)
+        builtin = self.BUILTIN_COMMANDS.get(name)
+        if builtin is not None:
+            return await getattr(self, builtin)(client_id, arguments)
+
+        name, payload = split_command(data)
+        # the history of a get_ value
+        if name.startswith("get_") and name.endswith(HISTORY_SUFFIX):
+            return self.process_history_request(name.removesuffix(HISTORY_SUFFIX), payload)
+
+        spec = self.registry.get(name)
+        kind = spec.kind if spec is not None else None
+
+        # get a parameter
+        if kind == GET:
+            return await self.process_request(data, full)
+
+        # set or publish something
+        if kind in (SET, PUBLISH):
+            try:
+                rpc_uri, args = encode_command(spec, payload)
+            except (ValueError, NotImplementedError) as e:
+                # Unknown command / bad arguments / not yet
+                # implemented - as nothing has ben sent
+                # to WAMP there will be no WAMP level error,
+                # so we can just return this error message to
+                # the client
+                return str(e)
+            if kind == PUBLISH:
+                await self.checked_publication(rpc_uri, args)
+                # can just assume this has publication has
+                # been made
+                return "PUBLISHED"
+            resp, received = await self.apply_set(rpc_uri, args)
+            # Determine what is returned
+            return self.decode(spec, resp, received, full)
+
+        if name in self.unsupported_commands:
+            return f"{NOT_SUPPORTED}: {name}"
+        if data.startswith("get_"):
+            return f"{NO_URI} command_dictionary"
+        if data.startswith("set_"):
+            return f"{NO_URI} cmd_dict"
+
+        # unknown command
+        logger.info("Unkown command: %s", str(data))
+        return f"{UNKNOWN_COMMAND}: {str(data)}"
+
+    async def apply_set(self, rpc_uri: str, args: list) -> tuple[CallResult, float]:
+        """
+        Make a set_ rRPC and record the response.  Returns the
+        response and the (wall clock) time it was received
+        """
+        resp = await self.checked_rpc_args(rpc_uri, args)
+        received = time.time()
+        self.observe(rpc_uri, resp, received)
+        if self.responses is not None:
+            # cached values from this part of the system are now stale
+            self.responses.invalidate(rpc_uri)
+        if self.single_flight is not None:
+            self.single_flight.forget(rpc_uri)
+        return resp, received
+
+    def process_history_request(self, name: str, payload: str | None) -> str:
+        """
+        get_MC_T_HIST:600s returns the values of get_MC_T from the last
+        ten minutes, get_MC_T_HIST:last=1000 the latest 1000 values -
+        as time,value pairs, oldest first, joined by COMPOUND_DELIM
+        """
+        if self.history is None:
+            return HISTORY_DISABLED
+        spec = self.registry.get(name)
+        buffer = self.history.get(spec.uri) if spec is not None and spec.kind == GET else None
+        if buffer is None:
+            return f"{NO_URI} command_dictionary"
+        query = (payload or "").strip()
+        try:
+            if query.startswith("last="):
+                samples = buffer.last(int(query.removeprefix("last=")))
+            else:
+                samples = buffer.since(time.time() - parse_duration(query))
+        except ValueError:
+            return HISTORY_USAGE
+        return COMPOUND_DELIM.join(f"{timestamp:.6f},{value!r}" for timestamp, value in samples)
+
+    async def idn(self, client_id: int | None, payload: str | None) -> str:
+        """
+        The host details don't change during a session,
+        so these are read once and then reused
+        """
+        if self.idn_string is None:
+            return await self.refresh_idn()
+        return self.idn_string
+
+    async def idn_refresh(self, client_id: int | None, payload: str | None) -> str:
+        """
+        Re-read the host details used for *IDN?
+        """
+        return await self.refresh_idn()
+
+    async def cache_stats(self, client_id: int | None, payload: str | None) -> str:
+        """
+        Report the cache counters
+        """
+        stats = []
+        if self.responses is not None:
+            stats.append(f"response:{self.responses.stats()}")
+        if self.telemetry is not None:
+            stats.append(f"published:hits={self.telemetry.hits},misses={self.telemetry.misses}")
+        if self.single_flight is not None:
+            stats.append(f"shared:{self.single_flight.stats()}")
+        return ';'.join(stats) if stats else "No caches enabled"
+
+    async def stats(self, client_id: int | None, payload: str | None) -> str:
+        """
+        *STAT? - request counts, errors, queue depths and the time spent
+        in each stage (ms) for all commands, *STAT? get_MC_T for one
+        """
+        if self.metrics is None:
+            return NO_METRICS
+        name = (payload or "").strip()
+        if not name:
+            return self.metrics.report()
+        spec = self.registry.get(name)
+        if spec is None and name not in self.BUILTIN_COMMANDS:
+            return f"{UNKNOWN_COMMAND}: {name}"
+        # the rpc stage is recorded against the uri
+        return self.metrics.report([name] if spec is None else [name, spec.uri])
+
+    async def set_response_mode(self, client_id: int | None, payload: str | None) -> str:
+        """
+        RESPONSE_MODE:FULL - responses to this client's get_ / set_
+        commands are the whole decoded record, RESPONSE_MODE:VALUE
+        (the default) returns just the value
+        """
+        mode = (payload or "").strip().upper()
+        if client_id is None or mode not in ("FULL", "VALUE"):
+            return RESPONSE_MODE_USAGE
+        if mode == "FULL":
+            self.full_record_clients.add(client_id)
+        else:
+            self.full_record_clients.discard(client_id)
+        return mode
+
+    async def start_stream(self, client_id: int | None, payload: str | None) -> str:
+        """
+        STREAM get_MC_T,get_STILL_T@10Hz - push a line of samples
+        time;value;value... to this client at the given rate until it
+        sends STOP.  Without a rate a line is pushed whenever DECS
+        publishes one of the values (if SUBSCRIPTION_CACHE is enabled)
+        """
+        if client_id is None:
+            return STREAM_NEEDS_CLIENT
+        requests, _, rate = (payload or "").partition('@')
+        specs = []
+        for request in requests.split(','):
+            spec = self.registry.get(request.strip())
+            if spec is None or spec.kind != GET:
+                return f"{UNABLE_TO_STREAM}: {request.strip()}"
+            specs.append(spec)
+        period: float | None = None
+        if rate:
+            try:
+                period = max(parse_period(rate), 1.0 / STREAM_MAX_RATE)
+            except ValueError as e:
+                return str(e)
+        elif self.telemetry is None:
+            period = 1.0 / STREAM_DEFAULT_RATE
+        self.cancel_stream(client_id)
+        self.streams[client_id] = asyncio.create_task(self.run_stream(client_id, specs, period))
+        return "STREAMING"
+
+    async def stop_stream(self, client_id: int | None, payload: str | None) -> str:
+        """
+        STOP - end this client's stream
+        """
+        if client_id is None or not self.cancel_stream(client_id):
+            return "No stream running"
+        return "STOPPED"
+
+    def cancel_stream(self, client_id: int) -> bool:
+        """
+        Cancel a client's stream, if it has one
+        """
+        task = self.streams.pop(client_id, None)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    async def run_stream(self, client_id: int, specs: list[CommandSpec],
+                         period: float | None) -> None:
+        """
+        Push samples to a client until cancelled
+        """
+        bridge=self.config.extra['bridge']
+        def push(values: list[str]) -> None:
+            line = COMPOUND_DELIM.join([f"{time.time():.6f}", *values])
+            bridge.put_response((client_id, None, line))
+        try:
+            if period is None:
+                await self.stream_publications(specs, push)
+            else:
+                loop = asyncio.get_running_loop()
+                next_sample = loop.time()
+                while True:
+                    entries = await asyncio.gather(*(self.cached_rpc(spec.uri, spec.ttl)
+                                                     for spec in specs))
+                    push([spec.decode(resp) for spec, (resp, _) in zip(specs, entries)])
+                    # keep to the requested rate, skipping samples if
+                    # the rRPCs take longer than the period
+                    next_sample += period
+                    now = loop.time()
+                    if next_sample < now:
+                        next_sample = now
+                    await asyncio.sleep(next_sample - now)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info("Stream error: %s", e)
+            bridge.put_response((client_id, None, f"STREAM ERROR: {e}"))
+            self.streams.pop(client_id, None)
+
+    async def stream_publications(self, specs: list[CommandSpec],
+                                  push: typing.Callable[[list[str]], None]) -> None:
+        """
+        Push the latest published values whenever any of them change
+        """
+        assert self.telemetry is not None
+        changed = asyncio.Event()
+        for spec in specs:
+            self.telemetry.add_listener(spec.uri, changed.set)
+        try:
+            while True:
+                await changed.wait()
+                changed.clear()
+                values = []
+                for spec in specs:
+                    entry = self.telemetry.latest(spec.uri)
+                    values.append("" if entry is None else spec.decode(entry[0]))
+                push(values)
+        finally:
+            for spec in specs:
+                self.telemetry.remove_listener(spec.uri, changed.set)
+
+    async def start_sweep(self, client_id: int | None, payload: str | None) -> str:
+        """
+        SWEEP set_MC_T:{} lin=0.01:0.1:10 settle=get_MC_T~0.001 ... -
+        step through setpoints, pushing the readbacks at each step to
+        this client (see decs_visa_tools/sweep.py).  SWEEP STOP ends it
+        """
+        if client_id is None:
+            return SWEEP_NEEDS_CLIENT
+        if (payload or "").strip() == "STOP":
+            return "SWEEP STOPPED" if self.cancel_sweep(client_id) else "No sweep running"
+        try:
+            sweep = parse_sweep(payload, SWEEP_MAX_POINTS)
+        except ValueError as e:
+            return str(e)
+        spec = self.registry.get(sweep.command)
+        if spec is None or spec.kind != SET:
+            return f"{UNABLE_TO_SWEEP}: {sweep.command}"
+        try:
+            # check the payload before anything is set
+            encode_command(spec, sweep.payload(sweep.points[0]))
+        except (ValueError, NotImplementedError) as e:
+            return str(e)
+        requests = sweep.read + ([sweep.settle.request] if sweep.settle is not None else [])
+        for request in requests:
+            request_spec = self.registry.get(request)
+            if request_spec is None or request_spec.kind != GET:
+                return f"{UNABLE_TO_READ}: {request}"
+        if client_id in self.sweeps:
+            return SWEEP_RUNNING
+        if any(task.get_name() == sweep.command for task in self.sweeps.values()):
+            return f"{ALREADY_SWEEPING}: {sweep.command}"
+        self.sweeps[client_id] = asyncio.create_task(self.run_sweep(client_id, sweep),
+                                                     name=sweep.command)
+        return "SWEEPING"
+
+    def cancel_sweep(self, client_id: int) -> bool:
+        """
+        Cancel a client's sweep, if it has one
+        """
+        task = self.sweeps.pop(client_id, None)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    async def run_sweep(self, client_id: int, sweep: Sweep) -> None:
+        """
+        Run a sweep, pushing SWEEP <step>;setpoint;time;readbacks...
+        to the client after each step and SWEEP DONE at the end
+        """
+        bridge=self.config.extra['bridge']
+        def push(line: str) -> None:
+            bridge.put_response((client_id, None, line))
+        spec = self.registry.get(sweep.command)
+        read_specs = [self.registry.get(request) for request in sweep.read]
+        try:
+            for step, setpoint in enumerate(sweep.points):
+                await self.apply_set(*encode_command(spec, sweep.payload(setpoint)))
+                if sweep.settle is not None and not (await self.wait_for_condition(
+                        sweep.settle, setpoint, sweep.stable, sweep.timeout,
+                        SWEEP_POLL_INTERVAL))[0]:
+                    push(f"SWEEP ERROR: step {step} did not settle within {sweep.timeout:g}s")
+                    return
+                if sweep.dwell:
+                    await asyncio.sleep(sweep.dwell)
+                entries = await asyncio.gather(*(self.cached_rpc(read_spec.uri)
+                                                 for read_spec in read_specs))
+                values = [read_spec.decode(resp)
+                          for read_spec, (resp, _) in zip(read_specs, entries)]
+                push(COMPOUND_DELIM.join([f"SWEEP {step}", repr(setpoint),
+                                          f"{time.time():.6f}", *values]))
+            push("SWEEP DONE")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info("Sweep error: %s", e)
+            push(f"SWEEP ERROR: {e}")
+        finally:
+            if self.sweeps.get(client_id) is asyncio.current_task():
+                del self.sweeps[client_id]
+
+    async def wait_for_condition(self, condition: Condition, target: float | None,
+                                 stable: float, timeout: float | None,
+                                 interval: float) -> tuple[bool, str]:
+        """
+        Check the condition's get_ value every interval (s), and
+        whenever DECS publishes it, until the condition has held for
+        stable (s).  Returns whether it did so within timeout (s),
+        and the latest value
+        """
+        spec = self.registry.get(condition.request)
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        held_since = None
+        changed = asyncio.Event()
+        if self.telemetry is not None:
+            self.telemetry.add_listener(spec.uri, changed.set)
+        try:
+            while True:
+                changed.clear()
+                resp, _ = await self.cached_rpc(spec.uri)
+                value = spec.decode(resp)
+                now = loop.time()
+                if condition.test(value, target):
+                    if held_since is None:
+                        held_since = now
+                    if now - held_since >= stable:
+                        return True, value
+                else:
+                    held_since = None
+                if deadline is not None and now >= deadline:
+                    return False, value
+                # check again when the value is published, or the
+                # condition has been stable long enough, if sooner
+                wake = interval
+                if held_since is not None:
+                    wake = min(wake, held_since + stable - now)
+                if deadline is not None:
+                    wake = min(wake, deadline - now)
+                try:
+                    await asyncio.wait_for(changed.wait(), wake)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if self.telemetry is not None:
+                self.telemetry.remove_listener(spec.uri, changed.set)
+
+    async def run_wait(self, client_id: int, seq: int, data: str, queued: float) -> None:
+        """
+        Respond to a WAIT, then release the client's held commands
+        """
+        try:
+            await self.respond(client_id, seq, data, queued=queued)
+        finally:
+            wait = self.waits.get(client_id)
+            if wait is not None and wait[0] is asyncio.current_task():
+                del self.waits[client_id]
+                self.state.pending.extend(self.held.pop(client_id, ()))
+                self.config.extra['bridge'].interrupt()
+
+    async def wait_until(self, client_id: int | None, payload: str | None) -> str:
+        """
+        WAIT get_MC_T<0.02 stable=60s timeout=1h - respond once the
+        condition has held for the stable time (WAIT DONE;<value>)
+        or on timeout (WAIT TIMEOUT;<value>).  The client's later
+        commands wait for it, other clients' don't
+        """
+        try:
+            wait = parse_wait(payload)
+        except ValueError as e:
+            return str(e)
+        spec = self.registry.get(wait.condition.request)
+        if spec is None or spec.kind != GET:
+            return f"{UNABLE_TO_READ}: {wait.condition.request}"
+        met, value = await self.wait_for_condition(wait.condition, None, wait.stable,
+                                                   wait.timeout, WAIT_POLL_INTERVAL)
+        return COMPOUND_DELIM.join(["WAIT DONE" if met else "WAIT TIMEOUT", value])
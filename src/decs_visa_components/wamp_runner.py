@@ -0,0 +1,102 @@
+"""
+Runs the WAMP component for one system, connecting again (with
+backoff) whenever the connection to the router is lost, so the
+socket server and its clients stay up throughout.
+
+Requests that arrive while disconnected wait in the QueueBridge,
+and those lost with the connection are retried or failed by the
+component (see Component.connection_lost)
+"""
+import asyncio
+import random
+
+import txaio
+from autobahn.asyncio.wamp import ApplicationRunner
+
+from decs_visa_components.wamp_component import Component, SessionState
+from decs_visa_tools.base_logger import logger
+
+# shutdown message
+from decs_visa_tools.decs_visa_settings import SHUTDOWN
+# reconnection backoff
+from decs_visa_tools.decs_visa_settings import RECONNECT
+from decs_visa_tools.decs_visa_settings import RECONNECT_DELAY
+from decs_visa_tools.decs_visa_settings import RECONNECT_MAX_DELAY
+from decs_visa_tools.decs_visa_settings import RECONNECT_ATTEMPTS
+from decs_visa_tools.decs_visa_settings import LEAVE_TIMEOUT
+
+async def run_session(runner: ApplicationRunner, state: SessionState,
+                      finished: asyncio.Event) -> None:
+    """
+    Connect and wait until the session has finished
+    """
+    sessions = state.sessions
+    _, protocol = await runner.run(Component, start_loop=False)
+    session_finished = asyncio.ensure_future(finished.wait())
+    # a connection that closes before a session has started
+    # (e.g. a failed WebSocket handshake) has nothing to report it
+    closed = getattr(protocol, 'is_closed', None)
+    if asyncio.isfuture(closed):
+        await asyncio.wait((session_finished, closed), return_when=asyncio.FIRST_COMPLETED)
+        if state.sessions == sessions:
+            session_finished.cancel()
+            raise ConnectionError("Connection closed before a WAMP session started")
+    try:
+        await session_finished
+    except asyncio.CancelledError:
+        # Ctrl-C / SIGTERM - give the session a chance to leave
+        session = getattr(protocol, '_session', None)
+        if session is not None and (session.running or session.is_attached()) \
+                and not finished.is_set():
+            logger.info("Stopping - leaving WAMP session")
+            session.stop()
+            try:
+                await asyncio.wait_for(finished.wait(), LEAVE_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.info("WAMP session did not leave within %.1f s", LEAVE_TIMEOUT)
+        raise
+
+async def run_component(url: str, realm: str, extra: dict,
+                        log_level: str = 'critical') -> None:
+    """
+    Run WAMP sessions until one ends for good, then shut down the
+    socket server.  A failure to connect is only retried if an earlier
+    session got control of the system - otherwise the settings are
+    probably wrong.  autobahn logs at log_level
+    """
+    txaio.start_logging(level=log_level)
+    bridge = extra['bridge']
+    state = extra.setdefault('state', SessionState())
+    finished = extra.setdefault('finished', asyncio.Event())
+    delay = RECONNECT_DELAY
+    attempts = 0
+    try:
+        while True:
+            finished.clear()
+            state.reconnect = False
+            state.ready = False
+            try:
+                await run_session(ApplicationRunner(url, realm, extra=extra), state, finished)
+            except Exception as e:
+                logger.info("WAMP component error: %s", e)
+                state.reconnect = state.joined
+            if not (RECONNECT and state.reconnect):
+                break
+            if state.ready:
+                # the last session was working, so back off from the start
+                delay = RECONNECT_DELAY
+                attempts = 0
+            attempts += 1
+            if RECONNECT_ATTEMPTS is not None and attempts > RECONNECT_ATTEMPTS:
+                logger.info("Unable to reconnect after %d attempts", RECONNECT_ATTEMPTS)
+                break
+            # jitter, so systems sharing a router don't all retry at once
+            wait = delay * random.uniform(0.5, 1.0)
+            logger.info("WAMP connection lost - reconnecting in %.1f s (attempt %d)",
+                        wait, attempts)
+            await asyncio.sleep(wait)
+            delay = min(2 * delay, RECONNECT_MAX_DELAY)
+    finally:
+        state.close()
+        # close the socket server, so it disconnects its clients
+        bridge.put_response(SHUTDOWN)
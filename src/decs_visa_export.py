@@ -0,0 +1,51 @@
+"""
+Export a time window from the DECS<->VISA telemetry store
+(see STORE_PATH in decs_visa_settings.py) as a .csv or .npz file
+
+python decs_visa_export.py output.csv --start 2024-01-12T18:00 --end 2024-01-13T08:00
+"""
+import argparse
+import math
+import sys
+from datetime import datetime
+
+from decs_visa_tools.telemetry_store import export_window
+from decs_visa_tools.decs_visa_settings import STORE_PATH
+
+def parse_time(text: str) -> float:
+    """
+    A time given as seconds since the epoch or
+    an ISO 8601 date / time (local time if no zone)
+    """
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"Invalid time: {text}") from e
+
+def main():
+    """
+    Parse the arguments and export the window
+    """
+    parser = argparse.ArgumentParser(description="Export values from the DECS<->VISA telemetry store")
+    parser.add_argument("output", help="file to write - .csv or .npz (requires numpy)")
+    parser.add_argument("--store", default=STORE_PATH, help="store directory (default: STORE_PATH)")
+    parser.add_argument("--start", type=parse_time, default=0.0,
+                        help="start of the window (epoch seconds or ISO date / time)")
+    parser.add_argument("--end", type=parse_time, default=math.inf,
+                        help="end of the window (epoch seconds or ISO date / time)")
+    args = parser.parse_args()
+    if not args.store:
+        parser.error("no store directory given, and STORE_PATH is not set")
+    try:
+        rows = export_window(args.store, args.output, args.start, args.end)
+    except (OSError, ValueError) as e:
+        print(e)
+        sys.exit(1)
+    print(f"Exported {rows} values to {args.output}")
+
+if __name__ == "__main__":
+    main()
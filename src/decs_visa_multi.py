@@ -0,0 +1,108 @@
+"""
+Bridge several DECS systems from one process.
+
+Each system (see decs_visa_tools/system_config.py) has its own socket
+server thread and WAMP component, but all of the WAMP components run
+on the same event loop.  A system that loses its connection
+reconnects (see wamp_runner.py), and one that fails to connect, or
+whose session ends, is shut down without affecting the others.
+
+python decs_visa_multi.py systems.json
+"""
+import asyncio
+import contextvars
+import signal
+import sys
+import threading
+
+from decs_visa_components.queue_bridge import QueueBridge
+from decs_visa_components.simple_socket_server import simple_server
+from decs_visa_components.wamp_runner import run_component
+from decs_visa_tools.base_logger import logger, log_system
+from decs_visa_tools.command_parser import load_registry
+from decs_visa_tools.system_config import AUTO, SystemConfig, load_systems
+
+# shutdown message
+from decs_visa_tools.decs_visa_settings import SHUTDOWN
+
+async def run_system(system: SystemConfig, bridge: QueueBridge) -> None:
+    """
+    Run one system's WAMP component until it has finished
+    """
+    # tag this task's log lines (and those of the tasks it starts)
+    log_system.set(system.name)
+    logger.info("Connecting %s", system.name)
+    await run_component(system.url, system.realm, dict(
+        bridge=bridge,
+        user_name=system.user,
+        user_secret=system.user_secret,
+        registry=None if system.command_dictionary == AUTO
+                 else load_registry(system.command_dictionary),
+        auto_dictionary=system.command_dictionary == AUTO,
+        system=system.name,
+        metrics_port=system.metrics_port))
+
+async def run_systems(systems: list[SystemConfig], bridges: list[QueueBridge]) -> None:
+    """
+    Run every system until all of them have finished
+    """
+    loop = asyncio.get_running_loop()
+    tasks = [asyncio.create_task(run_system(system, bridge))
+             for system, bridge in zip(systems, bridges)]
+    try:
+        loop.add_signal_handler(signal.SIGTERM, lambda: [task.cancel() for task in tasks])
+    except NotImplementedError:
+        # signals are not available on Windows
+        pass
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+def main():
+    """
+    The application loop
+    """
+    if len(sys.argv) != 2:
+        print("Usage: python decs_visa_multi.py <systems.json>")
+        sys.exit(1)
+    logger.info('DECS<->VISA (multiple systems) start up')
+    try:
+        systems = load_systems(sys.argv[1])
+        for system in systems:
+            # check every dictionary before starting anything
+            if system.command_dictionary != AUTO:
+                load_registry(system.command_dictionary)
+    except (OSError, ValueError) as e:
+        logger.info("Unable to read system configuration: %s", e)
+        sys.exit(1)
+
+    bridges = []
+    server_threads = []
+    for system in systems:
+        logger.info("Starting %s: %s on port %s", system.name, system.url, system.port)
+        bridge = QueueBridge()
+        # the server thread's log lines are tagged with the system
+        context = contextvars.copy_context()
+        context.run(log_system.set, system.name)
+        server_thread = threading.Thread(target=context.run, name=system.name,
+                                         args=(simple_server, system.interface,
+                                               system.port, bridge, ))
+        server_thread.start()
+        bridges.append(bridge)
+        server_threads.append(server_thread)
+
+    try:
+        asyncio.run(run_systems(systems, bridges))
+    except KeyboardInterrupt:
+        logger.info("Keyboard Interrupt - shutdown")
+    # Will cause any socket servers still
+    # running to close so the threads can join()
+    for bridge in bridges:
+        bridge.put_response(SHUTDOWN)
+    for server_thread in server_threads:
+        server_thread.join()
+    for bridge in bridges:
+        bridge.close()
+    logger.info("DECS<->VISA stopped")
+    sys.exit(0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Replay a DECS<->VISA capture (see CAPTURE_PATH in
+decs_visa_settings.py) without connecting to a system
+
+python decs_visa_replay.py decs_visa_capture.jsonl.gz --fast --profile
+"""
+import argparse
+import asyncio
+import cProfile
+import pstats
+import sys
+
+from decs_visa_bench.replay import replay
+from decs_visa_tools.capture import read_capture
+
+def main():
+    """
+    Replay a capture and report how it went
+    """
+    parser = argparse.ArgumentParser(description="Replay a DECS<->VISA capture")
+    parser.add_argument("capture", help="capture file")
+    parser.add_argument("--fast", action="store_true",
+                        help="replay as fast as possible, rather than at the recorded pace")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile the replay and list the most expensive functions")
+    args = parser.parse_args()
+    try:
+        events = list(read_capture(args.capture))
+    except (OSError, ValueError) as e:
+        print(e)
+        sys.exit(1)
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+    result = asyncio.run(replay(events, paced=not args.fast))
+    if profiler is not None:
+        profiler.disable()
+
+    print(f"Replayed {result.commands} commands in {result.seconds:.3f} s "
+          f"({result.commands / result.seconds if result.seconds else 0.0:.1f} /s)")
+    print(f"Calls with no recorded result: {result.misses}")
+    print(f"Responses that differ from the capture: {len(result.mismatches)}")
+    for command, recorded, replayed in result.mismatches[:10]:
+        print(f"    {command}: {recorded!r} => {replayed!r}")
+    print(result.metrics.report())
+    if profiler is not None:
+        pstats.Stats(profiler).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(25)
+
+if __name__ == "__main__":
+    main()
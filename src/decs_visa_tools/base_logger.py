@@ -1,11 +1,81 @@
 """
 Logging module
+
+Log records are handed to a QueueListener thread, unformatted,
+so building the message and writing it to the console / log
+file never happens on the socket server thread or WAMP event loop.
 """
 
+import atexit
+import contextvars
+import copy
 import logging
+import logging.handlers
 import platform
+import queue
+import typing
 from pathlib import Path
 
+# the system being logged for, when one process bridges several -
+# set in each system's task / socket server thread (see decs_visa_multi.py)
+log_system: contextvars.ContextVar[str] = contextvars.ContextVar('log_system', default="")
+
+class SystemFilter(logging.Filter):
+    """
+    Tags each record with the system it was logged for (if any)
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        system = log_system.get()
+        record.system = f"[{system}] " if system else ""
+        return True
+
+# arguments that can't change before the listener formats the message
+_IMMUTABLE = (str, int, float, bool, bytes, type(None))
+
+def snapshot(value: typing.Any) -> typing.Any:
+    """
+    value, or a copy of it if it could change
+    before the listener formats the message
+    """
+    return value if isinstance(value, _IMMUTABLE) else copy.deepcopy(value)
+
+class DeferredMessage:
+    """
+    A log message object that is only built (str()) when the listener
+    thread formats the record - it must hold a snapshot of whatever
+    it is built from, so it can't change in the meantime
+    """
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    A QueueHandler that passes the record on as it is - the
+    standard QueueHandler formats the message before queueing
+    it, here that is left to the listener thread.  A message with
+    any mutable arguments (e.g. a dict or set of clients) is built
+    straight away, as they could change before it is formatted
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if isinstance(record.msg, (str, DeferredMessage)) and (not args or (
+                isinstance(args, tuple) and all(isinstance(arg, _IMMUTABLE) for arg in args))):
+            return record
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+def queued_handler(handler: logging.Handler) -> logging.Handler:
+    """
+    Run handler on its own listener thread, returning
+    the handler to attach to a logger in its place
+    """
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    # flush anything still queued on exit
+    atexit.register(listener.stop)
+    return DeferredQueueHandler(log_queue)
+
 # Set up logs
 logger = logging.getLogger(__name__)
 
@@ -13,7 +83,8 @@ logger = logging.getLogger(__name__)
 #logger.setLevel(logging.DEBUG)
 logger.setLevel(logging.INFO)
 
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+logger.addFilter(SystemFilter())
+formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(system)s%(message)s')
 
 running_on = platform.platform()
 if running_on.startswith("Windows"):
@@ -21,12 +92,12 @@ if running_on.startswith("Windows"):
     fh = logging.FileHandler(file_path)
     fh.setLevel(logging.DEBUG)
     fh.setFormatter(formatter)
-    logger.addHandler(fh)
+    logger.addHandler(queued_handler(fh))
     logger.info("OS is: %s", running_on)
 else:
     # log to console (to allow PIPEd output)
     ch = logging.StreamHandler()
     ch.setLevel(logging.DEBUG)
     ch.setFormatter(formatter)
-    logger.addHandler(ch)
+    logger.addHandler(queued_handler(ch))
     logger.info("OS is: %s", running_on)
@@ -0,0 +1,118 @@
+"""
+Module that implements an optional capture of the traffic through
+DECS<->VISA - every socket command and response, and every WAMP call
+(uri, arguments, results and duration) and publication, made or
+received - so a real
+session can be replayed later (see decs_visa_replay.py).
+
+The capture is a gzip compressed file with one JSON object per line.
+Events are encoded and written by a writer thread, not the WAMP
+event loop.  Each event has a type "e" and the time "t" (s) since the
+capture started:
+
+    cmd  - c (client id), s (sequence number), d (command)
+    resp - c, s, d (response)
+    call - u (uri), a (arguments), r (results) or x (error), ms (duration)
+    pub  - u, a
+    event - u, r (the record DECS published on a subscribed topic)
+"""
+import atexit
+import gzip
+import json
+import queue
+import threading
+import time
+import typing
+
+from .base_logger import logger
+
+CMD = "cmd"
+RESP = "resp"
+CALL = "call"
+PUB = "pub"
+EVENT = "event"
+
+class Capture:
+    """
+    Writes captured events to a gzip JSON lines file
+    """
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        self.started = time.perf_counter()
+        self._file = gzip.open(file_path, "wt", encoding="utf-8")
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="capture", daemon=True)
+        self._thread.start()
+        self._closed = False
+        atexit.register(self.close)
+        logger.info("Capturing traffic to: %s", file_path)
+
+    def _event(self, event: str, **fields) -> None:
+        fields["e"] = event
+        fields["t"] = round(time.perf_counter() - self.started, 6)
+        self._queue.put(fields)
+
+    def command(self, client_id: int, seq: int, data: str) -> None:
+        """
+        A command received from a socket client
+        """
+        self._event(CMD, c=client_id, s=seq, d=data)
+
+    def response(self, client_id: int, seq: int, data: str) -> None:
+        """
+        The response sent back for a command
+        """
+        self._event(RESP, c=client_id, s=seq, d=data)
+
+    def call(self, uri: str, args: typing.Sequence, results: typing.Sequence | None,
+             seconds: float, error: str | None = None) -> None:
+        """
+        A WAMP call - its results, or the error it raised
+        """
+        if error is None:
+            self._event(CALL, u=uri, a=list(args), r=list(results or ()),
+                        ms=round(seconds * 1e3, 3))
+        else:
+            self._event(CALL, u=uri, a=list(args), x=error, ms=round(seconds * 1e3, 3))
+
+    def publication(self, uri: str, args: typing.Sequence) -> None:
+        """
+        A WAMP publication
+        """
+        self._event(PUB, u=uri, a=list(args))
+
+    def event(self, uri: str, results: typing.Sequence) -> None:
+        """
+        A record published by DECS on a subscribed topic
+        """
+        self._event(EVENT, u=uri, r=list(results))
+
+    def close(self) -> None:
+        """
+        Write out anything still queued and close the file
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+
+    def _run(self) -> None:
+        while True:
+            event = self._queue.get()
+            if event is None:
+                return
+            try:
+                self._file.write(json.dumps(event, separators=(',', ':'), default=str) + "\n")
+            except (OSError, ValueError) as e:
+                logger.info("Capture error: %s", e)
+
+def read_capture(file_path: str) -> typing.Iterator[dict]:
+    """
+    The events in a capture, in the order they were recorded
+    """
+    with gzip.open(file_path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,91 @@
+"""
+Module that keeps a fixed size, in-memory history of the
+values seen for each channel, so a client can ask for (e.g.)
+the last ten minutes of the mixing chamber temperature
+"""
+import bisect
+from array import array
+
+from autobahn.wamp.types import CallResult
+
+from .response_parser import decs_response_parser
+
+class RingBuffer:
+    """
+    Fixed capacity buffer of (time, value) samples, held in two
+    arrays of doubles - memory use is 16 bytes per sample
+    whatever the number of samples recorded
+    """
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._times = array('d', bytes(8 * capacity))
+        self._values = array('d', bytes(8 * capacity))
+        # index the next sample will be written to
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, timestamp: float, value: float) -> None:
+        """
+        Add a sample, overwriting the oldest once full.  A sample
+        with the same time as the latest (e.g. a cached value
+        read twice) is ignored
+        """
+        if self._count and self._times[self._next - 1] == timestamp:
+            return
+        self._times[self._next] = timestamp
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def _ordered(self, first: int) -> list[tuple[float, float]]:
+        # samples from the first'th oldest onwards, oldest first
+        start = (self._next - self._count) % self.capacity
+        return [(self._times[(start + i) % self.capacity],
+                 self._values[(start + i) % self.capacity])
+                for i in range(first, self._count)]
+
+    def last(self, n: int) -> list[tuple[float, float]]:
+        """
+        The latest n samples, oldest first
+        """
+        return self._ordered(max(0, self._count - n))
+
+    def since(self, timestamp: float) -> list[tuple[float, float]]:
+        """
+        All the samples taken at or after timestamp, oldest first
+        """
+        start = (self._next - self._count) % self.capacity
+        # samples are in time order, so bisect the (logical) buffer
+        first = bisect.bisect_left(range(self._count), timestamp,
+                                   key=lambda i: self._times[(start + i) % self.capacity])
+        return self._ordered(first)
+
+class ChannelHistory:
+    """
+    A ring buffer for each WAMP uri.  Only scalar values
+    are recorded - vectors (e.g. magnetic field) are skipped
+    """
+    def __init__(self, uris: set[str], capacity: int) -> None:
+        self._buffers = {uri: RingBuffer(capacity) for uri in uris}
+
+    def record(self, uri: str, resp: CallResult, received: float) -> None:
+        """
+        Add a response received for uri to its history
+        """
+        buffer = self._buffers.get(uri)
+        if buffer is None:
+            return
+        try:
+            value = float(decs_response_parser(resp))
+        except ValueError:
+            return
+        buffer.append(received, value)
+
+    def get(self, uri: str) -> RingBuffer | None:
+        """
+        The history held for uri
+        """
+        return self._buffers.get(uri)
@@ -233,6 +233,43 @@ Teslatron_cmd_uri = {
     "set_a_WAMP_error"   : "oi.decs.THIS_WONT_WORK"
 }
 
+#   Dictionaries that may be chosen between when DECS<->VISA connects to
+#   a system (see AUTO_DICTIONARY in decs_visa_settings.py), with the
+#   lowest DECS version each is intended for.  The uris of every candidate
+#   are probed and the best match is used - the version only decides
+#   between dictionaries that match equally well.
+dictionary_candidates:  dict[str, tuple[int, ...]]
+dictionary_candidates = {
+    "Proteox_cmd_uri_v0"  : (0,),
+    "Proteox_cmd_uri"     : (0, 6),
+    "Proteox_cmd_uri_V3"  : (3,),
+    "Teslatron_cmd_uri"   : (0,),
+}
+
+#   Freshness window (s) for get_ responses that may be answered from the
+#   response cache.  Slowly changing values can be read far more often than
+#   they physically change - requests not listed here are never cached.
+#   A set_ command clears any cached responses from the same part of the
+#   uri tree, so a cached value is never older than a change made through
+#   DECS<->VISA.
+cmd_cache_ttl:  dict[str, float]
+cmd_cache_ttl = {
+    "get_OVC_P"         : 2.0,
+    "get_P1_P"          : 2.0,
+    "get_P2_P"          : 2.0,
+    "get_P3_P"          : 2.0,
+    "get_P4_P"          : 2.0,
+    "get_P5_P"          : 2.0,
+    "get_P6_P"          : 2.0,
+    "get_MC_T_SP"       : 5.0,
+    "get_MAG_TARGET"    : 5.0,
+    "get_CURR_TARGET"   : 5.0,
+    "get_PROBE_TARGET_T": 5.0,
+    "get_VTI_TARGET_T"  : 5.0,
+    "get_TARGET_PRES"   : 5.0,
+    "get_CIRC_TARGET"   : 5.0,
+}
+
 someOtherSystemType:  dict[str, str]
 someOtherSystemType = {
     # Implement other/further cmd_dict(s) as required
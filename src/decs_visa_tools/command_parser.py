@@ -2,138 +2,67 @@
  Module to provide some utility methods for mapping 'short'
  commands recieved from the socket server into the correct
  WAMP uri / argument lists.
-"""
 
-import time
-import typing 
+ The command dictionary is compiled into a CommandRegistry
+ when this module is imported, so any problems with it are
+ reported at start up.
+"""
 
-from .base_logger import logger
+from . import command_dictionary
+from .command_registry import CommandRegistry, CommandSpec, GET
 
 from .command_dictionary import Proteox_cmd_uri as cmd_uri
+from .command_dictionary import cmd_cache_ttl
+
+registry = CommandRegistry(cmd_uri, cmd_cache_ttl)
 
-def decs_request_parser(cmd: str) -> str:
+# registries compiled for other command dictionaries, by name
+_registries: dict[str, CommandRegistry] = {}
+
+def load_registry(dictionary_name: str) -> CommandRegistry:
     """
-    From the cmd string passed to the socket server, determine the correct
-    WAMP uri to call - requests shouldn't have a :<payload>
+    The registry for a command dictionary given by name (e.g.
+    Teslatron_cmd_uri) - each is only compiled once
     """
-    # assume it is a get_ command
-    uri = cmd_uri.get(cmd)
-    try:
-        assert isinstance(uri, str), "uri not returned from command_dictionary"
-    except AssertionError as e:
-        raise ValueError(e) from e
-    # if the uri is found, it can be returned
-    return uri
+    if dictionary_name not in _registries:
+        cmd_dict = getattr(command_dictionary, dictionary_name, None)
+        if not isinstance(cmd_dict, dict):
+            raise ValueError(f"Unknown command dictionary: {dictionary_name}")
+        _registries[dictionary_name] = CommandRegistry(cmd_dict, cmd_cache_ttl)
+    return _registries[dictionary_name]
 
-def decs_command_parser(cmd: str) -> tuple [str, list]:
+def split_command(cmd: str) -> tuple[str, str | None]:
     """
-    From the cmd string passed to the socket server, determine the correct
-    WAMP uri to call/publish and package the arguments to suit
+    Split a command into its name and any :<payload>
     """
+    name, sep, payload = cmd.partition(':')
+    return name.strip(), (payload if sep else None)
 
+def split_builtin(cmd: str) -> tuple[str, str | None]:
+    """
+    Split a command handled by DECS<->VISA itself into its name and any
+    arguments, which follow either a : or a space, e.g. RESPONSE_MODE:FULL
+    or STREAM get_MC_T,get_STILL_T@10Hz
+    """
+    cmd = cmd.strip()
+    for i, char in enumerate(cmd):
+        if char in ': ':
+            return cmd[:i], cmd[i + 1:]
+    return cmd, None
+
+def encode_command(spec: CommandSpec | None, payload: str | None) -> tuple [str, list]:
+    """
+    Package the :<payload> of a set_ / PUBLISH command
+    using the codec from its registry entry
+    """
     # Check to see if there is a 'payload' for a
     # 'set_' command - delimiter :
-    cmd_parts = cmd.split(':')
-    try:
-        assert len(cmd_parts) > 1, "set_ commands must have a :<payload>"
-    except AssertionError as e:
-        raise ValueError(e) from e
-    uri = cmd_uri.get(cmd_parts[0].strip())
     try:
-        assert isinstance(uri, str), "uri not returned from cmd_dict"
+        assert payload is not None, "set_ commands must have a :<payload>"
+        assert spec is not None and spec.kind != GET, "uri not returned from cmd_dict"
     except AssertionError as e:
         raise ValueError(e) from e
-    args: list[typing.Any]
-    args = []
-    # Given the cmd and the uri - decide how to process the information
-    # to form the correct WAMP messages for DECS
-    if "temperature_control" in uri and uri.endswith("setpoint"):
-        # set_ command for temperature
-        args.append(float(str(cmd_parts[1]).strip()))
-        args.append(1)
-    elif "temperature_control" in uri and uri.endswith("power"):
-        # set_ command for power
-        args.append(float(str(cmd_parts[1]).strip()))
-        if cmd_parts[0].endswith("OFF"):
-            # utility function to ensure heater output is disabled
-            args.append(False)
-        else:
-            # ensure heater output is enabled
-            args.append(True)
-            
-    elif uri.endswith("circulate_rate") or uri.endswith("circulate_target_temperature"):
-        args.append(float(str(cmd_parts[1]).strip()))
-    elif uri.endswith("circulate_linked") or uri.endswith("high_flow"):
-        argument = cmd_parts[1].strip()
-        if argument == 'true' or argument == 'True':
-            args.append(True)
-        elif argument == 'false' or argument == 'False':
-            args.append(False)
-            
-    elif "pressure_control" in uri and uri.endswith("setpoint"):
-        # set_ command for pressure
-        args.append(float(str(cmd_parts[1]).strip()))
-        args.append(1)
-    
-    elif uri.endswith("set_valve_open_percentage") or uri.endswith("set_target_position") or uri.endswith("pulse_width"):
-        # set_ command for valves / rotators
-        args.append(float(str(cmd_parts[1]).strip()))
-    elif "magnetic_field_control" in uri and uri.endswith("set_field_target"):
-        # set_ command for magnetic field setpoint
-        # cmd_parts[1] should be a , delimited list
-        cmd_args = (cmd_parts[1].strip()).split(',')
-        try:
-            assert len(cmd_args) == 7, "Incorrect arguments to set field"
-        except AssertionError as e:
-            raise ValueError(e) from e
-        args.append(int(cmd_args[0].strip('[')))
-        args.append(float(cmd_args[1]))
-        args.append(float(cmd_args[2]))
-        args.append(float(cmd_args[3]))
-        args.append(int(cmd_args[4]))
-        args.append(float(cmd_args[5]))
-        if cmd_args[6].strip(']') == 'true' or cmd_args[6].strip(']') == ' True':
-            args.append(True)
-        elif cmd_args[6].strip(']') == 'false' or cmd_args[6].strip(']') == ' False':
-            args.append(False)
-    elif "magnetic_field_control" in uri and uri.endswith("set_output_current_target"):
-        # set_ command for psu current setpoint
-        # cmd_parts[1] should be a , delimited list
-        cmd_args = (cmd_parts[1].strip()).split(',')
-        try:
-            assert len(cmd_args) == 6, "Incorrect arguments to set current"
-        except AssertionError as e:
-            raise ValueError(e) from e
-        args.append(float(cmd_args[0].strip('[')))
-        args.append(float(cmd_args[1]))
-        args.append(float(cmd_args[2]))
-        args.append(int(cmd_args[3]))
-        args.append(float(cmd_args[4]))
-        if cmd_args[5].strip(']') == 'true' or cmd_args[5].strip(']') == ' True':
-            args.append(True)
-        elif cmd_args[5].strip(']') == 'false' or cmd_args[5].strip(']') == ' False':
-            args.append(False)
-    elif "magnetic_field_control" in uri and uri.endswith("set_state"):
-        args.append((int(str(cmd_parts[1]).strip())))
-    elif "PUBLISH" in cmd:
-        # A publication to the event log
-        cmd_args = (cmd_parts[1].strip()).split(',')
-        try:
-            assert len(cmd_args) == 2, "Incorrect arguments for publication"
-        except AssertionError as e:
-            raise ValueError(e) from e
-        ts = str(int(time.time()))
-        args.append(int(10008))
-        args.append(int(0))
-        args.append(int(ts))
-        args.append(int(0))
-        args.append(int(0))
-        args.append(int(10008))
-        args.append(str((cmd_args[0]).strip('[')))
-        args.append(str((cmd_args[1]).strip(']')))
-    else:
+    if spec.encode is None:
         # currently no match for command
         raise NotImplementedError("Command / uri pattern incorrect, or not yet implemented")
-
-    return uri, args
-
+    return spec.uri, spec.encode(payload)
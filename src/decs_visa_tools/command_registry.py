@@ -0,0 +1,187 @@
+"""
+Module that compiles a command dictionary into a registry, mapping
+each 'short' command directly to its WAMP uri, the codec used to
+package its arguments and the decoder used for its response.
+
+The registry is built (and every entry validated) once at start up,
+so looking a command up is a single dictionary access and any
+command that can't be handled is reported before it is first used.
+"""
+import re
+import time
+import typing
+
+from autobahn.wamp.types import CallResult
+
+from .base_logger import logger
+from .response_parser import decs_response_parser
+
+# command kinds
+GET = "get"
+SET = "set"
+PUBLISH = "publish"
+
+# a WAMP uri is a set of . separated components
+_URI_PATTERN = re.compile(r"^[\w\-]+(\.[\w\-]+)+$")
+
+ArgumentCodec = typing.Callable[[str], list]
+ResponseDecoder = typing.Callable[[CallResult], str]
+
+class CommandSpec(typing.NamedTuple):
+    """
+    Everything needed to process one short command
+    """
+    name: str
+    uri: str
+    kind: str
+    # packages the :<payload> as WAMP arguments (None for get_ requests,
+    # or for set_ commands with a uri pattern that is not yet supported)
+    encode: ArgumentCodec | None
+    decode: ResponseDecoder | None
+    # freshness window (s) for the response cache - 0 if never cached
+    ttl: float
+
+def _split_args(payload: str, n_args: int, message: str) -> list[str]:
+    # payload should be a , delimited list - optionally in []
+    cmd_args = [arg.strip() for arg in payload.strip().strip('[]').split(',')]
+    try:
+        assert len(cmd_args) == n_args, message
+    except AssertionError as e:
+        raise ValueError(e) from e
+    return cmd_args
+
+def _to_bool(arg: str) -> bool:
+    argument = arg.strip().strip('[]').strip()
+    if argument in ('true', 'True'):
+        return True
+    if argument in ('false', 'False'):
+        return False
+    raise ValueError(f"Expected true or false, got: {argument}")
+
+def _float_arg(payload: str) -> list:
+    return [float(payload.strip())]
+
+def _setpoint(payload: str) -> list:
+    # set_ command for temperature / pressure
+    return [float(payload.strip()), 1]
+
+def _heater_power(enabled: bool) -> ArgumentCodec:
+    # set_ command for power - the _OFF variants are a utility
+    # to ensure heater output is disabled
+    def encode(payload: str) -> list:
+        return [float(payload.strip()), enabled]
+    return encode
+
+def _bool_arg(payload: str) -> list:
+    return [_to_bool(payload)]
+
+def _field_target(payload: str) -> list:
+    # set_ command for magnetic field setpoint
+    cmd_args = _split_args(payload, 7, "Incorrect arguments to set field")
+    return [int(cmd_args[0]), float(cmd_args[1]), float(cmd_args[2]), float(cmd_args[3]),
+            int(cmd_args[4]), float(cmd_args[5]), _to_bool(cmd_args[6])]
+
+def _current_target(payload: str) -> list:
+    # set_ command for psu current setpoint
+    cmd_args = _split_args(payload, 6, "Incorrect arguments to set current")
+    return [float(cmd_args[0]), float(cmd_args[1]), float(cmd_args[2]),
+            int(cmd_args[3]), float(cmd_args[4]), _to_bool(cmd_args[5])]
+
+def _int_arg(payload: str) -> list:
+    return [int(payload.strip())]
+
+def _publication(payload: str) -> list:
+    # A publication to the event log
+    cmd_args = payload.strip().split(',')
+    try:
+        assert len(cmd_args) == 2, "Incorrect arguments for publication"
+    except AssertionError as e:
+        raise ValueError(e) from e
+    ts = int(time.time())
+    return [10008, 0, ts, 0, 0, 10008,
+            str(cmd_args[0].strip('[')), str(cmd_args[1].strip(']'))]
+
+def _set_codec(name: str, uri: str) -> ArgumentCodec | None:
+    """
+    Given the cmd and the uri - decide how to process the information
+    to form the correct WAMP messages for DECS
+    """
+    if "temperature_control" in uri and uri.endswith("setpoint"):
+        return _setpoint
+    if "temperature_control" in uri and uri.endswith("power"):
+        return _heater_power(not name.endswith("OFF"))
+    if uri.endswith("circulate_rate") or uri.endswith("circulate_target_temperature"):
+        return _float_arg
+    if uri.endswith("circulate_linked") or uri.endswith("high_flow"):
+        return _bool_arg
+    if "pressure_control" in uri and uri.endswith("setpoint"):
+        return _setpoint
+    if uri.endswith("set_valve_open_percentage") or uri.endswith("set_target_position") \
+            or uri.endswith("pulse_width"):
+        # set_ command for valves / rotators
+        return _float_arg
+    if "magnetic_field_control" in uri and uri.endswith("set_field_target"):
+        return _field_target
+    if "magnetic_field_control" in uri and uri.endswith("set_output_current_target"):
+        return _current_target
+    if "magnetic_field_control" in uri and uri.endswith("set_state"):
+        return _int_arg
+    # currently no match for command
+    return None
+
+class CommandRegistry:
+    """
+    The compiled form of a command dictionary
+    """
+    def __init__(self, cmd_dict: dict[str, str], cmd_ttl: dict[str, float] | None = None) -> None:
+        cmd_ttl = cmd_ttl or {}
+        self.commands: dict[str, CommandSpec] = {}
+        # set_ commands whose uri pattern has no codec
+        self.unsupported: list[str] = []
+        for name, uri in cmd_dict.items():
+            self.commands[name] = self._compile(name, uri, cmd_ttl.get(name, 0.0))
+        if self.unsupported:
+            logger.info("Commands not yet implemented: %s", ', '.join(self.unsupported))
+
+    def _compile(self, name: str, uri: str, ttl: float) -> CommandSpec:
+        """
+        Validate a command dictionary entry and build its spec - a
+        malformed entry raises ValueError so the problem is found
+        at start up
+        """
+        if not isinstance(name, str) or not isinstance(uri, str):
+            raise ValueError(f"Command dictionary entries must be strings: {name!r}")
+        if not _URI_PATTERN.match(uri):
+            raise ValueError(f"Invalid uri for {name}: {uri!r}")
+        if name.startswith("get_"):
+            return CommandSpec(name, uri, GET, None, decs_response_parser, ttl)
+        if name.startswith("set_"):
+            encode = _set_codec(name, uri)
+            if encode is None:
+                self.unsupported.append(name)
+            return CommandSpec(name, uri, SET, encode, decs_response_parser, 0.0)
+        if name.startswith("PUBLISH"):
+            return CommandSpec(name, uri, PUBLISH, _publication, None, 0.0)
+        raise ValueError(f"Commands must start with get_, set_ or PUBLISH: {name!r}")
+
+    def get(self, name: str) -> CommandSpec | None:
+        """
+        The spec for a short command, if there is one
+        """
+        return self.commands.get(name)
+
+    def request_uris(self) -> set[str]:
+        """
+        The WAMP uris of every get_ request
+        """
+        return {spec.uri for spec in self.commands.values() if spec.kind == GET}
+
+    def request_names(self) -> dict[str, list[str]]:
+        """
+        The get_ requests for each WAMP uri
+        """
+        names: dict[str, list[str]] = {}
+        for spec in self.commands.values():
+            if spec.kind == GET:
+                names.setdefault(spec.uri, []).append(spec.name)
+        return names
@@ -0,0 +1,108 @@
+"""
+Module to parse and test the conditions on get_ values used by
+WAIT and SWEEP, e.g. get_MC_T<0.02, get_MAG_STATE=0 or
+get_MC_T~0.001 (within 0.001 of the setpoint being swept to)
+"""
+import operator
+import re
+import typing
+
+from .time_units import parse_duration
+
+_COMPARISONS = {
+    "<=" : operator.le,
+    ">=" : operator.ge,
+    "!=" : operator.ne,
+    "<"  : operator.lt,
+    ">"  : operator.gt,
+    "="  : operator.eq,
+}
+# within a tolerance of a target value
+NEAR = "~"
+
+# longer operators first, so <= isn't read as <
+_CONDITION_PATTERN = re.compile(r"^(get_\w+)\s*(<=|>=|!=|<|>|=|~)\s*(\S+)$")
+
+class Condition(typing.NamedTuple):
+    """
+    A get_ request and the test its value must pass
+    """
+    request: str
+    op: str
+    value: str
+
+    def __str__(self) -> str:
+        return f"{self.request}{self.op}{self.value}"
+
+    def test(self, response: str, target: float | None = None) -> bool:
+        """
+        Does a decoded response pass?  Values are compared as numbers
+        where possible - = and != compare anything else as text
+        """
+        try:
+            number = float(response)
+        except ValueError:
+            if self.op == "=":
+                return response.strip() == self.value
+            if self.op == "!=":
+                return response.strip() != self.value
+            return False
+        if self.op == NEAR:
+            return target is not None and abs(number - target) <= float(self.value)
+        try:
+            return _COMPARISONS[self.op](number, float(self.value))
+        except ValueError:
+            return self.op == "!="
+
+def parse_condition(text: str) -> Condition:
+    """
+    Parse a condition such as get_MC_T<0.02
+    """
+    match = _CONDITION_PATTERN.match(text.strip())
+    if match is None:
+        raise ValueError(f"Invalid condition: {text}")
+    condition = Condition(*match.groups())
+    if condition.op not in ("=", "!="):
+        try:
+            float(condition.value)
+        except ValueError as e:
+            raise ValueError(f"Invalid condition: {text}") from e
+    return condition
+
+class Wait(typing.NamedTuple):
+    """
+    A parsed WAIT
+    """
+    condition: Condition
+    # how long the condition must hold
+    stable: float
+    timeout: float | None
+
+def parse_options(options: list[str], allowed: set[str], command: str) -> dict[str, str]:
+    """
+    Parse the key=value options that follow a command
+    """
+    settings: dict[str, str] = {}
+    for option in options:
+        key, sep, value = option.partition('=')
+        if not sep or not value:
+            raise ValueError(f"Invalid {command} option: {option}")
+        settings[key] = value
+    unknown = set(settings) - allowed
+    if unknown:
+        raise ValueError(f"Unknown {command} option: {', '.join(sorted(unknown))}")
+    return settings
+
+def parse_wait(text: str | None) -> Wait:
+    """
+    Parse the arguments to WAIT e.g. get_MC_T<0.02 stable=60s timeout=1h
+    """
+    words = (text or "").split()
+    if not words:
+        raise ValueError("WAIT requires a condition e.g. get_MC_T<0.02")
+    condition = parse_condition(words[0])
+    if condition.op == NEAR:
+        raise ValueError(f"WAIT has no setpoint for {NEAR}: {words[0]}")
+    settings = parse_options(words[1:], {"stable", "timeout"}, "WAIT")
+    timeout = parse_duration(settings["timeout"]) if "timeout" in settings else None
+    return Wait(condition, parse_duration(settings.get("stable", "0")), timeout)
@@ -49,4 +49,149 @@ SHUTDOWN = "SHUTDOWN"
 WRITE_DELIM = "\n"
 
 # socket server read delimiter
-READ_DELIM = "\n"
\ No newline at end of file
+READ_DELIM = "\n"
+
+# Allow more than one socket client to be connected at
+# the same time - all clients share the one WAMP session.
+# Set to False to accept one connection at a time
+MULTI_CLIENT_SERVER = True
+
+# pending connection backlog for the socket server
+SERVER_BACKLOG = 16
+
+# socket server read size (bytes)
+SERVER_RECV_SIZE = 4096
+
+# longest command (bytes) the socket server will
+# accept - protects the server from a client that
+# never sends a delimiter
+MAX_LINE_LENGTH = 65536
+
+# maximum number of commands a socket client can
+# have in flight (pipelined) - responses are always
+# returned in the order the commands were sent
+PIPELINE_DEPTH = 32
+
+# most bytes the socket server will hold for a client
+# that isn't reading - lines pushed to it (e.g. STREAM
+# samples) beyond this are dropped until it catches up
+MAX_PUSH_BUFFER = 1048576
+
+# maximum number of get_ requests the WAMP component
+# will have in flight with the router at any time
+MAX_CONCURRENT_RPCS = 8
+
+# Answer get_ requests from the values DECS publishes
+# on its topics (where one exists) rather than with an
+# rRPC, provided the published value is no older than
+# SUBSCRIPTION_MAX_AGE (s)
+SUBSCRIPTION_CACHE = False
+SUBSCRIPTION_MAX_AGE = 1.0
+
+# Answer repeated get_ requests from a short lived
+# cache - the freshness window for each request is
+# set in cmd_cache_ttl in the command_dictionary.
+# Off by default, as responses may then be that old
+RESPONSE_CACHE = False
+
+# Share one rRPC between identical get_ requests made
+# while it is in flight (e.g. by several clients) - the
+# calls saved are reported by *CACHE? and *STAT?
+SINGLE_FLIGHT = True
+
+# separates the get_ requests of a compound query
+# e.g. get_MC_T;get_STILL_T;get_P2_P - the requests
+# are made concurrently and the responses returned
+# on one line, separated by the same delimiter
+COMPOUND_DELIM = ";"
+
+# Optional structured (JSON lines) log of requests,
+# e.g. REQUEST_LOG_PATH = "decs_visa_requests.jsonl"
+# Only REQUEST_LOG_SAMPLE_RATE (0 - 1) of the requests
+# are recorded, to limit the size of the log
+REQUEST_LOG_PATH = None
+REQUEST_LOG_SAMPLE_RATE = 1.0
+
+# separates the fields of a response in full record
+# mode (RESPONSE_MODE:FULL) - the fields are
+# value|record type|DECS time|status|received time
+FULL_RECORD_DELIM = "|"
+
+# STREAM command sample rates (Hz) - the default is
+# used when no rate is given and there is no published
+# value (SUBSCRIPTION_CACHE) to stream from instead
+STREAM_DEFAULT_RATE = 1.0
+STREAM_MAX_RATE = 50.0
+
+# History of each get_ value - HISTORY_LENGTH samples
+# are kept per channel (16 bytes each), None to disable.
+# Values are recorded whenever they are read or
+# published, and sampled every HISTORY_SAMPLE_INTERVAL (s)
+# (None to only record values clients ask for)
+# e.g. get_MC_T_HIST:600s or get_MC_T_HIST:last=1000
+HISTORY_LENGTH = None
+HISTORY_SAMPLE_INTERVAL = 10.0
+
+# Optional on-disk store of every value read or
+# published, e.g. STORE_PATH = "decs_visa_store" - a
+# new segment file (STORE_SEGMENT_ROWS rows of 32 bytes)
+# is started every STORE_SEGMENT_SECONDS (s), and
+# written through to disk every STORE_FLUSH_INTERVAL (s)
+# Export with: python decs_visa_export.py
+STORE_PATH = None
+STORE_SEGMENT_SECONDS = 3600.0
+STORE_SEGMENT_ROWS = 1_000_000
+STORE_FLUSH_INTERVAL = 1.0
+
+# Optional Prometheus endpoint for the metrics
+# reported by *STAT?, e.g. METRICS_PORT = 9108
+# for http://localhost:9108/metrics (bound to HOST)
+METRICS_PORT = None
+
+# Optional capture of every socket command / response
+# and WAMP call, for replay with decs_visa_replay.py
+# e.g. CAPTURE_PATH = "decs_visa_capture.jsonl.gz"
+CAPTURE_PATH = None
+
+# When the WAMP session starts, probe which uris the
+# system provides and choose the command dictionary
+# (from dictionary_candidates in command_dictionary.py)
+# that suits it.  Commands the system doesn't provide
+# are then rejected without a WAMP call.  If the router
+# can't be asked what is registered, only
+# AUTO_DICTIONARY_PROBES get_ uris of each candidate
+# are called.  False - always use the configured dictionary
+AUTO_DICTIONARY = False
+AUTO_DICTIONARY_PROBES = 3
+
+# Reconnect (with backoff) if the connection to the WAMP
+# router is lost, keeping the socket clients connected.
+# The first attempt is after RECONNECT_DELAY (s), doubling
+# after each failure up to RECONNECT_MAX_DELAY.  Give up
+# after RECONNECT_ATTEMPTS failures in a row (None - never)
+RECONNECT = True
+RECONNECT_DELAY = 1.0
+RECONNECT_MAX_DELAY = 60.0
+RECONNECT_ATTEMPTS = None
+# On Ctrl-C / SIGTERM, the longest wait (s) for the session
+# to relinquish control of the system and leave
+LEAVE_TIMEOUT = 5.0
+
+# SWEEP - how often (s) the settle condition is
+# checked and the largest number of setpoints
+SWEEP_POLL_INTERVAL = 0.1
+SWEEP_MAX_POINTS = 10000
+
+# How often (s) a WAIT condition is checked - a value
+# DECS publishes (see SUBSCRIPTION_CACHE) is also checked
+# whenever it is published
+WAIT_POLL_INTERVAL = 1.0
+
+# Optional shared memory copy of the latest value of every
+# get_ request, for other processes on this machine to read
+# with decs_visa_tools.shared_values.SharedValuesReader, e.g.
+# SHARED_VALUES_PATH = "/dev/shm/decs_visa_values" (Linux).
+# SHARED_VALUES_SLOTS values (vector elements count as one
+# each) can be held
+SHARED_VALUES_PATH = None
+SHARED_VALUES_SLOTS = 1024
@@ -0,0 +1,96 @@
+"""
+Module that chooses the command dictionary for the connected system,
+from which of the candidate dictionaries' uris the system provides.
+
+The best matching dictionary is used, less any commands whose uri the
+system doesn't provide, plus any commands only found in the other
+candidates whose uri it does provide - so the routing table only holds
+commands that can succeed.
+"""
+import re
+import typing
+
+from . import command_dictionary
+
+class DictionarySelection(typing.NamedTuple):
+    """
+    The outcome of choosing a dictionary
+    """
+    # the best matching candidate
+    name: str
+    # the routing table - short command to uri
+    commands: dict[str, str]
+    # commands in the candidates that the system doesn't provide
+    unsupported: frozenset[str]
+
+def parse_version(version: str | None) -> tuple[int, ...]:
+    """
+    The numeric parts of a version string e.g. 0.6.0.2338
+    """
+    if not version:
+        return ()
+    return tuple(int(part) for part in re.findall(r"\d+", version))
+
+def probed_uris(candidates: dict[str, dict[str, str]]) -> set[str]:
+    """
+    The uris that need probing - PUBLISH commands
+    are topics rather than procedures
+    """
+    return {uri for cmd_dict in candidates.values()
+            for name, uri in cmd_dict.items() if not name.startswith("PUBLISH")}
+
+def sample_requests(candidates: dict[str, dict[str, str]], per_candidate: int) -> set[str]:
+    """
+    A few get_ uris of each candidate to call, when the system can only be
+    probed by calling them - those not in every candidate first, as they
+    tell the candidates apart
+    """
+    requests = [{uri for name, uri in cmd_dict.items() if name.startswith("get_")}
+                for cmd_dict in candidates.values()]
+    common = set.intersection(*requests) if requests else set()
+    sample = set()
+    for uris in requests:
+        ranked = sorted(uris, key=lambda uri: (uri in common, uri))
+        sample.update(ranked[:per_candidate])
+    return sample
+
+def load_candidates() -> dict[str, dict[str, str]]:
+    """
+    The candidate dictionaries, by name
+    """
+    return {name: getattr(command_dictionary, name)
+            for name in command_dictionary.dictionary_candidates}
+
+def select_dictionary(candidates: dict[str, dict[str, str]],
+                      available: dict[str, bool | None],
+                      version: str | None = None) -> DictionarySelection | None:
+    """
+    Choose from the candidates given whether each uri is provided
+    (True), not provided (False) or couldn't be checked (None).
+    Returns None if nothing could be confirmed either way
+    """
+    decs_version = parse_version(version)
+    scores = {}
+    for name, cmd_dict in candidates.items():
+        uris = {uri for command, uri in cmd_dict.items() if not command.startswith("PUBLISH")}
+        found = sum(1 for uri in uris if available.get(uri) is True)
+        missing = sum(1 for uri in uris if available.get(uri) is False)
+        if found + missing == 0:
+            continue
+        # prefer the candidate intended for the newest version the system has reached
+        min_version = command_dictionary.dictionary_candidates.get(name, ())
+        suits_version = bool(decs_version) and decs_version >= min_version
+        scores[name] = (found / (found + missing), suits_version, min_version, found)
+    if not scores or not any(score[3] for score in scores.values()):
+        return None
+    ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+    best = ranked[0]
+    commands = {command: uri for command, uri in candidates[best].items()
+                if available.get(uri) is not False}
+    for name in ranked[1:]:
+        for command, uri in candidates[name].items():
+            if command not in commands and available.get(uri) is True:
+                commands[command] = uri
+    unsupported = frozenset(command for cmd_dict in candidates.values()
+                            for command in cmd_dict if command not in commands)
+    return DictionarySelection(best, commands, unsupported)
@@ -0,0 +1,71 @@
+"""
+Module that defines the error responses DECS<->VISA sends in place
+of a value - the server builds its errors from these, and the
+clients (see decs_visa_client) recognise them by ERROR_PREFIXES
+"""
+# (sic) as sent by earlier versions, which clients may match on
+UNKNOWN_COMMAND = "Unkown command"
+NOT_SUPPORTED = "Not supported by this system"
+NO_URI = "uri not returned from"
+CONNECTION_LOST = "Connection to DECS lost, may not have been applied"
+COMPOUND_GETS_ONLY = "Compound queries may only contain get_ requests"
+HISTORY_DISABLED = "History is not enabled"
+HISTORY_USAGE = "History requires a duration (e.g. 600s) or last=<n>"
+NO_METRICS = "No metrics available"
+RESPONSE_MODE_USAGE = "RESPONSE_MODE must be FULL or VALUE"
+STREAM_NEEDS_CLIENT = "STREAM requires a socket client"
+SWEEP_NEEDS_CLIENT = "SWEEP requires a socket client"
+UNABLE_TO_STREAM = "Unable to stream"
+UNABLE_TO_SWEEP = "Unable to sweep"
+UNABLE_TO_READ = "Unable to read"
+SWEEP_RUNNING = "A sweep is already running"
+ALREADY_SWEEPING = "Already sweeping"
+LINE_TOO_LONG = "Command exceeds maximum length"
+
+# the start of the ValueError messages for invalid arguments, which are
+# sent as they are - from the codecs (command_registry / command_parser),
+# response_parser, conditions, sweep, time_units and float() / int()
+ARGUMENT_ERRORS = (
+    "Invalid",
+    "Unknown",
+    "Incorrect arguments",
+    "Expected true or false",
+    "set_ commands must have",
+    "Command / uri pattern incorrect",
+    "Length of data record inconsistent",
+    "Unable to match data record type",
+    "A ramp",
+    "A log ramp",
+    "SWEEP requires",
+    "SWEEP is limited",
+    "WAIT requires",
+    "WAIT has no setpoint",
+    "could not convert",
+    "invalid literal",
+)
+
+ERROR_PREFIXES = (
+    UNKNOWN_COMMAND,
+    NOT_SUPPORTED,
+    NO_URI,
+    CONNECTION_LOST,
+    COMPOUND_GETS_ONLY,
+    HISTORY_DISABLED,
+    HISTORY_USAGE,
+    NO_METRICS,
+    RESPONSE_MODE_USAGE,
+    STREAM_NEEDS_CLIENT,
+    SWEEP_NEEDS_CLIENT,
+    UNABLE_TO_STREAM,
+    UNABLE_TO_SWEEP,
+    UNABLE_TO_READ,
+    SWEEP_RUNNING,
+    ALREADY_SWEEPING,
+    LINE_TOO_LONG,
+) + ARGUMENT_ERRORS
+
+def is_error(response: str) -> bool:
+    """
+    Whether a response is an error rather than a value
+    """
+    return response.startswith(ERROR_PREFIXES)
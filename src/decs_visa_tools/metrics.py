@@ -0,0 +1,189 @@
+"""
+Module that collects latency and throughput metrics, so time spent
+waiting for the WAMP router can be told apart from time spent in
+DECS<->VISA itself.
+
+Each command is timed in stages - queue (from the socket read until
+processing starts), rpc (the WAMP round trip, per uri), decode
+(parsing the response) and total (socket read to response) - into
+fixed bucket histograms.  The metrics are reported by the *STAT?
+command and, optionally, as a Prometheus text endpoint.
+"""
+import asyncio
+import bisect
+import time
+import typing
+
+from .base_logger import logger
+
+# histogram bucket upper bounds (s)
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# stages, in the order they are reported
+QUEUE = "queue"
+RPC = "rpc"
+DECODE = "decode"
+TOTAL = "total"
+STAGES = (QUEUE, RPC, DECODE, TOTAL)
+
+class Histogram:
+    """
+    Count of observations in each of the BUCKETS,
+    plus a final bucket for anything slower
+    """
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """
+        Add an observation
+        """
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def merge(self, other: "Histogram") -> None:
+        """
+        Add the observations of another histogram
+        """
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.sum += other.sum
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile (0 - 1) as the upper bound of
+        the bucket it falls in - inf if beyond the last
+        """
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def summary(self) -> str:
+        """
+        Count, mean and (bucketed) percentiles in ms
+        """
+        if not self.count:
+            return "n=0"
+        return (f"n={self.count},mean={1e3 * self.sum / self.count:.3f},"
+                f"p50={1e3 * self.quantile(0.5):g},p99={1e3 * self.quantile(0.99):g}")
+
+class Metrics:
+    """
+    Latency histograms for each (stage, key) - the key is the
+    command name, or the uri for the rpc stage - together with
+    rRPC error counts for each uri and any number of gauges
+    """
+    def __init__(self) -> None:
+        self.started = time.time()
+        self.stages: dict[tuple[str, str], Histogram] = {}
+        self.errors: dict[str, int] = {}
+        self._gauges: dict[str, typing.Callable[[], float]] = {}
+
+    def observe(self, stage: str, key: str, seconds: float) -> None:
+        """
+        Record the time spent in a stage
+        """
+        histogram = self.stages.get((stage, key))
+        if histogram is None:
+            histogram = self.stages[(stage, key)] = Histogram()
+        histogram.observe(seconds)
+
+    def error(self, uri: str) -> None:
+        """
+        Count a failed rRPC
+        """
+        self.errors[uri] = self.errors.get(uri, 0) + 1
+
+    def gauge(self, name: str, read: typing.Callable[[], float]) -> None:
+        """
+        Report the value returned by read() as a gauge
+        """
+        self._gauges[name] = read
+
+    def stage(self, stage: str, keys: typing.Iterable[str] | None = None) -> Histogram:
+        """
+        The observations for a stage - for all keys, or just those given
+        """
+        total = Histogram()
+        for (name, key), histogram in self.stages.items():
+            if name == stage and (keys is None or key in keys):
+                total.merge(histogram)
+        return total
+
+    def report(self, keys: typing.Iterable[str] | None = None) -> str:
+        """
+        One line summary of the metrics (for *STAT?) - every
+        command, or just those keys (command names / uris)
+        """
+        keys = None if keys is None else set(keys)
+        uptime = time.time() - self.started
+        requests = self.stage(TOTAL, keys).count
+        errors = sum(count for uri, count in self.errors.items()
+                     if keys is None or uri in keys)
+        fields = [f"uptime={uptime:.1f}", f"requests={requests}",
+                  f"rate={requests / uptime if uptime else 0.0:.3f}", f"errors={errors}"]
+        fields.extend(f"{name}={read()}" for name, read in self._gauges.items())
+        fields.extend(f"{stage}:{self.stage(stage, keys).summary()}" for stage in STAGES)
+        return ';'.join(fields)
+
+    def prometheus(self) -> str:
+        """
+        The metrics in the Prometheus text exposition format
+        """
+        lines = ["# HELP decs_visa_stage_seconds Time spent in each stage of processing a command",
+                 "# TYPE decs_visa_stage_seconds histogram"]
+        for (stage, key), histogram in sorted(self.stages.items()):
+            labels = f'stage="{_escape(stage)}",key="{_escape(key)}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(f'decs_visa_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'decs_visa_stage_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f"decs_visa_stage_seconds_sum{{{labels}}} {histogram.sum}")
+            lines.append(f"decs_visa_stage_seconds_count{{{labels}}} {histogram.count}")
+        lines += ["# HELP decs_visa_rpc_errors_total Failed WAMP calls",
+                  "# TYPE decs_visa_rpc_errors_total counter"]
+        lines.extend(f'decs_visa_rpc_errors_total{{uri="{_escape(uri)}"}} {count}'
+                     for uri, count in sorted(self.errors.items()))
+        lines += ["# TYPE decs_visa_uptime_seconds gauge",
+                  f"decs_visa_uptime_seconds {time.time() - self.started}"]
+        for name, read in self._gauges.items():
+            lines += [f"# TYPE decs_visa_{name} gauge", f"decs_visa_{name} {read()}"]
+        return '\n'.join(lines) + '\n'
+
+def _escape(label: str) -> str:
+    return label.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+async def serve_prometheus(metrics: Metrics, interface: str, port: int) -> asyncio.Server:
+    """
+    Start a minimal HTTP server that answers any
+    request with the metrics in Prometheus format
+    """
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            # the request itself doesn't matter
+            await reader.readuntil(b"\r\n\r\n")
+            body = metrics.prometheus().encode('utf-8')
+            writer.write(b"HTTP/1.1 200 OK\r\n"
+                         b"Content-Type: text/plain; version=0.0.4\r\n"
+                         b"Content-Length: %d\r\n"
+                         b"Connection: close\r\n\r\n" % len(body) + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+    server = await asyncio.start_server(handle, interface, port)
+    logger.info("Metrics available at: http://%s:%s/metrics", interface, port)
+    return server
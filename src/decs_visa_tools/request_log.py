@@ -0,0 +1,56 @@
+"""
+Module that implements an optional structured request log.
+
+Each (sampled) request is written as one JSON object per line,
+with the JSON encoding and file writes done by a QueueListener
+thread rather than the WAMP event loop.
+"""
+import json
+import logging
+import random
+import time
+
+from .base_logger import DeferredMessage, queued_handler, snapshot
+
+class JsonLine(DeferredMessage):
+    """
+    Log message that is only encoded as JSON when
+    the listener thread formats the record
+    """
+    def __init__(self, fields: dict) -> None:
+        self.fields = tuple((key, snapshot(value)) for key, value in fields.items())
+
+    def __str__(self) -> str:
+        return json.dumps(dict(self.fields), separators=(',', ':'))
+
+class RequestLog:
+    """
+    JSON lines log of processed requests.  Only a fraction
+    (sample_rate) of the requests are recorded
+    """
+    def __init__(self, file_path: str, sample_rate: float = 1.0) -> None:
+        self.sample_rate = sample_rate
+        # a logger for each file, should there be more than one log
+        self._logger = logging.getLogger(f"{__name__}.{file_path}")
+        self._logger.setLevel(logging.INFO)
+        # keep these out of the main log
+        self._logger.propagate = False
+        fh = logging.FileHandler(file_path)
+        fh.setFormatter(logging.Formatter('%(message)s'))
+        self._logger.addHandler(queued_handler(fh))
+
+    def record(self, client_id: int, command: str, response: str,
+               started: float, finished: float) -> None:
+        """
+        Log a processed request - started / finished
+        are time.perf_counter() values
+        """
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        self._logger.info(JsonLine({
+            "ts": time.time(),
+            "client": client_id,
+            "cmd": command,
+            "resp": response,
+            "ms": round((finished - started) * 1e3, 3),
+        }))
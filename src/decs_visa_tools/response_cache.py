@@ -0,0 +1,57 @@
+"""
+Module that implements a short lived cache of get_ responses,
+for slowly changing values that are read far more often than
+they can physically change
+"""
+import time
+
+from autobahn.wamp.types import CallResult
+
+class ResponseCache:
+    """
+    rRPC responses keyed by uri, with the (wall clock) time they
+    were received.  Each lookup supplies its own freshness window
+    (ttl), taken from the command dictionary
+    """
+    def __init__(self) -> None:
+        self._entries: dict[str, tuple[CallResult, float]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, uri: str, ttl: float) -> tuple[CallResult, float] | None:
+        """
+        Return the cached response for uri, and the time it was
+        received, if it is younger than ttl (s)
+        """
+        entry = self._entries.get(uri)
+        if entry is not None and time.time() - entry[1] <= ttl:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def put(self, uri: str, resp: CallResult, received: float) -> None:
+        """
+        Store a response
+        """
+        self._entries[uri] = (resp, received)
+
+    def invalidate(self, set_uri: str) -> None:
+        """
+        Drop every entry related to a uri that has just been set -
+        anything under the same node of the uri tree, e.g. setting
+        ...DRI_MIX_CL.setpoint drops ...DRI_MIX_CL.DRI_MIX_S.temperature
+        """
+        node = set_uri.rsplit('.', 1)[0] + '.'
+        stale = [uri for uri in self._entries if uri.startswith(node)]
+        for uri in stale:
+            del self._entries[uri]
+        self.invalidations += len(stale)
+
+    def stats(self) -> str:
+        """
+        Summary of the cache counters
+        """
+        return f"hits={self.hits},misses={self.misses}," \
+               f"invalidations={self.invalidations},entries={len(self._entries)}"
@@ -1,12 +1,15 @@
 """
 Module that implements the WAMP response parsing
 """
+import typing
 from enum import IntEnum
 
 from autobahn.wamp.types import CallResult
 
 from .base_logger import logger
 
+from .decs_visa_settings import FULL_RECORD_DELIM
+
 
 class OIRecordType(IntEnum):
     """ Utility class to allow the various OIDataRecord
@@ -90,18 +93,17 @@ def decs_response_parser(resp: CallResult) -> str:
     if n_args == 1:
         # Not all responses are consistent in the API - this will catch
         # and retrun 'flat' responses until the API fix is implemented
-        logger.debug("Parsing flat response: %s", str(resp.results))
+        logger.debug("Parsing flat response: %s", resp.results)
         return str(resp.results[0])
     if n_args == 2:
         # Not all responses are consistent in the API - this will catch
         # and retrun magnet state responses until the API fix is implemented
-        logger.debug("Parsing flat response: %s", str(resp.results))
+        logger.debug("Parsing flat response: %s", resp.results)
         return str(resp.results[0])
     if n_args == 9:
         # Not all responses are consistent in the API - this will catch
         # and retrun magnet state responses until the API fix is implemented
-        print(resp.results)
-        logger.debug("Parsing flat response: %s", str(resp.results))
+        logger.debug("Parsing flat response: %s", resp.results)
         tuple_str = (str(resp.results[0]), str(resp.results[1]), str(resp.results[2]))
         return ','.join(tuple_str)
     
@@ -109,7 +111,7 @@ def decs_response_parser(resp: CallResult) -> str:
     # in the response results should be the record type
     data_record_type = int(resp.results[0])
 
-    logger.debug("Parsing response: %s", str(resp.results))
+    logger.debug("Parsing response: %s", resp.results)
 
     # In principle each of these records could be handled separately, however
     # many records have similar 'shape' so these are currently grouped together.
@@ -174,3 +176,95 @@ def decs_response_parser(resp: CallResult) -> str:
     except (AssertionError, NotImplementedError) as e:
         logger.info("Error parsing response: %s", e)
         return str(e)
+
+class DecodedRecord(typing.NamedTuple):
+    """
+    The parts of a WAMP data record returned in full record mode
+    """
+    value: str
+    record_type: str
+    # DECS time stamp (s since the epoch) and status, if the record has them
+    decs_time: float | None
+    status: int | None
+    # local time the record was received
+    received: float
+
+def _has_time_stamp(data_record_type: int, n_args: int) -> bool:
+    """
+    Whether a data record has the form [type, status, seconds,
+    nanoseconds, ...] - following the record shapes matched by
+    decs_response_parser.  False for any record whose layout is unknown
+    """
+    match data_record_type:
+        case  OIRecordType.TEMPERATURE \
+            | OIRecordType.PRESSURE \
+            | OIRecordType.MASS_FLOW \
+            | OIRecordType.VOLUME_FLOW \
+            | OIRecordType.MAG_FIELD \
+            | OIRecordType.CURRENT \
+            | OIRecordType.VOLTAGE \
+            | OIRecordType.POWER \
+            | OIRecordType.FREQUENCY \
+            | OIRecordType.RESISTANCE \
+            | OIRecordType.SPEED:
+            # the 7 element form holds 3 values from results[1]
+            return n_args == 6
+        case  OIRecordType.CONTROL_LOOP \
+            | OIRecordType.ANGULAR_POS \
+            | OIRecordType.SW_STATE \
+            | OIRecordType.STATE \
+            | OIRecordType.VALVE_STATE:
+            return n_args == 7
+        case  OIRecordType.HTR_POWER \
+            | OIRecordType.MAG_FIELD_VEC \
+            | OIRecordType.PSU_CURRENT_VEC:
+            return n_args == 8
+        case  OIRecordType.MAG_GROUP_STATE:
+            return n_args == 10
+        case  OIRecordType.PRES_CONTROL_LOOP:
+            return n_args == 11
+        case _:
+            # MAG_STATE, MAG_FIELD_TARGET and MAG_CURR_TARGET hold
+            # their values where the time stamp would be
+            return False
+
+def decs_record_parser(resp: CallResult, received: float) -> DecodedRecord:
+    """
+    Decode the whole of a WAMP data record - the value (as returned by
+    decs_response_parser), the record type and, for record types of the
+    form [type, status, seconds, nanoseconds, ...] (see _has_time_stamp),
+    the DECS status and time stamp
+    """
+    value = decs_response_parser(resp)
+    results = resp.results
+    if len(results) in (1, 2, 9):
+        # 'flat' responses carry no record type / time stamp
+        return DecodedRecord(value, "FLAT", None, None, received)
+    try:
+        data_record_type = int(results[0])
+    except (TypeError, ValueError):
+        return DecodedRecord(value, str(results[0]), None, None, received)
+    try:
+        record_type = OIRecordType(data_record_type).name
+    except ValueError:
+        record_type = str(results[0])
+    if not _has_time_stamp(data_record_type, len(results)):
+        return DecodedRecord(value, record_type, None, None, received)
+    try:
+        decs_time = int(results[2]) + int(results[3]) * 1e-9
+        status = int(results[1])
+    except (TypeError, ValueError):
+        return DecodedRecord(value, record_type, None, None, received)
+    return DecodedRecord(value, record_type, decs_time, status, received)
+
+def format_record(record: DecodedRecord) -> str:
+    """
+    Format a decoded record as one compact line:
+    value|record type|DECS time|status|received time
+    """
+    return FULL_RECORD_DELIM.join((
+        record.value,
+        record.record_type,
+        "" if record.decs_time is None else f"{record.decs_time:.6f}",
+        "" if record.status is None else str(record.status),
+        f"{record.received:.6f}"))
@@ -0,0 +1,272 @@
+"""
+Module that publishes the latest value of every get_ request to a
+memory mapped file, so other processes on the same machine (plotters,
+loggers, QCoDeS kernels...) can read the current values without a
+round trip through the socket server, or any load on DECS<->VISA:
+
+with SharedValuesReader("/dev/shm/decs_visa_values") as values:
+    values.get("get_MC_T")      # Sample(value=0.0123, received=..., ...)
+
+The file has a fixed layout - a header, then one slot per value:
+
+header  magic, version, number of slots, slots in use, writer pid, start time
+slot    sequence, received time, DECS time, value, status, name
+
+Each slot is a seqlock.  The writer makes the sequence odd before
+writing the slot and even again afterwards, and a reader retries
+until it reads the same even sequence before and after the slot.
+A slot's name is written before it is counted in the header.
+Vectors (x,y,z) are stored as get_X[0], get_X[1]...
+"""
+import math
+import mmap
+import os
+import struct
+import time
+import typing
+from pathlib import Path
+
+from autobahn.wamp.types import CallResult
+
+from .base_logger import logger
+from .response_parser import decs_record_parser
+
+_MAGIC = b"DVSV"
+_VERSION = 1
+# magic, version, slots, slots in use, writer pid (0 once closed), start time
+_HEADER = struct.Struct("<4sIIIId")
+_HEADER_SIZE = 64
+_SEQUENCE = struct.Struct("<Q")
+# received, DECS time (nan if none), value, status (-1 if none)
+_FIELDS = struct.Struct("<dddi4x")
+_NAME_OFFSET = _SEQUENCE.size + _FIELDS.size
+_SLOT_SIZE = 128
+NAME_SIZE = _SLOT_SIZE - _NAME_OFFSET
+# reads of a slot that is mid-write before giving up
+# (the writer may have stopped part way through)
+_SPIN_LIMIT = 100_000
+
+class Sample(typing.NamedTuple):
+    """
+    The latest value of a get_ request
+    """
+    value: float | tuple
+    received: float
+    decs_time: float | None
+    status: int | None
+
+def _file_size(slots: int) -> int:
+    return _HEADER_SIZE + slots * _SLOT_SIZE
+
+def _slot_offset(slot: int) -> int:
+    return _HEADER_SIZE + slot * _SLOT_SIZE
+
+def _read_names(view: mmap.mmap, start: int, end: int) -> dict[str, int]:
+    names = {}
+    for slot in range(start, end):
+        offset = _slot_offset(slot) + _NAME_OFFSET
+        name = view[offset:offset + NAME_SIZE].rstrip(b"\0").decode("utf-8")
+        names[name] = slot
+    return names
+
+class SharedValues:
+    """
+    Writes the latest value of each get_ request, given the get_
+    names for each uri, to the file at path.  Only one process may
+    write to a file.  A file left by an earlier run is reused if it
+    has the same layout, so its readers carry on once it restarts
+    """
+    def __init__(self, path: str, names: dict[str, list[str]], slots: int = 1024) -> None:
+        self.path = Path(path)
+        self.names = names
+        size = _file_size(slots)
+        if not self._compatible(size, slots):
+            # replaced rather than truncated, as readers may have the old file mapped
+            temp_path = self.path.with_suffix(".tmp")
+            with open(temp_path, "wb") as f:
+                f.truncate(size)
+            os.replace(temp_path, self.path)
+        self._file = open(self.path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_WRITE)
+        _, _, self.slots, self.count, _, _ = _HEADER.unpack_from(self._map, 0)
+        if self.slots == 0:
+            self.slots = slots
+        self._slots = _read_names(self._map, 0, self.count)
+        self._sequences = [_SEQUENCE.unpack_from(self._map, _slot_offset(slot))[0]
+                           for slot in range(self.count)]
+        for slot, sequence in enumerate(self._sequences):
+            if sequence % 2:
+                # an earlier writer stopped part way through
+                self._sequences[slot] = sequence + 1
+                _SEQUENCE.pack_into(self._map, _slot_offset(slot), sequence + 1)
+        self._full = False
+        self._write_header(os.getpid())
+
+    def _compatible(self, size: int, slots: int) -> bool:
+        try:
+            with open(self.path, "rb") as f:
+                header = f.read(_HEADER.size)
+                f.seek(0, os.SEEK_END)
+                file_size = f.tell()
+        except FileNotFoundError:
+            return False
+        if len(header) < _HEADER.size or file_size != size:
+            return False
+        magic, version, file_slots, _, _, _ = _HEADER.unpack(header)
+        return magic == _MAGIC and version == _VERSION and file_slots == slots
+
+    def _write_header(self, pid: int) -> None:
+        _HEADER.pack_into(self._map, 0, _MAGIC, _VERSION, self.slots, self.count, pid, time.time())
+
+    def record(self, uri: str, resp: CallResult, received: float) -> None:
+        """
+        Publish a response newly received for uri
+        """
+        names = self.names.get(uri)
+        if not names:
+            return
+        record = decs_record_parser(resp, received)
+        try:
+            values = [float(value) for value in record.value.split(',')]
+        except ValueError:
+            # e.g. an error message rather than a value
+            return
+        decs_time = math.nan if record.decs_time is None else record.decs_time
+        status = -1 if record.status is None else record.status
+        for name in names:
+            if len(values) == 1:
+                self._write(name, received, decs_time, values[0], status)
+            else:
+                for i, value in enumerate(values):
+                    self._write(f"{name}[{i}]", received, decs_time, value, status)
+
+    def _write(self, name: str, received: float, decs_time: float,
+               value: float, status: int) -> None:
+        slot = self._slots.get(name)
+        if slot is None:
+            slot = self._add(name)
+            if slot is None:
+                return
+        offset = _slot_offset(slot)
+        sequence = self._sequences[slot]
+        _SEQUENCE.pack_into(self._map, offset, sequence + 1)
+        _FIELDS.pack_into(self._map, offset + _SEQUENCE.size, received, decs_time, value, status)
+        _SEQUENCE.pack_into(self._map, offset, sequence + 2)
+        self._sequences[slot] = sequence + 2
+
+    def _add(self, name: str) -> int | None:
+        encoded = name.encode("utf-8")
+        if len(encoded) > NAME_SIZE or self.count >= self.slots:
+            if not self._full:
+                logger.info("Shared values full, or name too long: %s", name)
+                self._full = True
+            return None
+        slot = self.count
+        offset = _slot_offset(slot) + _NAME_OFFSET
+        self._map[offset:offset + NAME_SIZE] = encoded.ljust(NAME_SIZE, b"\0")
+        self._sequences.append(0)
+        self._slots[name] = slot
+        self.count += 1
+        self._write_header(os.getpid())
+        return slot
+
+    def close(self) -> None:
+        """
+        Mark the values as no longer updated, and release the file
+        """
+        self._write_header(0)
+        self._map.close()
+        self._file.close()
+
+class SharedValuesReader:
+    """
+    Reads the values published by SharedValues - after opening the
+    file, reads are from memory, with no system calls
+    """
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as e:
+            self._file.close()
+            raise ValueError(f"Not a shared values file: {path}") from e
+        if len(self._map) < _HEADER_SIZE:
+            self.close()
+            raise ValueError(f"Not a shared values file: {path}")
+        magic, version, self.slots, _, _, _ = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or version != _VERSION or len(self._map) < _file_size(self.slots):
+            self.close()
+            raise ValueError(f"Not a shared values file: {path}")
+        self._count = 0
+        self._slots: dict[str, int] = {}
+
+    def __enter__(self) -> "SharedValuesReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _refresh(self) -> None:
+        count = _HEADER.unpack_from(self._map, 0)[3]
+        if count > self._count:
+            self._slots.update(_read_names(self._map, self._count, count))
+            self._count = count
+
+    @property
+    def live(self) -> bool:
+        """
+        True while DECS<->VISA is updating the values
+        """
+        return _HEADER.unpack_from(self._map, 0)[4] != 0
+
+    def names(self) -> list[str]:
+        """
+        The names of the values published so far
+        """
+        self._refresh()
+        return list(self._slots)
+
+    def _read(self, slot: int) -> Sample:
+        offset = _slot_offset(slot)
+        for _ in range(_SPIN_LIMIT):
+            sequence = _SEQUENCE.unpack_from(self._map, offset)[0]
+            if sequence % 2:
+                continue
+            received, decs_time, value, status = \
+                _FIELDS.unpack_from(self._map, offset + _SEQUENCE.size)
+            if _SEQUENCE.unpack_from(self._map, offset)[0] == sequence:
+                return Sample(value, received, None if math.isnan(decs_time) else decs_time,
+                              None if status < 0 else status)
+        raise RuntimeError(f"Shared value is still being written: slot {slot}")
+
+    def get(self, name: str) -> Sample:
+        """
+        The latest value of a get_ request - a vector's value is a
+        tuple, with the times of its first element (each element is
+        read consistently, but they may be from successive updates)
+        """
+        slot = self._slots.get(name)
+        if slot is None and f"{name}[0]" not in self._slots:
+            self._refresh()
+            slot = self._slots.get(name)
+        if slot is not None:
+            return self._read(slot)
+        elements = []
+        while f"{name}[{len(elements)}]" in self._slots:
+            elements.append(self._read(self._slots[f"{name}[{len(elements)}]"]))
+        if not elements:
+            raise KeyError(name)
+        return elements[0]._replace(value=tuple(element.value for element in elements))
+
+    def read(self, names: typing.Iterable[str]) -> dict[str, Sample]:
+        """
+        The latest values of several get_ requests, by name
+        """
+        return {name: self.get(name) for name in names}
+
+    def close(self) -> None:
+        """
+        Release the memory map and file
+        """
+        self._map.close()
+        self._file.close()
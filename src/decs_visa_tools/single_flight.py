@@ -0,0 +1,55 @@
+"""
+Module that shares one rRPC between every get_ request made for the
+same uri while it is in flight, so e.g. a QCoDeS station and a live
+plot both polling get_MC_T cost one WAMP call rather than two
+"""
+import asyncio
+import typing
+
+class SingleFlight:
+    """
+    The rRPCs in flight, keyed by uri
+    """
+    def __init__(self) -> None:
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self.calls = 0
+        # requests that shared a call already in flight
+        self.saved = 0
+
+    async def call(self, uri: str, make_call: typing.Callable[[], typing.Awaitable]) -> typing.Any:
+        """
+        The result of the call in flight for uri, or else of a new
+        make_call().  Cancelling one request doesn't cancel the call
+        for any others sharing it
+        """
+        future = self._in_flight.get(uri)
+        if future is None:
+            self.calls += 1
+            future = self._in_flight[uri] = asyncio.ensure_future(make_call())
+            future.add_done_callback(lambda done: self._done(uri, done))
+        else:
+            self.saved += 1
+        return await asyncio.shield(future)
+
+    def _done(self, uri: str, future: asyncio.Future) -> None:
+        if self._in_flight.get(uri) is future:
+            del self._in_flight[uri]
+        # every request sharing the call may have been cancelled
+        if not future.cancelled():
+            future.exception()
+
+    def forget(self, set_uri: str) -> None:
+        """
+        Stop sharing the calls related to a uri that has just been set
+        (see ResponseCache.invalidate) - they may have been made before
+        it was set, so later requests make a new call
+        """
+        node = set_uri.rsplit('.', 1)[0] + '.'
+        for uri in [uri for uri in self._in_flight if uri.startswith(node)]:
+            del self._in_flight[uri]
+
+    def stats(self) -> str:
+        """
+        Summary of the counters
+        """
+        return f"calls={self.calls},saved={self.saved},in_flight={len(self._in_flight)}"
@@ -0,0 +1,108 @@
+"""
+Module to parse the definition of a setpoint sweep, run by
+DECS<->VISA so each step doesn't need a round trip to the client:
+
+SWEEP set_MC_T:{} lin=0.01:0.1:10 settle=get_MC_T~0.001 stable=30s dwell=10s read=get_MC_T,get_MC_H
+
+The set_ command's payload has {} where each setpoint goes, and may
+contain spaces (set_MAG_TARGET:[0, {}, 0, 0.1, 0, 1, false]).  The
+setpoints are a list (points=0.1,0.2,0.5), or a linear (lin=) or
+logarithmic (log=) ramp given as start:stop:number of points.  The
+other options are all optional:
+
+settle  - condition (see conditions.py) to wait for after each set_
+stable  - how long the settle condition must hold (default 0s)
+dwell   - wait after settling, before the readback (default 0s)
+read    - get_ requests read back at each step
+timeout - limit on settling at each step (default none)
+"""
+import re
+import typing
+
+from .conditions import Condition, parse_condition, parse_options
+from .time_units import parse_duration
+
+# replaced by each setpoint in the set_ command's payload
+PLACEHOLDER = "{}"
+OPTIONS = {"points", "lin", "log", "settle", "stable", "dwell", "read", "timeout"}
+# the first option, which ends the set_ command
+_FIRST_OPTION = re.compile(r"\s(?:%s)=" % "|".join(sorted(OPTIONS)))
+USAGE = "SWEEP requires a set_ command with {} for the setpoint"
+
+class Sweep(typing.NamedTuple):
+    """
+    A parsed sweep definition
+    """
+    command: str
+    template: str
+    points: list[float]
+    settle: Condition | None
+    stable: float
+    dwell: float
+    read: list[str]
+    timeout: float | None
+
+    def payload(self, setpoint: float) -> str:
+        """
+        The set_ command's payload for a setpoint
+        """
+        return self.template.replace(PLACEHOLDER, repr(setpoint))
+
+def ramp(text: str, max_points: int, logarithmic: bool = False) -> list[float]:
+    """
+    The setpoints from start:stop:number of points - the number
+    is checked against max_points before any are generated
+    """
+    try:
+        start, stop, count = text.split(':')
+        start, stop, n_points = float(start), float(stop), int(count)
+    except ValueError as e:
+        raise ValueError(f"A ramp must be start:stop:number of points, got: {text}") from e
+    if n_points < 2:
+        raise ValueError(f"A ramp needs at least 2 points, got: {text}")
+    if n_points > max_points:
+        raise ValueError(f"SWEEP is limited to {max_points} points")
+    if logarithmic and (start <= 0 or stop <= 0):
+        raise ValueError(f"A log ramp must be between positive values, got: {text}")
+    fractions = [i / (n_points - 1) for i in range(n_points)]
+    if logarithmic:
+        points = [start * (stop / start) ** fraction for fraction in fractions]
+    else:
+        points = [start + (stop - start) * fraction for fraction in fractions]
+    # 0.3 rather than 0.30000000000000004 in the set_ command
+    return [float(f"{point:.12g}") for point in points]
+
+def parse_sweep(text: str, max_points: int) -> Sweep:
+    """
+    Parse the arguments to SWEEP - raises ValueError
+    with a message for the client if they are invalid
+    """
+    text = (text or "").strip()
+    if not text:
+        raise ValueError(USAGE)
+    first_option = _FIRST_OPTION.search(text)
+    end = first_option.start() if first_option else len(text)
+    name, sep, template = text[:end].partition(':')
+    template = template.strip()
+    if not name.startswith("set_") or len(name.split()) != 1 or not sep \
+            or template.count(PLACEHOLDER) != 1:
+        raise ValueError(USAGE)
+    settings = parse_options(text[end:].split(), OPTIONS, "SWEEP")
+    ramps = [key for key in ("points", "lin", "log") if key in settings]
+    if len(ramps) != 1:
+        raise ValueError("SWEEP requires one of points=, lin= or log=")
+    if "points" in settings:
+        if settings["points"].count(',') >= max_points:
+            raise ValueError(f"SWEEP is limited to {max_points} points")
+        try:
+            points = [float(point) for point in settings["points"].split(',')]
+        except ValueError as e:
+            raise ValueError(f"Invalid SWEEP points: {settings['points']}") from e
+    else:
+        points = ramp(settings[ramps[0]], max_points, logarithmic=ramps[0] == "log")
+    settle = parse_condition(settings["settle"]) if "settle" in settings else None
+    read = [request.strip() for request in settings.get("read", "").split(',') if request.strip()]
+    timeout = parse_duration(settings["timeout"]) if "timeout" in settings else None
+    return Sweep(name, template, points, settle,
+                 parse_duration(settings.get("stable", "0")),
+                 parse_duration(settings.get("dwell", "0")), read, timeout)
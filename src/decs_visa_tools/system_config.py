@@ -0,0 +1,85 @@
+"""
+Module to read the configuration of several DECS systems, so one
+DECS<->VISA process can bridge all of them (see decs_visa_multi.py)
+
+The configuration is a JSON list with an entry for each system:
+
+[
+    {
+        "name": "fridge1",
+        "url": "ws://192.168.0.10:8080/ws",
+        "realm": "ucss",
+        "user": "decs_visa",
+        "user_secret_env": "FRIDGE1_SECRET",
+        "interface": "localhost",
+        "port": 33576,
+        "command_dictionary": "auto"
+    },
+    ...
+]
+
+The secret can be given directly ("user_secret") or, better, read from
+the environment variable named by "user_secret_env".  "interface"
+(default localhost), "command_dictionary" (default auto - chosen to
+suit the system as for AUTO_DICTIONARY, whatever that is set to) and
+"metrics_port" (default none) are optional.
+"""
+import json
+import os
+import typing
+
+# command_dictionary value to choose the dictionary when connected
+AUTO = "auto"
+
+class SystemConfig(typing.NamedTuple):
+    """
+    Connection details for one DECS system
+    """
+    name: str
+    url: str
+    realm: str
+    user: str
+    user_secret: str
+    interface: str
+    port: int
+    command_dictionary: str
+    metrics_port: int | None
+
+def _system(entry: dict) -> SystemConfig:
+    if not isinstance(entry, dict):
+        raise ValueError(f"Each system must be a JSON object: {entry!r}")
+    name = entry.get("name")
+    if not isinstance(name, str) or not name:
+        raise ValueError(f"Every system needs a name: {entry!r}")
+    missing = [key for key in ("url", "realm", "user", "port") if key not in entry]
+    if missing:
+        raise ValueError(f"System {name} is missing: {', '.join(missing)}")
+    secret = entry.get("user_secret")
+    if secret is None and "user_secret_env" in entry:
+        secret = os.getenv(entry["user_secret_env"])
+    if not isinstance(secret, str):
+        raise ValueError(f"No user secret for system {name}")
+    try:
+        port = int(entry["port"])
+        metrics_port = None if entry.get("metrics_port") is None else int(entry["metrics_port"])
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid port for system {name}") from e
+    return SystemConfig(name, str(entry["url"]), str(entry["realm"]), str(entry["user"]),
+                        secret, str(entry.get("interface", "localhost")), port,
+                        str(entry.get("command_dictionary", AUTO)), metrics_port)
+
+def load_systems(file_path: str) -> list[SystemConfig]:
+    """
+    Read and validate a system configuration file
+    """
+    with open(file_path, encoding="utf-8") as f:
+        entries = json.load(f)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("The configuration must be a list of systems")
+    systems = [_system(entry) for entry in entries]
+    for key in ("name", "port"):
+        values = [getattr(system, key) for system in systems]
+        duplicates = {value for value in values if values.count(value) > 1}
+        if duplicates:
+            raise ValueError(f"Systems must have different {key}s: {duplicates}")
+    return systems
@@ -0,0 +1,75 @@
+"""
+Module that holds the latest value published by DECS
+on each subscribed topic, so get_ requests can be answered
+locally rather than with a WAMP rRPC
+"""
+import time
+import typing
+
+from autobahn.wamp.types import CallResult
+
+from .base_logger import logger
+
+class TelemetryCache:
+    """
+    Latest data record published on each topic (uri), with the
+    local (wall clock) time it was received.  Records older than max_age (s)
+    are treated as missing so the caller falls back to an rRPC.
+    """
+    def __init__(self, max_age: float) -> None:
+        self.max_age = max_age
+        self._records: dict[str, tuple[CallResult, float]] = {}
+        self.hits = 0
+        self.misses = 0
+        # called (with no arguments) whenever a topic is published
+        self._listeners: dict[str, list[typing.Callable[[], None]]] = {}
+
+    def update(self, uri: str, *results) -> None:
+        """
+        Store a publication - the record is packaged as a
+        CallResult so it parses exactly like an rRPC response
+        """
+        self._records[uri] = (CallResult(*results), time.time())
+        for listener in self._listeners.get(uri, ()):
+            listener()
+
+    def get(self, uri: str) -> tuple[CallResult, float] | None:
+        """
+        Return the latest record for uri, and the time it was
+        received, if it is fresh enough
+        """
+        entry = self._records.get(uri)
+        if entry is not None and time.time() - entry[1] <= self.max_age:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def latest(self, uri: str) -> tuple[CallResult, float] | None:
+        """
+        Return the latest record for uri, however old
+        """
+        return self._records.get(uri)
+
+    def add_listener(self, uri: str, listener: typing.Callable[[], None]) -> None:
+        """
+        Call listener whenever uri is published
+        """
+        self._listeners.setdefault(uri, []).append(listener)
+
+    def remove_listener(self, uri: str, listener: typing.Callable[[], None]) -> None:
+        """
+        Stop calling listener when uri is published
+        """
+        listeners = self._listeners.get(uri, [])
+        if listener in listeners:
+            listeners.remove(listener)
+
+    def handler(self, uri: str):
+        """
+        Subscription handler that stores publications on uri
+        """
+        def on_event(*results) -> None:
+            logger.debug("Publication on \"%s\": %s", uri, results)
+            self.update(uri, *results)
+        return on_event
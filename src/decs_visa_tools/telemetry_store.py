@@ -0,0 +1,304 @@
+"""
+Module that implements an append-only, on-disk store of every
+value DECS<->VISA sees, so long (e.g. overnight) runs can be
+exported afterwards without replaying anything over WAMP.
+
+Values are written to memory mapped 'segment' files, one column
+per field, and a new segment is started every segment_seconds (or
+when a segment is full).  Records are decoded and written in
+batches by a writer thread, so the WAMP event loop only has to put
+the raw response onto a queue.
+"""
+import bisect
+import csv
+import json
+import math
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+import typing
+from array import array
+from pathlib import Path
+
+from autobahn.wamp.types import CallResult
+
+from .base_logger import logger
+from .response_parser import decs_record_parser
+
+SEGMENT_SUFFIX = ".dvts"
+CHANNELS_FILE = "channels.json"
+
+_MAGIC = b"DVTS"
+_VERSION = 1
+# magic, version, capacity (rows), count (rows written), start time
+_HEADER = struct.Struct("<4sIQQd")
+_HEADER_SIZE = 64
+# the columns of a segment, in the order they are stored - a
+# missing DECS time is stored as nan and a missing status as -1
+COLUMNS = (("received", "d"), ("decs_time", "d"), ("channel", "i"),
+           ("status", "i"), ("value", "d"))
+
+class Segment:
+    """
+    A single memory mapped segment file, holding up
+    to capacity rows of each of the COLUMNS
+    """
+    def __init__(self, path: Path, capacity: int | None = None,
+                 start: float | None = None) -> None:
+        self.path = path
+        writable = capacity is not None
+        if writable:
+            # a new segment - allocate the whole file up front
+            row_size = sum(struct.calcsize(code) for _, code in COLUMNS)
+            with open(path, "wb") as f:
+                f.truncate(_HEADER_SIZE + capacity * row_size)
+        self._file = open(path, "r+b" if writable else "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0,
+                              access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        if writable:
+            self.capacity, self.count, self.start = capacity, 0, start or time.time()
+            self._write_header()
+        else:
+            magic, version, self.capacity, self.count, self.start = \
+                _HEADER.unpack_from(self._map, 0)
+            if magic != _MAGIC or version != _VERSION:
+                self.close()
+                raise ValueError(f"Not a telemetry segment: {path}")
+        # byte offset of each column
+        self._offsets = {}
+        offset = _HEADER_SIZE
+        for name, code in COLUMNS:
+            self._offsets[name] = offset
+            offset += self.capacity * struct.calcsize(code)
+
+    def _write_header(self) -> None:
+        _HEADER.pack_into(self._map, 0, _MAGIC, _VERSION, self.capacity, self.count, self.start)
+
+    @property
+    def full(self) -> bool:
+        """
+        True once no more rows can be appended
+        """
+        return self.count >= self.capacity
+
+    def append(self, rows: list[tuple]) -> int:
+        """
+        Write as many of the rows (one value per column) as will
+        fit, and return the number written.  The row count in the
+        header is only updated once the columns have been written
+        """
+        rows = rows[:self.capacity - self.count]
+        if rows:
+            for (name, code), values in zip(COLUMNS, zip(*rows)):
+                struct.pack_into(f"<{len(values)}{code}", self._map,
+                                 self._offsets[name] + self.count * struct.calcsize(code),
+                                 *values)
+            self.count += len(rows)
+            self._write_header()
+        return len(rows)
+
+    def column(self, name: str, first: int = 0, last: int | None = None) -> array:
+        """
+        Rows first to last (default all those written) of one column
+        """
+        values = array(dict(COLUMNS)[name])
+        offset = self._offsets[name]
+        last = self.count if last is None else last
+        values.frombytes(self._map[offset + first * values.itemsize:
+                                   offset + last * values.itemsize])
+        return values
+
+    def find(self, start: float, end: float) -> tuple[int, int]:
+        """
+        The first row received at or after start, and the row after
+        the last received at or before end - by binary search, as
+        rows are written in the order they were received
+        """
+        offset = self._offsets["received"]
+        with memoryview(self._map) as view, \
+                view[offset:offset + self.count * 8].cast("d") as received:
+            return bisect.bisect_left(received, start), bisect.bisect_right(received, end)
+
+    def flush(self) -> None:
+        """
+        Write any changes through to disk
+        """
+        self._map.flush()
+
+    def close(self) -> None:
+        """
+        Release the memory map and file
+        """
+        self._map.close()
+        self._file.close()
+
+class TelemetryStore:
+    """
+    Writes every record passed to record() into a directory of
+    segments, starting a new segment every segment_seconds
+    """
+    def __init__(self, directory: str, segment_seconds: float = 3600.0,
+                 segment_rows: int = 1_000_000, flush_interval: float = 1.0) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_seconds = segment_seconds
+        self.segment_rows = segment_rows
+        self.flush_interval = flush_interval
+        self.channels = read_channels(self.directory)
+        self._segment: Segment | None = None
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="telemetry_store", daemon=True)
+        self._thread.start()
+
+    def record(self, uri: str, resp: CallResult, received: float) -> None:
+        """
+        Queue a response (from any thread) - it is
+        decoded and written by the writer thread
+        """
+        self._queue.put((uri, resp, received))
+
+    def close(self) -> None:
+        """
+        Write out anything still queued and close the store
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        last_flush = time.monotonic()
+        running = True
+        while running:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                batch = []
+            # collect everything else waiting, so rows are written in batches
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+                batch = [item for item in batch if item is not None]
+            try:
+                self._write([row for item in batch for row in self._rows(*item)])
+                if self._segment is not None and \
+                        (not running or time.monotonic() - last_flush >= self.flush_interval):
+                    self._segment.flush()
+                    last_flush = time.monotonic()
+            except (OSError, ValueError) as e:
+                logger.info("Telemetry store error: %s", e)
+        if self._segment is not None:
+            self._segment.close()
+
+    def _rows(self, uri: str, resp: CallResult, received: float) -> list[tuple]:
+        # one row per value - vectors (x,y,z) are stored as uri[0], uri[1]...
+        record = decs_record_parser(resp, received)
+        try:
+            values = [float(value) for value in record.value.split(',')]
+        except ValueError:
+            # e.g. an error message rather than a value
+            return []
+        decs_time = math.nan if record.decs_time is None else record.decs_time
+        status = -1 if record.status is None else record.status
+        names = [uri] if len(values) == 1 else [f"{uri}[{i}]" for i in range(len(values))]
+        return [(received, decs_time, self._channel(name), status, value)
+                for name, value in zip(names, values)]
+
+    def _channel(self, name: str) -> int:
+        channel = self.channels.get(name)
+        if channel is None:
+            channel = self.channels[name] = len(self.channels)
+            write_channels(self.directory, self.channels)
+        return channel
+
+    def _write(self, rows: list[tuple]) -> None:
+        # in the order received, so a window can be found by binary search
+        rows.sort(key=lambda row: row[0])
+        while rows:
+            segment = self._segment
+            if segment is None or segment.full \
+                    or rows[0][0] - segment.start >= self.segment_seconds:
+                if segment is not None:
+                    segment.flush()
+                    segment.close()
+                start = rows[0][0]
+                path = self.directory / f"{round(start * 1000)}{SEGMENT_SUFFIX}"
+                segment = self._segment = Segment(path, self.segment_rows, start)
+            rows = rows[segment.append(rows):]
+
+def read_channels(directory: Path) -> dict[str, int]:
+    """
+    The channel (uri) numbering used in a store's segments
+    """
+    try:
+        with open(directory / CHANNELS_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def write_channels(directory: Path, channels: dict[str, int]) -> None:
+    """
+    Replace a store's channel numbering
+    """
+    path = directory / CHANNELS_FILE
+    temp_path = path.with_suffix(".tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(channels, f, indent=1)
+    os.replace(temp_path, path)
+
+def read_window(directory: str, start: float = 0.0,
+                end: float = math.inf) -> dict[str, array]:
+    """
+    Read every row received between start and end (s since the
+    epoch) from a store - an array of values for each column.  Each
+    segment's rows are found by binary search and copied in bulk
+    """
+    window: dict[str, array] = {name: array(code) for name, code in COLUMNS}
+    for path in sorted(Path(directory).glob(f"*{SEGMENT_SUFFIX}"),
+                       key=lambda path: float(path.stem)):
+        segment = Segment(path)
+        try:
+            if segment.start > end or not segment.count:
+                continue
+            first, last = segment.find(start, end)
+            if first < last:
+                for name, _ in COLUMNS:
+                    window[name].extend(segment.column(name, first, last))
+        finally:
+            segment.close()
+    return window
+
+def export_window(directory: str, output: str, start: float = 0.0,
+                  end: float = math.inf) -> int:
+    """
+    Export the rows received between start and end to a .csv
+    or (if numpy is installed) a .npz file, and return the
+    number of rows written
+    """
+    window = read_window(directory, start, end)
+    names = {channel: name for name, channel in read_channels(Path(directory)).items()}
+    if output.endswith(".npz"):
+        try:
+            import numpy as np
+        except ImportError as e:
+            raise ValueError("numpy is required to export .npz files") from e
+        np.savez(output,
+                 channels=np.array([names.get(i, "") for i in range(len(names))]),
+                 **{name: np.frombuffer(window[name], dtype=code) for name, code in COLUMNS})
+    else:
+        with open(output, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow([name for name, _ in COLUMNS])
+            rows: typing.Iterable = zip(*(window[name] for name, _ in COLUMNS))
+            for received, decs_time, channel, status, value in rows:
+                writer.writerow([f"{received:.6f}",
+                                 "" if math.isnan(decs_time) else f"{decs_time:.6f}",
+                                 names.get(channel, channel),
+                                 "" if status < 0 else status,
+                                 repr(value)])
+    return len(window["received"])
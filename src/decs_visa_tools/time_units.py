@@ -0,0 +1,56 @@
+"""
+Module to provide some utility methods for parsing the
+durations and rates used as command arguments, e.g.
+600s, 10min, 2h, 250ms or 10Hz
+"""
+
+# seconds per unit
+_DURATION_UNITS = {
+    "ms"  : 1e-3,
+    "s"   : 1.0,
+    "min" : 60.0,
+    "m"   : 60.0,
+    "h"   : 3600.0,
+}
+
+def parse_duration(text: str) -> float:
+    """
+    Parse a duration such as 600s, 10min or 2h into seconds -
+    a bare number is taken to be in seconds
+    """
+    text = text.strip()
+    # longest suffix first, so ms isn't read as m + s
+    for unit in sorted(_DURATION_UNITS, key=len, reverse=True):
+        if text.endswith(unit):
+            number = text[:-len(unit)]
+            scale = _DURATION_UNITS[unit]
+            break
+    else:
+        number = text
+        scale = 1.0
+    try:
+        seconds = float(number) * scale
+    except ValueError as e:
+        raise ValueError(f"Invalid duration: {text}") from e
+    if seconds < 0:
+        raise ValueError(f"Invalid duration: {text}")
+    return seconds
+
+def parse_period(text: str) -> float:
+    """
+    Parse a rate (10Hz) or an interval (100ms) into
+    the period between samples in seconds
+    """
+    text = text.strip()
+    if text.lower().endswith("hz"):
+        try:
+            rate = float(text[:-2])
+        except ValueError as e:
+            raise ValueError(f"Invalid rate: {text}") from e
+        if rate <= 0:
+            raise ValueError(f"Invalid rate: {text}")
+        return 1.0 / rate
+    period = parse_duration(text)
+    if period <= 0:
+        raise ValueError(f"Invalid interval: {text}")
+    return period
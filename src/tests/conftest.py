@@ -0,0 +1,7 @@
+"""
+Tests import the packages from src, as the scripts do
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,75 @@
+"""
+Tests that the clients recognise the errors DECS<->VISA sends
+"""
+import asyncio
+
+import pytest
+from autobahn.wamp.types import ComponentConfig
+
+from decs_visa_bench.direct import DirectComponent
+from decs_visa_bench.fake_decs import FakeDecs
+from decs_visa_client.decoding import DecsVisaError, decode_response
+from decs_visa_components.queue_bridge import QueueBridge
+from decs_visa_components.simple_socket_server import LineFramer
+from decs_visa_tools.error_responses import is_error
+
+BAD_COMMANDS = [
+    "get_NOT_A_COMMAND",
+    "set_NOT_A_COMMAND:1",
+    "NOT_A_COMMAND",
+    "set_MC_T",
+    "set_MC_T:warm",
+    "set_MAG_TARGET:[1, 2]",
+    "set_MC_T_HTR_ENABLE:maybe",
+    "get_MC_T;set_MC_T:1",
+    "get_MC_T_HIST:600s",
+    "*STAT? NOT_A_COMMAND",
+    "RESPONSE_MODE:SOMETIMES",
+    "STREAM get_MC_T",
+    "SWEEP set_MC_T:{} lin=0:1:5",
+    "WAIT",
+    "WAIT get_NOT_A_COMMAND<1",
+    "WAIT get_MC_T<1 stable=soon",
+    "WAIT get_MC_T~1",
+    "WAIT get_MC_T<1 colour=blue",
+]
+
+def respond(commands: list[str], client_id: int | None = None) -> list[str]:
+    async def run() -> list[str]:
+        component = DirectComponent(ComponentConfig("errors", extra=dict(
+            bridge=QueueBridge(), user_name="errors", user_secret="",
+            fake=FakeDecs("errors", latency=0.0, jitter=0.0))))
+        return [await component.process_command(command, client_id) for command in commands]
+    return asyncio.run(run())
+
+@pytest.mark.parametrize("command", BAD_COMMANDS)
+def test_error_detected(command):
+    response = respond([command])[0]
+    assert is_error(response), response
+    with pytest.raises(DecsVisaError):
+        decode_response(response)
+
+@pytest.mark.parametrize("command", [
+    "SWEEP",
+    "SWEEP set_MC_T:{} lin=0:1:1",
+    "SWEEP set_MC_T:{} lin=0:1:100000000",
+    "SWEEP set_MC_T:{} log=0:1:5",
+    "SWEEP set_MC_T:{} points=1,warm",
+    "SWEEP set_MC_T:{} lin=0:1:5 dwell=later",
+    "SWEEP set_NOT_A_COMMAND:{} lin=0:1:5",
+    "SWEEP set_MC_T:{} lin=0:1:5 read=get_NOT_A_COMMAND",
+    "STREAM get_NOT_A_COMMAND",
+    "STREAM get_MC_T@fast",
+])
+def test_client_error_detected(command):
+    response = respond([command], client_id=1)[0]
+    assert is_error(response), response
+
+def test_line_too_long_detected():
+    framer = LineFramer("\n", 8)
+    framer.feed(b"x" * 16)
+    assert is_error(framer.error)
+
+def test_values_are_not_errors():
+    for response in respond(["get_MC_T", "set_MC_T:0.1", "get_MC_T;get_STILL_T", "*IDN?"]):
+        assert not is_error(response), response
@@ -0,0 +1,21 @@
+"""
+Tests that the fake DECS answers with records the parser understands
+"""
+import pytest
+from autobahn.wamp.types import CallResult
+
+from decs_visa_bench.fake_decs import _RECORD_TYPES, fake_record
+from decs_visa_tools.response_parser import OIRecordType, decs_response_parser
+
+@pytest.mark.parametrize("record", [record for _, record in _RECORD_TYPES],
+                         ids=[record.name for _, record in _RECORD_TYPES])
+def test_fake_record_parses(record):
+    results = fake_record(record)
+    value = decs_response_parser(CallResult(*results))
+    assert "inconsistent" not in value and "Unable to match" not in value
+    # flat (1, 2 or 9 element) responses are not typed records
+    assert len(results) not in (1, 2, 9)
+
+def test_fake_group_state():
+    results = fake_record(OIRecordType.MAG_GROUP_STATE)
+    assert decs_response_parser(CallResult(*results)) == str(results[5]) == "1"
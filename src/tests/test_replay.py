@@ -0,0 +1,54 @@
+"""
+Tests for replaying a capture
+"""
+import asyncio
+
+from decs_visa_bench.replay import normalise, replay
+
+MC_T = "oi.decs.temperature_control.DRI_MIX_CL.DRI_MIX_S.temperature"
+
+def temperature(value: float) -> list:
+    return [0, 0, 1705056156, 0, value, 0]
+
+def command(t: float, seq: int, data: str) -> dict:
+    return {"e": "cmd", "t": t, "c": 1, "s": seq, "d": data}
+
+def response(t: float, seq: int, data: str) -> dict:
+    return {"e": "resp", "t": t, "c": 1, "s": seq, "d": data}
+
+def test_normalise_full_records():
+    recorded = "0.1|TEMPERATURE|1705056156.000000|0|1705056157.000000;0.2"
+    replayed = "0.1|TEMPERATURE|1705056156.000000|0|1705056199.000000;0.2"
+    assert normalise(recorded) == normalise(replayed)
+    assert normalise("0.1") == "0.1"
+
+def test_replay_idn_and_full_records():
+    events = [
+        {"e": "call", "t": 0.0, "u": "oi.decs.host.name", "a": [], "r": ["PROTEOX"], "ms": 1.0},
+        {"e": "call", "t": 0.0, "u": "oi.decs.host.decs_version", "a": [], "r": ["1.0"], "ms": 1.0},
+        command(1.0, 0, "*IDN?"),
+        response(1.1, 0, "QD - Oxford, DECS, PROTEOX, 1.0"),
+        command(1.2, 1, "RESPONSE_MODE:FULL"),
+        response(1.2, 1, "FULL"),
+        command(1.3, 2, "get_MC_T"),
+        {"e": "call", "t": 1.3, "u": MC_T, "a": [], "r": temperature(0.1), "ms": 1.0},
+        response(1.4, 2, "0.1|TEMPERATURE|1705056156.000000|0|1705056157.000000"),
+    ]
+    result = asyncio.run(replay(events))
+    assert result.commands == 3
+    assert result.misses == 0
+    assert result.mismatches == []
+
+def test_replay_publications():
+    # answered from the records published before each command, with no calls
+    events = [
+        {"e": "event", "t": 0.5, "u": MC_T, "r": temperature(0.1)},
+        command(1.0, 0, "get_MC_T"),
+        {"e": "event", "t": 1.5, "u": MC_T, "r": temperature(0.2)},
+        command(2.0, 1, "get_MC_T"),
+        response(1.1, 0, "0.1"),
+        response(2.1, 1, "0.2"),
+    ]
+    result = asyncio.run(replay(events))
+    assert result.misses == 0
+    assert result.mismatches == []
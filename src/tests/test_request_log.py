@@ -0,0 +1,38 @@
+"""
+Tests for the structured request log
+"""
+import json
+import threading
+import time
+
+from decs_visa_tools.request_log import JsonLine, RequestLog
+
+def read_lines(path, n: int, timeout: float = 5.0) -> list[str]:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if path.exists():
+            lines = path.read_text().splitlines()
+            if len(lines) >= n:
+                return lines
+        time.sleep(0.01)
+    raise AssertionError(f"{path} has fewer than {n} lines")
+
+def test_encoded_on_listener_thread(tmp_path, monkeypatch):
+    threads = []
+    encode = JsonLine.__str__
+    def recording_encode(self):
+        threads.append(threading.current_thread())
+        return encode(self)
+    monkeypatch.setattr(JsonLine, "__str__", recording_encode)
+    path = tmp_path / "requests.jsonl"
+    RequestLog(str(path)).record(1, "get_MC_T", "0.0123", 1.0, 1.5)
+    line = json.loads(read_lines(path, 1)[0])
+    assert line["cmd"] == "get_MC_T" and line["resp"] == "0.0123" and line["ms"] == 500.0
+    assert threads and threading.main_thread() not in threads
+
+def test_fields_are_a_snapshot():
+    fields = {"cmd": "get_MC_T", "clients": [1, 2]}
+    line = JsonLine(fields)
+    fields["cmd"] = "set_MC_T"
+    fields["clients"].append(3)
+    assert json.loads(str(line)) == {"cmd": "get_MC_T", "clients": [1, 2]}
@@ -0,0 +1,63 @@
+"""
+Tests for decoding each DECS data record type
+"""
+import pytest
+from autobahn.wamp.types import CallResult
+
+from decs_visa_tools.response_parser import OIRecordType
+from decs_visa_tools.response_parser import decs_record_parser, decs_response_parser
+
+SECONDS = 1705056156
+NANOSECONDS = 712345000
+STATUS = 3
+RECEIVED = 1705056157.0
+
+def header(record: OIRecordType) -> list:
+    return [int(record), STATUS, SECONDS, NANOSECONDS]
+
+# (results, value, time stamped)
+RECORDS = {
+    "scalar": (header(OIRecordType.TEMPERATURE) + [0.0123, 0], "0.0123", True),
+    "pressure": (header(OIRecordType.PRESSURE) + [1.5, 0], "1.5", True),
+    "scalar_vector": ([int(OIRecordType.MAG_FIELD), 0.1, 0.2, 0.3, 0, 0, 0], "0.1,0.2,0.3", False),
+    "control_loop": (header(OIRecordType.CONTROL_LOOP) + [0.1, 1, 0], "0.1", True),
+    "switch_state": (header(OIRecordType.SW_STATE) + [1, 1, 0], "1", True),
+    "heater_power": (header(OIRecordType.HTR_POWER) + [1e-05, 1, 0, 0], "1e-05", True),
+    "field_vector": (header(OIRecordType.MAG_FIELD_VEC) + [0.1, 0.2, 0.3, 0], "0.1,0.2,0.3", True),
+    "current_vector": (header(OIRecordType.PSU_CURRENT_VEC) + [1.0, 2.0, 3.0, 0],
+                       "1.0,2.0,3.0", True),
+    "field_target": ([int(OIRecordType.MAG_FIELD_TARGET), 0, 0.1, 0.2, 0.3, 0, 0.1, 0],
+                     "0.1,0.2,0.3", False),
+    "current_target": ([int(OIRecordType.MAG_CURR_TARGET), 12, 3, 4, 0, 0, 0, 0, 0, 0],
+                       "12,3,4", False),
+    "group_state": (header(OIRecordType.MAG_GROUP_STATE) + [0, 2, 0, 0, 0, 0], "2", True),
+    "pressure_control": (header(OIRecordType.PRES_CONTROL_LOOP) + [0, 1.5, 0, 0, 0, 0, 0],
+                         "1.5", True),
+    "magnet_state": ([int(OIRecordType.MAG_STATE), 1, 0], "1", False),
+}
+
+@pytest.mark.parametrize("results, value, stamped", RECORDS.values(), ids=RECORDS.keys())
+def test_record(results, value, stamped):
+    resp = CallResult(*results)
+    assert decs_response_parser(resp) == value
+    record = decs_record_parser(resp, RECEIVED)
+    assert record.value == value
+    assert record.record_type == OIRecordType(results[0]).name
+    assert record.received == RECEIVED
+    if stamped:
+        assert record.status == STATUS
+        assert record.decs_time == pytest.approx(SECONDS + NANOSECONDS * 1e-9)
+    else:
+        assert record.status is None
+        assert record.decs_time is None
+
+@pytest.mark.parametrize("results", [[0.5], [0.5, 1], [1, 2, 3, 0, 0, 0, 0, 0, 0]])
+def test_flat_record(results):
+    record = decs_record_parser(CallResult(*results), RECEIVED)
+    assert record.record_type == "FLAT"
+    assert record.decs_time is None and record.status is None
+
+def test_unknown_record_type():
+    record = decs_record_parser(CallResult(12345, STATUS, SECONDS, NANOSECONDS, 1.0, 0), RECEIVED)
+    assert record.record_type == "12345"
+    assert record.decs_time is None and record.status is None